@@ -256,69 +256,74 @@ def can_shoot(state, mapa, last_move, nearest_enemy, digdug_x, digdug_y):
     return False
 
 
-def in_the_fire(state, maze, position):
+def danger_map(state, maze):
     """
-    Checks if the player is in danger of being attacked by Fygar enemies in the current game state.
+    Marks the positions of the map the fire of the Fygar enemies can reach.
 
-    This function examines the positions of Fygar enemies and determines if the player is in danger
-    of being attacked based on the Fygar's current direction and the proximity to the player.
+    This function predicts, for each Fygar, the five positions of its row it can burn: towards the wall
+    when it has its head against one, otherwise in the direction it is moving. The fire the server reports
+    is added to them, so a Fygar already firing is a danger wherever its fire is.
 
     Args:
         state (dict): The game state containing information about the current game situation.
         maze (list): A 2D list representing the game maze where 1 indicates a wall and 0 indicates an open space.
-        position (tuple): A tuple representing the player's current position (x, y).
 
     Returns:
-        bool: True if the player is in danger of being attacked by Fygar enemies, False otherwise.
+        list: A 2D list indexed as [x][y] with the number of Fygar enemies whose fire can reach each position.
     """
+    width, height = len(maze), len(maze[0])
+    danger = [[0] * height for _ in range(width)]
+
     for enemy in state["enemies"]:
-        enemy_name = enemy["name"]
+        if enemy["name"] != "Fygar":
+            continue
+
         enemy_x, enemy_y = enemy["pos"]
+        enemy_dir = enemy["dir"]
+
+        # Vai bater com a cabeça na parede
+        if enemy_x + 1 <= width - 1 and maze[enemy_x + 1][enemy_y] == 1:
+            first, last = enemy_x - 4, enemy_x
+        elif enemy_x - 1 >= 0 and maze[enemy_x - 1][enemy_y] == 1:
+            first, last = enemy_x, enemy_x + 4
+        # Normal movement
+        elif enemy_dir == 1:
+            first, last = enemy_x, enemy_x + 4
+        elif enemy_dir == 3:
+            first, last = enemy_x - 4, enemy_x
+        else:
+            first, last = 0, -1
+
+        cells = {(x, enemy_y) for x in range(max(first, 0), min(last, width - 1) + 1)}
+        cells.update(tuple(pos) for pos in enemy.get("fire", ()))
+        for x, y in cells:
+            danger[x][y] += 1
+
+    return danger
+
+
+def in_the_fire(state, maze, position, danger=None):
+    """
+    Checks if the player is in danger of being attacked by Fygar enemies in the current game state.
 
-        if enemy_name == "Fygar":
-            enemy_dir = enemy["dir"]
+    This function looks the position up in the danger map of the Fygar enemies, built from the state
+    unless one is given.
 
-            # Check if the Fygar is in a position to attack the player.
-            if enemy_y == position[1]:
-                if enemy_x + 1 <= 47 and maze[enemy_x + 1][enemy_y] == 1:
-                    if (
-                        enemy_x == position[0]
-                        or enemy_x - 1 == position[0]
-                        or enemy_x - 2 == position[0]
-                        or enemy_x - 3 == position[0]
-                        or enemy_x - 4 == position[0]
-                    ):
-                        return True
-                elif enemy_x - 1 >= 0 and maze[enemy_x - 1][enemy_y] == 1:
-                    if (
-                        enemy_x == position[0]
-                        or enemy_x + 1 == position[0]
-                        or enemy_x + 2 == position[0]
-                        or enemy_x + 3 == position[0]
-                        or enemy_x + 4 == position[0]
-                    ):
-                        return True
-                else:
-                    # Normal movement
-                    if enemy_dir == 1:
-                        if (
-                            enemy_x == position[0]
-                            or enemy_x + 1 == position[0]
-                            or enemy_x + 2 == position[0]
-                            or enemy_x + 3 == position[0]
-                            or enemy_x + 4 == position[0]
-                        ):
-                            return True
-                    elif enemy_dir == 3:
-                        if (
-                            enemy_x == position[0]
-                            or enemy_x - 1 == position[0]
-                            or enemy_x - 2 == position[0]
-                            or enemy_x - 3 == position[0]
-                            or enemy_x - 4 == position[0]
-                        ):
-                            return True
-    return False
+    Args:
+        state (dict): The game state containing information about the current game situation.
+        maze (list): A 2D list representing the game maze where 1 indicates a wall and 0 indicates an open space.
+        position (tuple): A tuple representing the player's current position (x, y).
+        danger (list, optional): The danger_map of state and maze. Defaults to None.
+
+    Returns:
+        bool: True if the player is in danger of being attacked by Fygar enemies, False otherwise.
+    """
+    x, y = position
+    if not (0 <= x < len(maze) and 0 <= y < len(maze[0])):
+        return False  # set_goal can aim outside the map
+    if danger is None:
+        danger = danger_map(state, maze)
+    return danger[x][y] > 0
 
 
 def fygar_is_repeating_positions(moves_fygar):
@@ -0,0 +1,593 @@
+"""Lockstep simulator advancing many independent games at once with NumPy."""
+import random
+
+import numpy as np
+
+from characters import Fygar
+from consts import (
+    BED_POINTS,
+    BOTTOM_POINTS,
+    ENEMY_HEAL_ODD,
+    GROUND_POINTS,
+    MAX_LEN_ROPE,
+    MIDDLE_POINTS,
+    MIN_ENEMY_LIFE,
+    ROCK_KILL_POINTS,
+    TIMEOUT,
+    VITAL_SPACE,
+    WALLPASS_ODD,
+    Direction,
+    Smart,
+    Speed,
+    Tiles,
+)
+from game import Game
+
+# offsets indexed by Direction
+DX = np.array([0, 1, 0, -1])
+DY = np.array([-1, 0, 1, 0])
+
+NO_KEY, SHOOT = -1, 4
+KEYS = {
+    "w": Direction.NORTH,
+    "d": Direction.EAST,
+    "s": Direction.SOUTH,
+    "a": Direction.WEST,
+}
+KEYS.update({"A": SHOOT, "B": SHOOT})
+
+DIRECTIONS = range(len(Direction))
+WALLPASS = np.array([0.0] + [WALLPASS_ODD[s] for s in Smart])  # indexed by Smart
+
+
+class BatchGame:
+    """Structure-of-arrays copy of N games, advanced in lockstep by step().
+
+    Every rule of game.Game and characters.py is mirrored with array operations
+    across games; entities inside one game are processed in the same order as the
+    reference engine, so that each game draws its random numbers (from its own
+    random.Random) in exactly the same sequence. Given the same keys, a game
+    follows the same trajectory as its reference Game until its level is
+    completed, which ends the episode here (done is set and cleared is True).
+    """
+
+    def __init__(self, games, rngs=None):
+        """Copy the state of started games.Game objects.
+
+        Each game draws from rngs[i], by default a copy of that Game's own RNG.
+        """
+        n = len(games)
+        self.n = n
+        if rngs is None:
+            rngs = [random.Random() for _ in games]
+            for rng, game in zip(rngs, games):
+                rng.setstate(game.rng.getstate())
+        self.rngs = rngs
+        self.players = [g._player_name for g in games]
+        self.spawns = [list(g.map.enemies_spawn) for g in games]
+        self.enemy_ids = [[e.id for e in g._enemies] for g in games]
+        self.rock_ids = [[r.id for r in g._rocks] for g in games]
+        self.ver_tiles = games[0].map.ver_tiles
+
+        self.grid = np.stack([g.map._grid for g in games])
+        self.level = np.array([g.level for g in games])
+        self.running = np.array([g.running for g in games])
+        self.cleared = np.zeros(n, dtype=bool)
+        self.steps = np.array([g._step for g in games])
+        self.timeout = np.array([g._timeout for g in games])
+        self.total_steps = np.array([g._total_steps for g in games])
+        self.score = np.array([g._score for g in games])
+        self.respawn = np.array([g.respawn for g in games])
+
+        self.dd_x = np.array([g._digdug.x for g in games])
+        self.dd_y = np.array([g._digdug.y for g in games])
+        self.dd_dir = np.array([int(g._digdug.direction) for g in games])
+        self.dd_spawn = np.array([g._digdug._spawn_pos for g in games])
+        self.lives = np.array([g._digdug.lives for g in games])
+
+        self.rope_len = np.array([len(g._rope._pos) for g in games])
+        self.rope_x = np.zeros((n, MAX_LEN_ROPE + 1), dtype=int)
+        self.rope_y = np.zeros((n, MAX_LEN_ROPE + 1), dtype=int)
+        self.rope_dir = np.array(
+            [-1 if g._rope._dir is None else int(g._rope._dir) for g in games]
+        )
+        for i, g in enumerate(games):
+            for j, (x, y) in enumerate(g._rope._pos):
+                self.rope_x[i, j], self.rope_y[i, j] = x, y
+
+        e = max(len(g._enemies) for g in games)
+        self.present = np.zeros((n, e), dtype=bool)
+        self.e_x, self.e_y = np.zeros((n, e), dtype=int), np.zeros((n, e), dtype=int)
+        self.spawn_x = np.zeros((n, e), dtype=int)
+        self.spawn_y = np.zeros((n, e), dtype=int)
+        self.last_x = np.zeros((n, e), dtype=int)
+        self.last_y = np.zeros((n, e), dtype=int)
+        self.goal_x = np.zeros((n, e), dtype=int)
+        self.goal_y = np.zeros((n, e), dtype=int)
+        self.lastdir = np.zeros((n, e), dtype=int)
+        self.alive = np.zeros((n, e), dtype=int)
+        self.tick = np.zeros((n, e), dtype=int)
+        self.speed = np.zeros((n, e), dtype=int)
+        self.smart = np.zeros((n, e), dtype=int)
+        self.points = np.zeros((n, e), dtype=int)
+        self.fygar = np.zeros((n, e), dtype=bool)
+        self.wallpass = np.zeros((n, e), dtype=bool)
+        self.freeze = np.zeros((n, e), dtype=bool)
+        self.exit = np.zeros((n, e), dtype=bool)
+        self.fire_len = np.zeros((n, e), dtype=int)
+        self.fire_x = np.zeros((n, e, MAX_LEN_ROPE), dtype=int)
+        self.fire_y = np.zeros((n, e, MAX_LEN_ROPE), dtype=int)
+        for i, g in enumerate(games):
+            for k, enemy in enumerate(g._enemies):
+                self.present[i, k] = True
+                self.e_x[i, k], self.e_y[i, k] = enemy.pos
+                self.spawn_x[i, k], self.spawn_y[i, k] = enemy._spawn_pos
+                self.last_x[i, k], self.last_y[i, k] = enemy.lastpos
+                self.lastdir[i, k] = enemy.lastdir
+                self.alive[i, k] = enemy._alive
+                self.tick[i, k] = enemy.step
+                self.speed[i, k] = enemy._speed
+                self.smart[i, k] = enemy._smart
+                self.points[i, k] = enemy._points or 0
+                self.fygar[i, k] = isinstance(enemy, Fygar)
+                self.wallpass[i, k] = enemy._wallpass
+                self.freeze[i, k] = enemy.freeze
+                self.exit[i, k] = enemy.exit
+                if not self.fygar[i, k]:
+                    self.goal_x[i, k], self.goal_y[i, k] = enemy.go_to_corridor
+                self.fire_len[i, k] = len(enemy.fire)
+                for j, (x, y) in enumerate(enemy.fire):
+                    self.fire_x[i, k, j], self.fire_y[i, k, j] = x, y
+
+        r = max(len(g._rocks) for g in games)
+        self.r_x, self.r_y = np.zeros((n, r), dtype=int), np.zeros((n, r), dtype=int)
+        self.falling = np.zeros((n, r), dtype=int)
+        self.r_present = np.zeros((n, r), dtype=bool)
+        for i, g in enumerate(games):
+            for j, rock in enumerate(g._rocks):
+                self.r_present[i, j] = True
+                self.r_x[i, j], self.r_y[i, j] = rock.pos
+                self.falling[i, j] = rock._falling
+
+        self._games = np.arange(n)
+
+    @classmethod
+    def new(cls, seeds, level=1, player="batch", **kwargs):
+        """Start one reference Game per seed and copy them."""
+        games = [Game(level=level, seed=seed, **kwargs) for seed in seeds]
+        for game in games:
+            game.start(player)
+        return cls(games)
+
+    @property
+    def done(self):
+        return ~self.running | self.cleared
+
+    # helpers
+
+    def _draw(self, mask, draw):
+        """Call draw(rng) for every game in mask, in game order."""
+        return {i: draw(self.rngs[i]) for i in np.nonzero(mask)[0]}
+
+    def _tile(self, x, y):
+        return self.grid[self._games, x + 1, y + 1]
+
+    def _calc_pos(self, x, y, direction, traverse):
+        """Vectorized Map.calc_pos for one position per game."""
+        nx, ny = x + DX[direction], y + DY[direction]
+        tile = self._tile(nx, ny)
+        ok = (tile == Tiles.PASSAGE) | (traverse & (tile == Tiles.STONE))
+        return np.where(ok, nx, x), np.where(ok, ny, y)
+
+    def _has_rock(self, x, y):
+        return (
+            self.r_present & (self.r_x == x[:, None]) & (self.r_y == y[:, None])
+        ).any(axis=1)
+
+    def _on_rope(self, x, y):
+        cells = np.arange(MAX_LEN_ROPE + 1) < self.rope_len[:, None]
+        return (cells & (self.rope_x == x[:, None]) & (self.rope_y == y[:, None])).any(
+            axis=1
+        )
+
+    def _enemy_points(self):
+        h = self.ver_tiles
+        y = self.e_y
+        points = np.where(
+            y < h / 4,
+            GROUND_POINTS,
+            np.where(
+                y < h / 2,
+                MIDDLE_POINTS,
+                np.where(y < h * 3 / 4, BOTTOM_POINTS, BED_POINTS),
+            ),
+        )
+        points = np.where(self.points > 0, self.points, points)
+        horizontal = (self.lastdir == Direction.EAST) | (self.lastdir == Direction.WEST)
+        return np.where(self.fygar & horizontal, points * 2, points)
+
+    def _stop(self, mask):
+        self.total_steps += np.where(mask, self.steps, 0)
+        self.running &= ~mask
+
+    def _kill_digdug(self, mask):
+        mask = mask & ~self.respawn
+        self.lives -= mask
+        self.respawn |= mask & (self.lives > 0)
+        self._stop(mask & (self.lives <= 0))
+
+    def _move_digdug(self, mask, x, y):
+        moved = mask & ((x != self.dd_x) | (y != self.dd_y))
+        self.dd_dir = np.where(
+            moved,
+            np.select(
+                [x < self.dd_x, x > self.dd_x, y < self.dd_y],
+                [Direction.WEST, Direction.EAST, Direction.NORTH],
+                Direction.SOUTH,
+            ),
+            self.dd_dir,
+        )
+        self.dd_x = np.where(mask, x, self.dd_x)
+        self.dd_y = np.where(mask, y, self.dd_y)
+
+    def _reset_rope(self, mask):
+        self.rope_len[mask] = 0
+        self.rope_dir[mask] = -1
+
+    def _hit(self, mask):
+        """Rope.hit: the first enemy on the rope loses a life and cuts the rope."""
+        mask = mask & (self.rope_len > 0)
+        cells = np.arange(MAX_LEN_ROPE + 1) < self.rope_len[:, None]
+        on_cell = (
+            cells[:, None, :]
+            & (self.rope_x[:, None, :] == self.e_x[:, :, None])
+            & (self.rope_y[:, None, :] == self.e_y[:, :, None])
+        )
+        on_rope = self.present & on_cell.any(axis=2) & mask[:, None]
+        hit = on_rope.any(axis=1)
+        first = on_rope.argmax(axis=1)
+        for i in np.nonzero(hit)[0]:
+            k = first[i]
+            self.alive[i, k] = max(self.alive[i, k] - 1, 0)
+            self.freeze[i, k] = True
+            self.rope_len[i] = on_cell[i, k].argmax()
+        return hit
+
+    def _collision(self, mask):
+        mask = mask & self.running
+
+        at_digdug = (
+            mask[:, None]
+            & self.present
+            & (self.e_x == self.dd_x[:, None])
+            & (self.e_y == self.dd_y[:, None])
+        )
+        self.e_x = np.where(at_digdug, self.spawn_x, self.e_x)
+        self.e_y = np.where(at_digdug, self.spawn_y, self.e_y)
+
+        fire = np.arange(MAX_LEN_ROPE) < self.fire_len[:, :, None]
+        burning = (
+            self.present
+            & self.fygar
+            & (
+                fire
+                & (self.fire_x == self.dd_x[:, None, None])
+                & (self.fire_y == self.dd_y[:, None, None])
+            ).any(axis=2)
+        )
+        crushed = (
+            self.r_present
+            & (self.r_x == self.dd_x[:, None])
+            & (self.r_y == self.dd_y[:, None])
+        )
+        kills = np.where(
+            mask,
+            at_digdug.sum(axis=1) + burning.sum(axis=1) + crushed.sum(axis=1),
+            0,
+        )
+        for n in range(kills.max(initial=0)):
+            self._kill_digdug(kills > n)
+
+        rocks = (
+            self.r_present[:, None, :]
+            & (self.r_x[:, None, :] == self.e_x[:, :, None])
+            & (self.r_y[:, None, :] == self.e_y[:, :, None])
+        ).sum(axis=2) * (self.present & mask[:, None])
+        killed = rocks > 0
+        self.points[killed] = ROCK_KILL_POINTS
+        self.alive[killed] = 0
+        self.freeze |= killed
+        self.score += (rocks * self._enemy_points()).sum(axis=1)
+
+    # rules
+
+    def _update_digdug(self, mask, keys):
+        shoot = mask & (keys == SHOOT)
+        walk = mask & (keys >= 0) & (keys < SHOOT)
+
+        # Rope.shoot
+        turned = shoot & (self.rope_dir > 0) & (self.dd_dir != self.rope_dir)
+        self._reset_rope(turned)
+        shoot &= ~turned
+        last = np.maximum(self.rope_len - 1, 0)
+        tip_x = np.where(self.rope_len > 0, self.rope_x[self._games, last], self.dd_x)
+        tip_y = np.where(self.rope_len > 0, self.rope_y[self._games, last], self.dd_y)
+        new_x, new_y = self._calc_pos(tip_x, tip_y, self.dd_dir, False)
+        fire = np.arange(MAX_LEN_ROPE) < self.fire_len[:, :, None]
+        cells = np.arange(MAX_LEN_ROPE + 1) < self.rope_len[:, None]
+        burnt = (
+            cells[:, None, None, :]
+            & (fire & self.present[:, :, None])[:, :, :, None]
+            & (self.fire_x[:, :, :, None] == self.rope_x[:, None, None, :])
+            & (self.fire_y[:, :, :, None] == self.rope_y[:, None, None, :])
+        ).any(axis=(1, 2, 3))
+        reset = shoot & (
+            self._has_rock(new_x, new_y) | self._on_rope(new_x, new_y) | burnt
+        )
+        self._reset_rope(reset)
+        grow = shoot & ~reset
+        self.rope_x[self._games, np.minimum(self.rope_len, MAX_LEN_ROPE)] = np.where(
+            grow,
+            new_x,
+            self.rope_x[self._games, np.minimum(self.rope_len, MAX_LEN_ROPE)],
+        )
+        self.rope_y[self._games, np.minimum(self.rope_len, MAX_LEN_ROPE)] = np.where(
+            grow,
+            new_y,
+            self.rope_y[self._games, np.minimum(self.rope_len, MAX_LEN_ROPE)],
+        )
+        self.rope_len = np.where(
+            grow, np.minimum(self.rope_len + 1, MAX_LEN_ROPE), self.rope_len
+        )
+        self.rope_dir = np.where(grow, self.dd_dir, self.rope_dir)
+        self._hit(mask & (keys == SHOOT))
+
+        # DigDug.move
+        self._reset_rope(walk)
+        new_x, new_y = self._calc_pos(
+            self.dd_x, self.dd_y, np.where(walk, keys, 0), True
+        )
+        walk &= ~self._has_rock(new_x, new_y)
+        self._move_digdug(walk, new_x, new_y)
+        dug = walk & (self._tile(self.dd_x, self.dd_y) == Tiles.STONE)
+        self.grid[self._games[dug], self.dd_x[dug] + 1, self.dd_y[dug] + 1] = (
+            Tiles.PASSAGE
+        )
+
+        cleared = mask & ~self.present.any(axis=1)
+        self.score += np.where(
+            cleared, (self.level * TIMEOUT - self.total_steps) // 10, 0
+        )
+        self.total_steps += np.where(cleared, self.steps, 0)
+        self.cleared |= cleared
+        return mask & ~cleared
+
+    def _candidates(self, k, traverse):
+        """Positions reachable by enemy k in each Direction, shape (4, N)."""
+        x, y = self.e_x[:, k], self.e_y[:, k]
+        return zip(*(self._calc_pos(x, y, d, traverse) for d in DIRECTIONS))
+
+    def _choose(self, k, traverse, target_x, target_y, farthest, avoid_enemies):
+        """Stable sort of the open positions by distance to target, first one wins."""
+        xs, ys = map(np.stack, self._candidates(k, traverse))
+        open_pos = ~((xs == self.last_x[:, k]) & (ys == self.last_y[:, k]))
+        for d in DIRECTIONS:
+            open_pos[d] &= ~self._has_rock(xs[d], ys[d])
+            if avoid_enemies:
+                others = self.present.copy()
+                others[:, k] = False
+                open_pos[d] &= ~(
+                    others & (self.e_x == xs[d][:, None]) & (self.e_y == ys[d][:, None])
+                ).any(axis=1)
+        dist = (xs - target_x) ** 2 + (ys - target_y) ** 2
+        dist = np.where(open_pos, -dist if farthest else dist, np.iinfo(int).max)
+        best = dist.argmin(axis=0)
+        new_x = np.where(open_pos.any(axis=0), xs[best, self._games], self.last_x[:, k])
+        new_y = np.where(open_pos.any(axis=0), ys[best, self._games], self.last_y[:, k])
+        return new_x, new_y
+
+    def _step_to(self, mask, k, new_x, new_y, lastdir):
+        old_x, old_y = self.e_x[:, k].copy(), self.e_y[:, k].copy()
+        self.last_x[:, k] = np.where(mask, old_x, self.last_x[:, k])
+        self.last_y[:, k] = np.where(mask, old_y, self.last_y[:, k])
+        self.e_x[:, k] = np.where(mask, new_x, old_x)
+        self.e_y[:, k] = np.where(mask, new_y, old_y)
+        moved = lastdir & mask & ((new_x != old_x) | (new_y != old_y))
+        self.lastdir[:, k] = np.where(
+            moved,
+            np.select(
+                [old_x < new_x, old_x > new_x, old_y < new_y],
+                [Direction.EAST, Direction.WEST, Direction.SOUTH],
+                Direction.NORTH,
+            ),
+            self.lastdir[:, k],
+        )
+
+    def _move_enemy(self, mask, k):
+        if not mask.any():
+            return
+        pooka = ~self.fygar[:, k]
+
+        # Pooka.move as a ghost goes through stone towards its corridor
+        ghost = mask & pooka & self.wallpass[:, k]
+        if ghost.any():
+            new_x, new_y = self._choose(
+                k, True, self.goal_x[:, k], self.goal_y[:, k], False, False
+            )
+            self._step_to(ghost, k, new_x, new_y, True)
+
+        # Enemy.move
+        walk = mask & ~ghost
+        self.tick[:, k] += np.where(walk, self.speed[:, k], 0)
+        ready = walk & (self.tick[:, k] >= Speed.FAST)
+        self.tick[ready, k] = 0
+
+        healing = ready & (self.alive[:, k] < MIN_ENEMY_LIFE)
+        for i, heal in self._draw(
+            healing, lambda rng: rng.random() < ENEMY_HEAL_ODD
+        ).items():
+            self.alive[i, k] += int(heal)
+        ready &= ~healing
+
+        unfreeze = ready & self.freeze[:, k]
+        self.freeze[unfreeze, k] = False
+        self.fire_len[unfreeze, k] = 0
+        ready &= ~unfreeze
+
+        smart = self.smart[:, k]
+        low = ready & (smart == Smart.LOW)
+        if low.any():
+            x, y = self._calc_pos(
+                self.e_x[:, k], self.e_y[:, k], self.lastdir[:, k], False
+            )
+            blocked = self._has_rock(x, y)
+            x = np.where(blocked, self.e_x[:, k], x)
+            y = np.where(blocked, self.e_y[:, k], y)
+            stuck = low & (x == self.e_x[:, k]) & (y == self.e_y[:, k])
+            for i, turn in self._draw(stuck, lambda rng: rng.randint(1, 4)).items():
+                self.lastdir[i, k] = (self.lastdir[i, k] + turn) % len(Direction)
+            self._step_to(low, k, x, y, False)
+
+        normal = ready & (smart == Smart.NORMAL)
+        if normal.any():
+            x, y = self._choose(k, False, self.dd_x, self.dd_y, True, False)
+            self._step_to(normal, k, x, y, True)
+
+        high = ready & (smart == Smart.HIGH)
+        if high.any():
+            x, y = self._choose(k, False, self.dd_x, self.dd_y, False, True)
+            self._step_to(high, k, x, y, True)
+
+        self.exit[:, k] |= ready & (self.e_x[:, k] == 0) & (self.e_y[:, k] == 0)
+
+        # Pooka.move leaves the ghost mode once in a passage
+        landed = (
+            mask
+            & pooka
+            & self.wallpass[:, k]
+            & (self._tile(self.e_x[:, k], self.e_y[:, k]) == Tiles.PASSAGE)
+        )
+        self.wallpass[landed, k] = False
+        for i in np.nonzero(landed)[0]:
+            self.goal_x[i, k], self.goal_y[i, k] = self.rngs[i].choice(self.spawns[i])
+        ghosting = mask & pooka & ~self.wallpass[:, k]
+        for i, odd in self._draw(ghosting, lambda rng: rng.random()).items():
+            self.wallpass[i, k] = odd < WALLPASS[self.smart[i, k]]
+
+        # Fygar.move breathes fire
+        fygar = mask & self.fygar[:, k]
+        fire_odd = np.where(self.dd_y == self.e_y[:, k], 0.5, 0.1)
+        horizontal = (self.lastdir[:, k] == Direction.EAST) | (
+            self.lastdir[:, k] == Direction.WEST
+        )
+        breathing = fygar & ~self.freeze[:, k] & horizontal
+        for i, odd in self._draw(breathing, lambda rng: rng.random()).items():
+            breathing[i] = odd < fire_odd[i]
+        if not breathing.any():
+            return
+        x, y = self.e_x[:, k], self.e_y[:, k]
+        burning = breathing.copy()
+        for j in range(MAX_LEN_ROPE):
+            nx, ny = self._calc_pos(x, y, self.lastdir[:, k], False)
+            burning &= ((nx != x) | (ny != y)) & ~self._has_rock(nx, ny)
+            self.fire_x[burning, k, j] = nx[burning]
+            self.fire_y[burning, k, j] = ny[burning]
+            self.fire_len[burning, k] = j + 1
+            x, y = nx, ny
+        self.freeze[breathing, k] = True
+
+    def _move_rock(self, mask, j):
+        x, y = self._calc_pos(self.r_x[:, j], self.r_y[:, j], Direction.SOUTH, False)
+        mask = mask & self.r_present[:, j] & ~self._has_rock(x, y)
+        waiting = mask & (self.dd_x == x) & (self.dd_y == y) & (self.falling[:, j] > 0)
+        self.falling[waiting, j] -= 1
+        mask &= ~waiting
+        for i, falling in self._draw(mask, lambda rng: rng.randint(3, 9)).items():
+            self.falling[i, j] = falling
+        self.r_x[:, j] = np.where(mask, x, self.r_x[:, j])
+        self.r_y[:, j] = np.where(mask, y, self.r_y[:, j])
+
+    def step(self, keys):
+        """Advance every running game one frame, keys holds one key per game."""
+        keys = np.array([KEYS.get(key, NO_KEY) if key else NO_KEY for key in keys])
+        active = self.running & ~self.cleared
+
+        respawn = active & self.respawn
+        self._move_digdug(respawn, self.dd_spawn[:, 0], self.dd_spawn[:, 1])
+        campers = (
+            respawn[:, None]
+            & self.present
+            & (
+                (self.e_x - self.dd_x[:, None]) ** 2
+                + (self.e_y - self.dd_y[:, None]) ** 2
+                < VITAL_SPACE**2
+            )
+        )
+        self.e_x = np.where(campers, self.spawn_x, self.e_x)
+        self.e_y = np.where(campers, self.spawn_y, self.e_y)
+        self.respawn &= ~respawn
+
+        self.steps += active
+        self._stop(active & (self.steps == self.timeout))
+
+        active = self._update_digdug(active, keys)
+
+        self._collision(active)
+
+        for k in range(self.present.shape[1]):
+            self._move_enemy(active & self.present[:, k] & (self.alive[:, k] > 0), k)
+
+        self._hit(active)
+
+        for j in range(self.r_present.shape[1]):
+            self._move_rock(active, j)
+
+        dead = self.present & (self.alive <= 0) & active[:, None]
+        self.score += (dead * self._enemy_points()).sum(axis=1)
+        self.present &= ~(active[:, None] & (dead | self.exit))
+
+        self._collision(active)
+
+    def state(self, i):
+        """State of game i, in the format of Game.step."""
+        state = {
+            "level": int(self.level[i]),
+            "step": int(self.steps[i]),
+            "timeout": int(self.timeout[i]),
+            "player": self.players[i],
+            "score": int(self.score[i]),
+            "lives": int(self.lives[i]),
+            "digdug": (int(self.dd_x[i]), int(self.dd_y[i])),
+            "enemies": [],
+            "rocks": [
+                {
+                    "id": self.rock_ids[i][j],
+                    "pos": (int(self.r_x[i, j]), int(self.r_y[i, j])),
+                }
+                for j in np.nonzero(self.r_present[i])[0]
+            ],
+        }
+        for k in np.nonzero(self.present[i])[0]:
+            enemy = {
+                "name": "Fygar" if self.fygar[i, k] else "Pooka",
+                "id": self.enemy_ids[i][k],
+                "pos": (int(self.e_x[i, k]), int(self.e_y[i, k])),
+                "dir": int(self.lastdir[i, k]),
+            }
+            if self.fygar[i, k] and self.fire_len[i, k]:
+                enemy["fire"] = [
+                    (int(self.fire_x[i, k, j]), int(self.fire_y[i, k, j]))
+                    for j in range(self.fire_len[i, k])
+                ]
+            if self.wallpass[i, k]:
+                enemy["traverse"] = True
+            state["enemies"].append(enemy)
+        if self.rope_len[i]:
+            state["rope"] = {
+                "dir": int(self.rope_dir[i]),
+                "pos": [
+                    (int(self.rope_x[i, j]), int(self.rope_y[i, j]))
+                    for j in range(self.rope_len[i])
+                ],
+            }
+        return state
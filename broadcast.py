@@ -0,0 +1,248 @@
+"""Fan-out of the messages of a game to its viewers.
+
+Every message is encoded once by the game and queued for each viewer, a task per
+viewer sends them, so a slow viewer never delays the game tick. When a viewer
+falls MAX_QUEUED frames behind its oldest frame is dropped, other messages (level
+info, highscores) are always delivered. Frames and messages may come in several
+encodings, each viewer gets the one it asked for.
+
+A viewer in delta mode that is new or dropped frames waits for a keyframe, which
+carries all the cells dug in the level, skipping the deltas that would not apply.
+The game asks wants_keyframe() before encoding a frame, to send one right away.
+Binary frames carry no dug cells, so viewers in both binary and delta mode get the
+keyframes, and at lower rates the deltas too, as JSON.
+
+Viewers may also watch at a lower rate, getting one frame every so many ticks:
+frames are sent separately for each rate, the deltas of a rate spanning all the
+ticks since its previous frame.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque, namedtuple
+
+logger = logging.getLogger("Broadcast")
+logger.setLevel(logging.INFO)
+
+MAX_QUEUED = 16  # frames waiting per viewer
+
+# keyframe: delta is a keyframe, it can be sent to a viewer out of sync
+Frame = namedtuple(
+    "Frame", ["seq", "full", "delta", "binary", "keyframe"], defaults=[None, False]
+)
+
+
+class Message(
+    namedtuple("Message", ["text", "binary", "digest", "short"], defaults=[None] * 3)
+):
+    """A message other than a frame, as JSON text and binary.
+
+    Level infos also carry the digest of their map and short, their text without
+    the map, for the clients that have the map already.
+    """
+
+    __slots__ = ()
+
+    def encoding(self, binary=False, maps=None):
+        """What to send to a client, given the digests of the maps it has (updated),
+        or None if it does not cache maps."""
+        if maps is not None and self.short is not None:
+            if self.digest in maps:
+                return self.short
+            maps.add(self.digest)
+        if binary and self.binary is not None:
+            return self.binary
+        return self.text
+
+
+class Outbox:
+    """Messages waiting to be sent to one viewer."""
+
+    def __init__(
+        self,
+        websocket,
+        delta=False,
+        size=MAX_QUEUED,
+        metrics=None,
+        binary=False,
+        maps=None,
+        every=1,
+    ):
+        self.websocket = websocket
+        self.every = every  # ticks between the frames the viewer gets
+        self.delta = delta  # viewer decodes delta frames
+        self.binary = binary  # viewer decodes binary frames
+        self.maps = maps  # digests of the maps the viewer has, None if it has no cache
+        self.dropped = 0
+        self._size = size
+        self._metrics = metrics
+        self._queue = deque()
+        self._frames = 0  # frames in the queue
+        self._last = None  # seq of the last frame sent
+        self._synced = False  # the viewer has all the frames since a keyframe
+        self.resync = True  # the viewer needs a keyframe that is not queued yet
+        self._closed = False  # sends no longer timed, the viewer may be forgotten
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, message):
+        """Queue a str or Message, or a Frame dropping the oldest frame if full."""
+        if isinstance(message, Frame):
+            if self._frames == self._size:
+                for queued in self._queue:
+                    if isinstance(queued, Frame):
+                        self._queue.remove(queued)
+                        break
+                self._frames -= 1
+                self.dropped += 1
+                self.resync = True
+            if message.keyframe:
+                self.resync = False
+            self._frames += 1
+        self._queue.append(message)
+        self._ready.set()
+
+    def close(self):
+        """Stop once the messages already queued are sent."""
+        self._queue.append(None)
+        self._ready.set()
+        self._closed = True
+
+    async def _run(self):
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+
+            message = self._queue.popleft()
+            if message is None:
+                return
+            if isinstance(message, Frame):
+                self._frames -= 1
+                # a delta only applies on top of the frame right before it
+                in_sync = (
+                    self._synced
+                    and self._last is not None
+                    and message.seq == self._last + 1
+                )
+                self._last = message.seq
+                binary = self.binary and message.binary is not None
+                if self.delta and message.delta is not None:
+                    self._synced = in_sync or message.keyframe
+                    if not self._synced:
+                        continue  # the keyframe asked for is on its way
+                    if binary and self.every == 1 and not message.keyframe:
+                        message = message.binary  # Dig Dug's moves show the digging
+                    else:
+                        message = message.delta
+                elif binary:
+                    message = message.binary
+                else:
+                    message = message.full
+            elif isinstance(message, Message):
+                message = message.encoding(self.binary, self.maps)
+            start = time.perf_counter()
+            try:
+                await self.websocket.send(message)
+            except Exception as err:
+                logger.info("Viewer disconnected: %s", err)
+                return
+            if self._metrics is not None and not self._closed:
+                self._metrics.observe(
+                    "viewer_send", time.perf_counter() - start, self.websocket
+                )
+
+    @property
+    def queued(self):
+        """Frames waiting to be sent."""
+        return self._frames
+
+    @property
+    def done(self):
+        return self._task.done()
+
+
+class Broadcast:
+    """Viewers of a game and their outboxes."""
+
+    def __init__(self, size=MAX_QUEUED, metrics=None):
+        self._size = size
+        self._metrics = metrics
+        self._outboxes = {}
+        self._seq = Counter()  # of the frames sent at each rate
+        self._dropped = 0  # frames dropped by viewers no longer attached
+
+    def __contains__(self, websocket):
+        return websocket in self._outboxes
+
+    def __iter__(self):
+        return iter(list(self._outboxes))
+
+    def __len__(self):
+        return len(self._outboxes)
+
+    def add(self, websocket, delta=False, binary=False, maps=None, every=1):
+        """Start sending to websocket, returns its Outbox."""
+        outbox = Outbox(
+            websocket, delta, self._size, self._metrics, binary, maps, every
+        )
+        self._outboxes[websocket] = outbox
+        return outbox
+
+    def discard(self, websocket):
+        outbox = self._outboxes.pop(websocket, None)
+        if outbox:
+            self._detached(outbox)
+            outbox.close()
+
+    def _detached(self, outbox):
+        self._dropped += outbox.dropped
+        if outbox.dropped:
+            logger.info("Viewer dropped %s frames", outbox.dropped)
+
+    def send(self, message, every=None):
+        """Queue a message for every viewer, or those watching every so many ticks."""
+        for websocket, outbox in list(self._outboxes.items()):
+            if outbox.done:  # it failed to send
+                del self._outboxes[websocket]
+                self._detached(outbox)
+                continue
+            if every is None or outbox.every == every:
+                outbox.put(message)
+
+    def send_frame(self, full, delta=None, binary=None, every=1, keyframe=False):
+        """Queue a game frame, viewers in delta mode get delta when they are in sync.
+
+        Viewers in binary mode get binary instead, if it is given. Only the viewers
+        watching every so many ticks get the frame, delta spans those ticks.
+        """
+        self._seq[every] += 1
+        self.send(Frame(self._seq[every], full, delta, binary, keyframe), every)
+
+    def wants_keyframe(self, every=1):
+        """Whether a viewer watching every so many ticks waits for a keyframe."""
+        return any(
+            outbox.resync and outbox.delta
+            for outbox in self._outboxes.values()
+            if outbox.every == every
+        )
+
+    @property
+    def rates(self):
+        """Ticks between frames wanted by the viewers, without duplicates."""
+        return {outbox.every for outbox in self._outboxes.values()}
+
+    @property
+    def dropped(self):
+        """Frames dropped so far, by all the viewers."""
+        return self._dropped + sum(o.dropped for o in self._outboxes.values())
+
+    @property
+    def queued(self):
+        """Frames waiting for the slowest viewer."""
+        return max((o.queued for o in self._outboxes.values()), default=0)
+
+    def close(self):
+        """Detach every viewer, after sending what is already queued to them."""
+        for websocket in list(self._outboxes):
+            self.discard(websocket)
@@ -1,7 +1,7 @@
+import functools
 import logging
 import math
 import random
-import uuid
 from collections import deque
 
 from consts import (
@@ -22,20 +22,75 @@ from mapa import VITAL_SPACE
 
 HISTORY_LEN = 10
 
+# slots restored from a keyframe as positions (tuples) or enums, not JSON lists and ints
+_POSITIONS = ("_pos", "_spawn_pos", "lastpos", "go_to_corridor")
+_ENUMS = {"_direction": Direction, "_speed": Speed, "_smart": Smart}
+
 logger = logging.getLogger("Characters")
 logger.setLevel(logging.INFO)
 
 
+@functools.cache
+def _slots(cls):
+    """Names of every slot of cls, copy.copy is too slow to fork entities."""
+    return tuple(name for c in cls.__mro__ for name in getattr(c, "__slots__", ()))
+
+
 class Character:
+    __slots__ = ("_pos", "_spawn_pos", "_direction", "_history")
+
     def __init__(self, x=1, y=1):
         self._pos = x, y
         self._spawn_pos = self._pos
         self._direction: Direction = Direction.EAST
-        self._history = deque(maxlen=HISTORY_LEN)
+        # history is only useful for debug messages, don't pay for it otherwise
+        self._history = (
+            deque(maxlen=HISTORY_LEN) if logger.isEnabledFor(logging.DEBUG) else None
+        )
 
     @property
     def history(self):
-        return str(list(self._history))
+        return str(list(self._history or []))
+
+    def _record(self):
+        if self._history is not None:
+            self._history.append(self._pos)
+
+    def fork(self, rng=None):
+        """Copy for a forked game, sharing nothing the game mutates."""
+        clone = object.__new__(type(self))
+        for name in _slots(type(self)):
+            setattr(clone, name, getattr(self, name))
+        if self._history is not None:
+            clone._history = self._history.copy()
+        return clone
+
+    def keyframe(self):
+        """Slots as plain values, but the random generator and the history."""
+        return {
+            name: getattr(self, name)
+            for name in _slots(type(self))
+            if name not in ("_rng", "_history")
+        }
+
+    @classmethod
+    def from_keyframe(cls, keyframe, rng=None):
+        """Character with the slots saved by keyframe(), sharing the rng of its game."""
+        self = object.__new__(cls)
+        for name, value in keyframe.items():
+            if name in _POSITIONS:
+                value = tuple(value)
+            elif name in _ENUMS:
+                value = _ENUMS[name](value)
+            elif name == "fire":
+                value = [tuple(pos) for pos in value]
+            setattr(self, name, value)
+        self._history = (
+            deque(maxlen=HISTORY_LEN) if logger.isEnabledFor(logging.DEBUG) else None
+        )
+        if "_rng" in _slots(cls):
+            self._rng = rng
+        return self
 
     @property
     def pos(self):
@@ -73,7 +128,7 @@ class Character:
         logger.debug("RESPAWN %s @ %s", self, self._spawn_pos)
         self.pos = self._spawn_pos
 
-    def move(self, mapa, rocks):
+    def move(self, mapa, occupancy):
         raise NotImplementedError
 
     def _calc_dir(self, old_pos, new_pos):
@@ -94,20 +149,28 @@ class Character:
 
 
 class Rock(Character):
-    def __init__(self, pos):
+    __slots__ = ("id", "_rng", "_falling")
+
+    def __init__(self, pos, id=0, rng=None):
         super().__init__(*pos)
-        self.id = uuid.uuid4()
-        self._falling = random.randint(3, 9)  # we never known when the rock will fall
+        self.id = id
+        self._rng = rng or random.Random()
+        self._falling = self._rng.randint(3, 9)  # we never known when the rock will fall
 
     def to_dict(self):
-        return {"id": str(self.id), "pos": self.pos}
+        return {"id": self.id, "pos": self._pos}
 
     def __str__(self):
         return f"Rock({self.pos})"
 
-    def move(self, mapa, digdug, rocks):
+    def fork(self, rng=None):
+        clone = super().fork()
+        clone._rng = rng or self._rng
+        return clone
+
+    def move(self, mapa, digdug, occupancy):
         open_pos = mapa.calc_pos(self.pos, Direction.SOUTH, traverse=False)
-        if open_pos in [r.pos for r in rocks]:  # don't fall on other rocks
+        if occupancy.has_rock(open_pos):  # don't fall on other rocks
             return
 
         if digdug.pos == open_pos and self._falling > 0:
@@ -115,7 +178,7 @@ class Rock(Character):
             return
 
         if self.pos != open_pos:
-            self._falling = random.randint(
+            self._falling = self._rng.randint(
                 3, 9
             )  # we never known when the rock will fall
 
@@ -123,6 +186,8 @@ class Rock(Character):
 
 
 class DigDug(Character):
+    __slots__ = ("_lives",)
+
     def __init__(self, pos, lives=LIVES):
         super().__init__(*pos)
         self._lives: int = lives
@@ -137,11 +202,11 @@ class DigDug(Character):
     def kill(self):
         self._lives -= 1
 
-    def move(self, mapa, direction, enemies, rocks):
-        self._history.append(self.pos)
+    def move(self, mapa, direction, enemies, occupancy):
+        self._record()
         new_pos = mapa.calc_pos(self.pos, direction)
 
-        if new_pos not in [r.pos for r in rocks]:  # don't bump into rocks
+        if not occupancy.has_rock(new_pos):  # don't bump into rocks
             self.pos = new_pos
             mapa.dig(self.pos)
 
@@ -150,17 +215,38 @@ class DigDug(Character):
 
 
 class Enemy(Character):
-    def __init__(self, pos, name, speed, smart, wallpass, lives=MIN_ENEMY_LIFE):
+    __slots__ = (
+        "_name",
+        "id",
+        "_rng",
+        "_speed",
+        "_smart",
+        "_wallpass",
+        "step",
+        "lastdir",
+        "lastpos",
+        "freeze",
+        "fire",
+        "_alive",
+        "exit",
+        "_points",
+    )
+    dir = list(Direction)
+
+    def __init__(
+        self, pos, name, speed, smart, wallpass, lives=MIN_ENEMY_LIFE, id=0, rng=None
+    ):
         self._name = name
-        self.id = uuid.uuid4()
+        self.id = id
+        self._rng = rng or random.Random()
         self._speed = speed
         self._smart = smart
         self._wallpass = wallpass
-        self.dir = list(Direction)
         self.step = 0
         self.lastdir = Direction.EAST
         self.lastpos = pos
         self.freeze = False
+        self.fire = []
         self._alive = lives  # TODO increase according to level
         self.exit = False
         self._points = None
@@ -172,11 +258,17 @@ class Enemy(Character):
             self._smart.name,
         )
 
+    def fork(self, rng=None):
+        clone = super().fork()
+        clone._rng = rng or self._rng
+        clone.fire = list(self.fire)
+        return clone
+
     def to_dict(self):
         return {
-            "name": self.name,
-            "id": str(self.id),
-            "pos": self.pos,
+            "name": self._name,
+            "id": self.id,
+            "pos": self._pos,
             "dir": self.lastdir,
         }
 
@@ -224,14 +316,14 @@ class Enemy(Character):
     def alive(self):
         return self._alive > 0
 
-    def move(self, mapa, digdug, enemies, rocks):
-        self._history.append(self.pos)
+    def move(self, mapa, digdug, enemies, occupancy):
+        self._record()
         if not self.ready():
             return
 
         if self._alive < MIN_ENEMY_LIFE:
             self._alive += int(
-                random.random() < ENEMY_HEAL_ODD
+                self._rng.random() < ENEMY_HEAL_ODD
             )  # Give it a chance to come back to life
             return
 
@@ -242,10 +334,10 @@ class Enemy(Character):
 
         if self._smart == Smart.LOW:
             new_pos = mapa.calc_pos(self.pos, self.dir[self.lastdir], self._wallpass)
-            if new_pos in [r.pos for r in rocks]:  # don't bump into rocks
+            if occupancy.has_rock(new_pos):  # don't bump into rocks
                 new_pos = self.pos
             if new_pos == self.pos:
-                self.lastdir = (self.lastdir + random.randint(1, 4)) % len(self.dir)
+                self.lastdir = (self.lastdir + self._rng.randint(1, 4)) % len(self.dir)
 
         elif self._smart == Smart.NORMAL:
             open_pos = [
@@ -253,8 +345,8 @@ class Enemy(Character):
                 for pos in [
                     mapa.calc_pos(self.pos, d, self._wallpass) for d in Direction
                 ]
-                if pos not in [self.lastpos]
-                and pos not in [r.pos for r in rocks]  # don't bump into rocks
+                if pos != self.lastpos
+                and not occupancy.has_rock(pos)  # don't bump into rocks
             ]
             if open_pos == []:
                 new_pos = self.lastpos
@@ -265,14 +357,14 @@ class Enemy(Character):
                 new_pos = next_pos[0]
 
         elif self._smart == Smart.HIGH:
-            enemies_pos = [e.pos for e in enemies if e.id != self.id]
             open_pos = [
                 pos
                 for pos in [
                     mapa.calc_pos(self.pos, d, self._wallpass) for d in Direction
                 ]
-                if pos not in [self.lastpos] + enemies_pos
-                and pos not in [r.pos for r in rocks]  # don't bump into rocks
+                if pos != self.lastpos
+                and not occupancy.has_enemy(pos, exclude=self)
+                and not occupancy.has_rock(pos)  # don't bump into rocks
             ]
             if open_pos == []:
                 new_pos = self.lastpos
@@ -298,20 +390,24 @@ class Enemy(Character):
 
 
 class Pooka(Enemy):
-    def __init__(self, pos, smart=Smart.NORMAL):
-        super().__init__(pos, self.__class__.__name__, Speed.FAST, smart, False)
+    __slots__ = ("go_to_corridor",)
+
+    def __init__(self, pos, smart=Smart.NORMAL, id=0, rng=None):
+        super().__init__(
+            pos, self.__class__.__name__, Speed.FAST, smart, False, id=id, rng=rng
+        )
         self.go_to_corridor = pos
 
-    def move(self, mapa, digdug, enemies, rocks):
+    def move(self, mapa, digdug, enemies, occupancy):
         if self._wallpass:
-            self._history.append(self.pos)
+            self._record()
             open_pos = [
                 pos
                 for pos in [
                     mapa.calc_pos(self.pos, d, self._wallpass) for d in Direction
                 ]
-                if pos not in [self.lastpos]
-                and pos not in [r.pos for r in rocks]  # don't bump into rocks
+                if pos != self.lastpos
+                and not occupancy.has_rock(pos)  # don't bump into rocks
             ]
             if open_pos == []:
                 new_pos = self.lastpos
@@ -325,19 +421,22 @@ class Pooka(Enemy):
             if self.lastpos != self.pos:
                 self.lastdir = self._calc_dir(self.lastpos, self.pos)
         else:
-            super().move(mapa, digdug, enemies, rocks)
+            super().move(mapa, digdug, enemies, occupancy)
         if self._wallpass and not mapa.is_blocked(self.pos, False):
             self._wallpass = False
-            self.go_to_corridor = random.choice(mapa.enemies_spawn)
+            self.go_to_corridor = self._rng.choice(mapa.enemies_spawn)
         
         if not self._wallpass:
-            self._wallpass = random.random() < WALLPASS_ODD[self._smart]
+            self._wallpass = self._rng.random() < WALLPASS_ODD[self._smart]
 
 
 class Fygar(Enemy):
-    def __init__(self, pos, smart=Smart.NORMAL):
-        self.fire = []
-        super().__init__(pos, self.__class__.__name__, Speed.SLOW, smart, False)
+    __slots__ = ()
+
+    def __init__(self, pos, smart=Smart.NORMAL, id=0, rng=None):
+        super().__init__(
+            pos, self.__class__.__name__, Speed.SLOW, smart, False, id=id, rng=rng
+        )
 
     def points(self, map_height):
         if self.lastdir in [Direction.EAST, Direction.WEST]:
@@ -345,14 +444,14 @@ class Fygar(Enemy):
 
         return super().points(map_height)
 
-    def move(self, mapa, digdug, enemies, rocks):
-        super().move(mapa, digdug, enemies, rocks)
+    def move(self, mapa, digdug, enemies, occupancy):
+        super().move(mapa, digdug, enemies, occupancy)
 
         fire_odd = 0.5 if digdug.pos[1] == self.pos[1] else 0.1
         if (
             not self.freeze
             and self.lastdir in [Direction.EAST, Direction.WEST]
-            and random.random() < fire_odd
+            and self._rng.random() < fire_odd
         ):
             pos = self.pos
             for _ in range(3):
@@ -360,7 +459,7 @@ class Fygar(Enemy):
                 if (
                     pos not in self.fire and
                     pos != self.pos and
-                    pos not in [r.pos for r in rocks]
+                    not occupancy.has_rock(pos)
                 ):  # Make sure we don't fire on ourselves and prevent fire through rocks
                     self.fire.append(pos)
                 else:
@@ -0,0 +1,179 @@
+"""D* Lite, shortest paths replanned across ticks instead of searched from scratch."""
+import heapq
+
+INFINITY = float("inf")
+
+
+class DStarLite:
+    """
+    Incremental planner for the paths the agent follows, one goal at a time.
+
+    The planner searches backwards from the goal and keeps its search tree between calls. When the goal
+    is the same as in the previous call only the positions whose costs changed since (the cell dug, the
+    cells entered or left by enemies and rocks) are repaired, and the search resumes from there. A new
+    goal restarts the search.
+
+    The costs and moves are the ones of search.astar: moving to a position costs its cost, and positions
+    next to a Pooka can not be entered, unless coming from the border of the map.
+    """
+
+    def __init__(self):
+        self.width = self.height = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the search tree, for instance when a new level starts.
+        """
+        self.goal = None
+
+    def plan(self, start, goal, cost, blocked):
+        """
+        Finds the cheapest path from the start to the goal.
+
+        Args:
+            start (tuple): A tuple representing the starting coordinates (x, y).
+            goal (tuple): A tuple representing the coordinates (x, y) to reach, as given by set_goal.
+            cost (list): A 2D list indexed as [x][y] with the cost of moving to each position.
+            blocked (list): A 2D list indexed as [x][y] of the positions that can only be entered from the border.
+
+        Returns:
+            list or None: The positions from the start to the goal, both included, or None if the goal can not
+            be reached.
+        """
+        width, height = len(cost), len(cost[0])
+        if not (0 <= goal[0] < width and 0 <= goal[1] < height):
+            return None  # set_goal can aim outside the map
+        cost = [value for column in cost for value in column]
+        blocked = [value for column in blocked for value in column]
+        start = start[0] * height + start[1]
+        goal = goal[0] * height + goal[1]
+
+        if (width, height) != (self.width, self.height):
+            self._resize(width, height)
+            self.goal = None
+        if goal != self.goal:
+            self._restart(start, goal, cost, blocked)
+        else:
+            self.km += self._heuristic(self.last, start)
+            self.last = start
+            changed = [
+                node
+                for node, (old, new, was, now) in enumerate(
+                    zip(self.cost, cost, self.blocked, blocked)
+                )
+                if old != new or was != now
+            ]
+            self.cost, self.blocked = cost, blocked
+            for node in changed:
+                for neighbor in self.neighbors[node]:
+                    self._update(neighbor)
+
+        self._compute(start)
+        if self.g[start] == INFINITY:
+            return None
+
+        # Segue sempre o vizinho mais barato ate ao objetivo
+        path = [start]
+        node = start
+        while node != goal:
+            best = INFINITY
+            for neighbor in self.neighbors[node]:
+                total = self._edge(node, neighbor) + self.g[neighbor]
+                if total < best:
+                    best, following = total, neighbor
+            if best == INFINITY:
+                return None
+            node = following
+            path.append(node)
+        return [divmod(node, height) for node in path]
+
+    def _resize(self, width, height):
+        self.width, self.height = width, height
+        self.xs = [x for x in range(width) for y in range(height)]
+        self.ys = [y for x in range(width) for y in range(height)]
+        self.border = [
+            x in (0, width - 1) or y in (0, height - 1)
+            for x in range(width)
+            for y in range(height)
+        ]
+        # Mesma ordem que o astar: cima, baixo, esquerda, direita
+        self.neighbors = [
+            [
+                (x + dx) * height + y + dy
+                for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0)]
+                if 0 <= x + dx < width and 0 <= y + dy < height
+            ]
+            for x in range(width)
+            for y in range(height)
+        ]
+
+    def _restart(self, start, goal, cost, blocked):
+        self.goal, self.last, self.km = goal, start, 0
+        self.cost, self.blocked = cost, blocked
+        self.g = [INFINITY] * len(cost)
+        self.rhs = [INFINITY] * len(cost)
+        self.rhs[goal] = 0
+        self.keys = {goal: self._key(goal)}
+        self.queue = [(self.keys[goal], goal)]
+
+    def _heuristic(self, a, b):
+        return abs(self.xs[a] - self.xs[b]) + abs(self.ys[a] - self.ys[b])
+
+    def _key(self, node):
+        best = min(self.g[node], self.rhs[node])
+        return (best + self._heuristic(self.last, node) + self.km, best)
+
+    def _edge(self, node, neighbor):
+        if self.blocked[neighbor] and not self.border[node]:
+            return INFINITY
+        return self.cost[neighbor]
+
+    def _update(self, node):
+        if node != self.goal:
+            g, cost, blocked = self.g, self.cost, self.blocked
+            inside = not self.border[node]
+            best = INFINITY
+            for neighbor in self.neighbors[node]:
+                if inside and blocked[neighbor]:
+                    continue
+                total = cost[neighbor] + g[neighbor]
+                if total < best:
+                    best = total
+            self.rhs[node] = best
+        if self.g[node] != self.rhs[node]:
+            key = self._key(node)
+            self.keys[node] = key
+            heapq.heappush(self.queue, (key, node))
+        else:
+            self.keys.pop(node, None)
+
+    def _top(self):
+        # Descarta as entradas desatualizadas da fila
+        while self.queue:
+            key, node = self.queue[0]
+            if self.keys.get(node) == key:
+                return key, node
+            heapq.heappop(self.queue)
+        return (INFINITY, INFINITY), None
+
+    def _compute(self, start):
+        g, rhs = self.g, self.rhs
+        while True:
+            key, node = self._top()
+            if node is None or (rhs[start] == g[start] and key >= self._key(start)):
+                return
+            heapq.heappop(self.queue)
+            current = self._key(node)
+            if key < current:
+                self.keys[node] = current
+                heapq.heappush(self.queue, (current, node))
+                continue
+            del self.keys[node]
+            if g[node] > rhs[node]:
+                g[node] = rhs[node]
+            else:
+                g[node] = INFINITY
+                self._update(node)
+            for neighbor in self.neighbors[node]:
+                self._update(neighbor)
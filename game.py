@@ -1,10 +1,14 @@
 import asyncio
+import copy
+import json
 import logging
 import math
 import random
+import time
 
 from characters import DigDug, Direction, Fygar, Pooka, Rock
 from mapa import VITAL_SPACE, Map
+from occupancy import Occupancy
 from consts import Smart, LIVES, TIMEOUT, MAX_LEN_ROPE, MIN_ENEMIES
 
 logger = logging.getLogger("Game")
@@ -15,9 +19,9 @@ GAME_SPEED = 10
 MAP_SIZE = (48, 24)
 
 
-def level_enemies(level):
+def level_enemies(level, rng):
     level += MIN_ENEMIES
-    fygars = random.randrange(1, level // 2)
+    fygars = rng.randrange(1, level // 2)
     pookas = level - fygars
     return [Fygar] * fygars + [Pooka] * pookas
 
@@ -34,6 +38,20 @@ def key2direction(key):
     return None
 
 
+# attributes of a Game saved by their own keyframe, or not at all
+_ENTITIES = (
+    "_rng",
+    "map",
+    "_digdug",
+    "_enemies",
+    "_rocks",
+    "_occupancy",
+    "_rope",
+    "recorder",
+    "metrics",
+)
+
+
 class Rope:
     def __init__(self, mapa):
         self._pos = []
@@ -45,6 +63,12 @@ class Rope:
         self._dir = None
         return
 
+    def fork(self, mapa):
+        clone = Rope(mapa)
+        clone._pos = list(self._pos)
+        clone._dir = self._dir
+        return clone
+
     @property
     def stretched(self):
         return self._pos != []
@@ -52,7 +76,7 @@ class Rope:
     def to_dict(self):
         return {"dir": self._dir, "pos": self._pos}
 
-    def shoot(self, pos, direction, _rocks, _enemies):
+    def shoot(self, pos, direction, occupancy):
         if self._dir and direction != self._dir:
             return self.__reset_rope()  # reset rope because digdug changed direction
 
@@ -61,15 +85,14 @@ class Rope:
         else:
             new_pos = self._map.calc_pos(pos, direction, traverse=False)
 
-        if new_pos in [r.pos for r in _rocks]:  # we hit a rock
+        if occupancy.has_rock(new_pos):  # we hit a rock
             return self.__reset_rope()
 
         if new_pos in self._pos:  # we hit a wall
             return self.__reset_rope()
 
-        for e in _enemies:  # rope caught fire
-            if isinstance(e, Fygar) and e.fire and any(p in self._pos for p in e.fire):
-                return self.__reset_rope()
+        if any(occupancy.on_fire(p) for p in self._pos):  # rope caught fire
+            return self.__reset_rope()
 
         self._pos.append(new_pos)
 
@@ -93,9 +116,16 @@ class Rope:
         return False
 
 
+_ENEMIES = {"Pooka": Pooka, "Fygar": Fygar}
+
+
 class Game:
-    def __init__(self, level=1, lives=LIVES, timeout=TIMEOUT, size=MAP_SIZE):
-        logger.info(f"Game(level={level}, lives={lives})")
+    def __init__(
+        self, level=1, lives=LIVES, timeout=TIMEOUT, size=MAP_SIZE, seed=None
+    ):
+        logger.info(f"Game(level={level}, lives={lives}, seed={seed})")
+        self._rng = random.Random(seed)
+        self._next_id = 0
         self.initial_level = level
         self._running = False
         self._timeout = timeout
@@ -104,15 +134,23 @@ class Game:
         self._total_steps = 0
         self._state = {}
         self._initial_lives = lives
-        self.map = Map(size=size, empty=True)
+        self.map = Map(size=size, empty=True, rng=self._rng)
         self._enemies = []
+        self._rocks = []
+        self._occupancy = Occupancy()
         self._rope = Rope(self.map)
         self.respawn = False
+        self.recorder = None  # replay.Recorder of this game, if any
+        self.metrics = None  # metrics.Metrics timing the phases of each step
 
     @property
     def level(self):
         return self.map.level
 
+    @property
+    def rng(self):
+        return self._rng
+
     @property
     def running(self):
         return self._running
@@ -150,7 +188,7 @@ class Game:
 
     def next_level(self, level):
         logger.info("NEXT LEVEL")
-        self.map = Map(level=level, size=self.map.size)
+        self.map = Map(level=level, size=self.map.size, rng=self._rng)
         self._digdug.respawn()
         self._total_steps += self._step
         self._step = 0
@@ -159,12 +197,105 @@ class Game:
         self._enemies = [
             enemy(
                 pos,
-                smart=random.choices(list(Smart), [1, level // 7, level // 14], k=1)[0],
+                smart=self._rng.choices(
+                    list(Smart), [1, level // 7, level // 14], k=1
+                )[0],
+                id=self.new_id(),
+                rng=self._rng,
+            )
+            for enemy, pos in zip(
+                level_enemies(level, self._rng), self.map.enemies_spawn
             )
-            for enemy, pos in zip(level_enemies(level), self.map.enemies_spawn)
         ]
         logger.debug("Enemies: %s", self._enemies)
-        self._rocks = [Rock(p) for p in self.map.rocks_spawn]
+        self._rocks = [
+            Rock(p, id=self.new_id(), rng=self._rng) for p in self.map.rocks_spawn
+        ]
+        self._occupancy = Occupancy(self._rocks, self._enemies)
+
+    def fork(self):
+        """Independent copy of the game, cheap enough for look-ahead search.
+
+        Only the dynamic state (entities, rope, counters and random generator) is
+        copied, the map tiles are shared until one of the games digs.
+        """
+        clone = copy.copy(self)
+        clone.recorder = None
+        clone.metrics = None
+        clone._rng = random.Random.__new__(random.Random)
+        clone._rng.setstate(self._rng.getstate())
+        clone.map = self.map.fork()
+        clone._rope = self._rope.fork(clone.map)
+        if hasattr(self, "_digdug"):
+            clone._digdug = self._digdug.fork()
+        clone._enemies = [e.fork(clone._rng) for e in self._enemies]
+        clone._rocks = [r.fork(clone._rng) for r in self._rocks]
+        clone._occupancy = Occupancy(clone._rocks, clone._enemies)
+        return clone
+
+    def snapshot(self):
+        """Saved state to give to restore(), it must not be played itself."""
+        return self.fork()
+
+    def restore(self, snapshot):
+        """Go back to a state saved by snapshot(), which can be restored again."""
+        recorder, metrics = self.recorder, self.metrics  # the fork has none
+        self.__dict__.update(snapshot.fork().__dict__)
+        self.recorder, self.metrics = recorder, metrics
+
+    def keyframe(self):
+        """State of the game as plain (JSON) values, see from_keyframe()."""
+        attributes = {
+            name: value
+            for name, value in self.__dict__.items()
+            if name not in _ENTITIES
+        }
+        return json.loads(
+            json.dumps(
+                {
+                    "game": attributes,
+                    "rng": self._rng.getstate(),
+                    "map": self.map.keyframe(),
+                    "digdug": self._digdug.keyframe(),
+                    "enemies": [
+                        [type(enemy).__name__, enemy.keyframe()]
+                        for enemy in self._enemies
+                    ],
+                    "rocks": [rock.keyframe() for rock in self._rocks],
+                    "rope": self._rope.to_dict(),
+                }
+            )
+        )
+
+    @classmethod
+    def from_keyframe(cls, keyframe):
+        """New game in the state saved by keyframe(), neither recorded nor timed."""
+        game = cls.__new__(cls)
+        game.__dict__.update(keyframe["game"])
+        version, internal, gauss = keyframe["rng"]
+        game._rng = random.Random()
+        game._rng.setstate((version, tuple(internal), gauss))
+        game.map = Map.from_keyframe(keyframe["map"])
+        game._digdug = DigDug.from_keyframe(keyframe["digdug"])
+        game._enemies = [
+            _ENEMIES[name].from_keyframe(enemy, game._rng)
+            for name, enemy in keyframe["enemies"]
+        ]
+        game._rocks = [
+            Rock.from_keyframe(rock, game._rng) for rock in keyframe["rocks"]
+        ]
+        game._occupancy = Occupancy(game._rocks, game._enemies)
+        game._rope = Rope(game.map)
+        game._rope._pos = [tuple(pos) for pos in keyframe["rope"]["pos"]]
+        game._rope._dir = keyframe["rope"]["dir"]
+        game.recorder = None
+        game.metrics = None
+        return game
+
+    def new_id(self):
+        """Entity ids are a per game counter, reproducible for a given seed."""
+        self._next_id += 1
+        return self._next_id
 
     def quit(self):
         logger.debug("Quit")
@@ -183,8 +314,7 @@ class Game:
                     self._rope.shoot(
                         self._digdug.pos,
                         self._digdug.direction,
-                        self._rocks,
-                        self._enemies,
+                        self._occupancy,
                     )
                     if self._rope.hit(self._enemies):
                         logger.debug(
@@ -204,7 +334,7 @@ class Game:
                     self.map,
                     key2direction(self._lastkeypress),
                     self._enemies,
-                    self._rocks,
+                    self._occupancy,
                 )
 
         except AssertionError:
@@ -242,42 +372,62 @@ class Game:
             not self._running
         ):  # if game is not running, we don't need to check collisions
             return
-        for e in self._enemies:
-            if e.pos == self._digdug.pos:
-                logger.debug("[step=%s] %s has killed %s", self._step, e, self._digdug)
-                self.kill_digdug()
-                e.respawn()
-            if e._name == "Fygar" and e.fire:
-                if self._digdug.pos in e.fire:
-                    logger.debug(
-                        "[step=%s] %s has killed %s with fire",
-                        self._step,
-                        e,
-                        self._digdug,
-                    )
-                    self.kill_digdug()
-        for r in self._rocks:
-            if r.pos == self._digdug.pos:
-                logger.debug("[step=%s] %s has killed %s", self._step, r, self._digdug)
-                self.kill_digdug()
-            for e in self._enemies:
-                if r.pos == e.pos:
+        for e in self._occupancy.enemies_at(self._digdug.pos):
+            logger.debug("[step=%s] %s has killed %s", self._step, e, self._digdug)
+            self.kill_digdug()
+            self.respawn_enemy(e)
+        for _ in range(self._occupancy.fire_at(self._digdug.pos)):
+            logger.debug(
+                "[step=%s] Fygar has killed %s with fire", self._step, self._digdug
+            )
+            self.kill_digdug()
+        for r in self._occupancy.rocks_at(self._digdug.pos):
+            logger.debug("[step=%s] %s has killed %s", self._step, r, self._digdug)
+            self.kill_digdug()
+        for pos, rocks in self._occupancy.rocks.items():
+            for e in self._occupancy.enemies_at(pos):
+                for _ in rocks:
                     e.kill(rock=True)
                     self._score += e.points(self.map.ver_tiles)
 
+    def respawn_enemy(self, enemy):
+        old_pos = enemy.pos
+        enemy.respawn()
+        self._occupancy.enemy_moved(enemy, old_pos)
+
     async def next_frame(self):
         await asyncio.sleep(1.0 / GAME_SPEED)
+        return self.step()
+
+    def _lap(self, phase, start):
+        """Account the time since start to phase, returns the time now."""
+        if self.metrics is None:
+            return start
+        now = time.perf_counter()
+        self.metrics.observe(phase, now - start)
+        return now
+
+    def step(self, key=None):
+        """Advance the game by one frame, without waiting for the wall clock.
+
+        If key is given it replaces the last keypress before the frame is computed.
+        """
+        if key is not None:
+            self.keypress(key)
 
         if not self._running:
             logger.info("Waiting for player 1")
             return
 
+        if self.recorder is not None:
+            self.recorder.record(self, self._lastkeypress)
+
         if self.respawn:
             self._digdug.respawn()
             for e in self._enemies:
                 if math.dist(self._digdug.pos, e.pos) < VITAL_SPACE:
                     logger.debug("respawn camper")
-                    e.respawn()
+                    self.respawn_enemy(e)
             self.respawn = False
 
         self._step += 1
@@ -289,14 +439,19 @@ class Game:
                 f"[{self._step}] SCORE {self._score} - LIVES {self._digdug.lives}"
             )
 
+        lap = time.perf_counter() if self.metrics is not None else 0
         if not self.update_digdug():
             return  # if update_digdug returns false, we have a new level and we stop right here
+        lap = self._lap("digdug", lap)
 
         self.collision()
+        lap = self._lap("collision", lap)
 
         for enemy in self._enemies:
             if enemy.alive:
-                enemy.move(self.map, self._digdug, self._enemies, self._rocks)
+                old_pos = enemy.pos
+                enemy.move(self.map, self._digdug, self._enemies, self._occupancy)
+                self._occupancy.enemy_moved(enemy, old_pos)
         if self._rope.stretched and self._rope.hit(self._enemies):
             logger.debug(
                 "[step=%s] Enemy hit with rope(%s) - enemies: %s - digdug: %s",
@@ -305,18 +460,24 @@ class Game:
                 self._enemies,
                 self._digdug,
             )
+        lap = self._lap("enemies", lap)
 
         for rock in self._rocks:
-            rock.move(self.map, digdug=self._digdug, rocks=self._rocks)
+            old_pos = rock.pos
+            rock.move(self.map, digdug=self._digdug, occupancy=self._occupancy)
+            self._occupancy.rock_moved(rock, old_pos)
 
         self._score += sum(
             [e.points(self.map.ver_tiles) for e in self._enemies if not e.alive]
         )
-        self._enemies = [
-            e for e in self._enemies if e.alive and not e.exit
-        ]  # remove dead and exited enemies
+        for e in self._enemies:  # remove dead and exited enemies
+            if not e.alive or e.exit:
+                self._occupancy.remove_enemy(e)
+        self._enemies = [e for e in self._enemies if e.alive and not e.exit]
+        lap = self._lap("rocks", lap)
 
         self.collision()
+        lap = self._lap("collision", lap)
 
         self._state = {
             "level": self.map.level,
@@ -339,13 +500,15 @@ class Game:
 
         if self._rope.stretched:
             self._state["rope"] = self._rope.to_dict()
+        self._lap("state", lap)
 
         return self._state
 
     def info(self):
         return {
             "size": self.map.size,
-            "map": self.map.map,
+            "map": self.map.map.tolist(),
+            "digest": self.map.digest,
             "fps": GAME_SPEED,
             "timeout": TIMEOUT,
             "lives": LIVES,
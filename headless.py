@@ -0,0 +1,93 @@
+"""Headless game runner, plays full games against an in-process agent."""
+import argparse
+import importlib
+import json
+import logging
+import time
+
+from consts import LIVES, TIMEOUT
+from game import Game
+
+
+def load_agent(spec: str):
+    """Import an agent factory given as "module:attribute" (e.g. "student:Agent")."""
+    module_name, _, attribute = spec.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or "Agent")
+
+
+def quiet():
+    """Silence the engine loggers, formatting their debug messages costs more than the game."""
+    for name in ("Game", "Map", "Characters"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def wire(message):
+    """Round-trip a message through JSON, so the agent sees what the server would send."""
+    return json.loads(json.dumps(message))
+
+
+def play(agent, player="headless", level=1, seed=0, lives=LIVES, timeout=TIMEOUT):
+    """Play a whole game as fast as possible and return its final statistics.
+
+    agent is any object with an update(message) method that returns the key to
+    press (or None), exactly like a networked client receiving the server messages.
+    """
+    game = Game(
+        level=level, lives=lives, timeout=timeout, seed=seed if seed > 0 else None
+    )
+    game.start(player)
+
+    steps = 0
+    while game.running:
+        if game._step == 0:  # Starting a level ? Let's send the info
+            key = agent.update(wire(game.info()))
+            if key is not None:
+                game.keypress(key)
+
+        state = game.step()
+        steps += 1
+        if state:
+            key = agent.update(wire(state))
+            if key is not None:
+                game.keypress(key)
+
+    return {
+        "player": player,
+        "seed": seed,
+        "start_level": level,
+        "score": game.score,
+        "level": game.level,
+        "steps": steps,
+        "lives": game._digdug.lives,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--agent", help="agent factory as module:attribute", default="student:Agent"
+    )
+    parser.add_argument("--name", help="player name", default="headless")
+    parser.add_argument("--seed", help="Seed number", type=int, default=0)
+    parser.add_argument("--level", help="Starting level", type=int, default=1)
+    parser.add_argument("--games", help="Number of games to play", type=int, default=1)
+    parser.add_argument(
+        "--verbose", help="Keep the engine debug logging", action="store_true"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    if not args.verbose:
+        quiet()
+
+    factory = load_agent(args.agent)
+    for n in range(args.games):
+        seed = args.seed + n if args.seed > 0 else 0
+        start = time.perf_counter()
+        result = play(factory(), args.name, args.level, seed)
+        result["elapsed"] = round(time.perf_counter() - start, 3)
+        print(json.dumps(result))
@@ -0,0 +1,103 @@
+"""Highscores kept in memory and written to disk behind the game's back."""
+import heapq
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger("Highscores")
+logger.setLevel(logging.INFO)
+
+HIGHSCORE_FILE = "highscores.json"
+MAX_HIGHSCORES = 10
+FLUSH_DELAY = 1.0  # seconds to wait for more scores before writing the file
+
+
+class HighscoreStore:
+    """Top highscores, a list of (player, score) best first like highscores.json.
+
+    Adding a score only touches a heap of the best ones, a writer thread then
+    replaces the file atomically, at most once every FLUSH_DELAY seconds.
+    """
+
+    def __init__(
+        self,
+        path: str = HIGHSCORE_FILE,
+        size: int = MAX_HIGHSCORES,
+        flush_delay: float = FLUSH_DELAY,
+    ):
+        self._path = path
+        self._size = size
+        self._flush_delay = flush_delay
+        self._heap = []  # (score, -order, player), the worst highscore first
+        self._order = 0  # ties keep the oldest score
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one writer of the file at a time
+        self._dirty = threading.Event()  # scores not written yet
+        self._stop = threading.Event()
+
+        if os.path.isfile(path):
+            with open(path, "r") as infile:
+                for player, score in json.load(infile):
+                    self._push(player, score)
+        self._scores = self._sorted()
+        self._changed = False
+
+        self._writer = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer.start()
+
+    def _push(self, player, score):
+        entry = (score, -self._order, player)
+        self._order += 1
+        if len(self._heap) < self._size:
+            heapq.heappush(self._heap, entry)
+        else:
+            heapq.heappushpop(self._heap, entry)
+
+    def _sorted(self):
+        return [
+            (player, score) for score, _, player in sorted(self._heap, reverse=True)
+        ]
+
+    @property
+    def scores(self):
+        """Highscores, best first."""
+        return self._scores
+
+    def add(self, player: str, score: int):
+        with self._lock:
+            self._push(player, score)
+            self._scores = self._sorted()
+            self._changed = True
+        self._dirty.set()
+
+    def flush(self):
+        """Write the highscores to the file now, replacing it atomically."""
+        with self._write_lock:
+            with self._lock:
+                self._dirty.clear()
+                self._changed = False
+                scores = self._scores
+            tmp = f"{self._path}.tmp"
+            with open(tmp, "w") as outfile:
+                json.dump(scores, outfile)
+            os.replace(tmp, self._path)
+
+    def _write_behind(self):
+        while True:
+            self._dirty.wait()
+            self._stop.wait(self._flush_delay)  # let scores of other games pile up
+            if self._stop.is_set():
+                return  # close() writes what is left
+            try:
+                self.flush()
+            except OSError as err:
+                logger.error("Could not save highscores: %s", err)
+
+    def close(self):
+        """Stop the writer thread, writing any pending highscores."""
+        self._stop.set()
+        self._dirty.set()  # wake the writer up if it is idle
+        self._writer.join()
+        if self._changed:
+            self.flush()
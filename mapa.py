@@ -1,12 +1,30 @@
+import hashlib
 import logging
 import random
-from enum import IntEnum
+
+import numpy as np
 
 from consts import Direction, Tiles, VITAL_SPACE, MIN_CORRIDOR_LEN
 
 logger = logging.getLogger("Map")
 logger.setLevel(logging.INFO)
 
+BORDER = 0xFF  # sentinel tile surrounding the map, blocked even when traversing
+OFFSETS = {
+    Direction.NORTH: (0, -1),
+    Direction.EAST: (1, 0),
+    Direction.SOUTH: (0, 1),
+    Direction.WEST: (-1, 0),
+}
+
+
+def tiles_digest(tiles):
+    """Content address of tiles, identical maps have the same digest."""
+    hor_tiles, ver_tiles = tiles.shape
+    digest = hashlib.blake2b(f"{hor_tiles}x{ver_tiles}".encode(), digest_size=16)
+    digest.update(np.ascontiguousarray(tiles, dtype=np.uint8).tobytes())
+    return digest.hexdigest()
+
 
 class Map:
     def __init__(
@@ -17,6 +35,7 @@ class Map:
         mapa=None,
         enemies_spawn=None,
         empty=False,
+        rng=None,
     ):
         assert size[0] > VITAL_SPACE + 9
         assert size[1] > VITAL_SPACE + 9
@@ -27,44 +46,45 @@ class Map:
         self.ver_tiles = size[1]
         self._rocks = rocks
         self._digged = []
+        rng = rng or random.Random()
         if enemies_spawn:
             self._enemies_spawn = enemies_spawn
         else:
             self._enemies_spawn = []
 
-        if not mapa:
+        if mapa is None:
             logger.info("Generating a MAP")
-            self.map = [[Tiles.STONE] * self.ver_tiles for i in range(self.hor_tiles)]
+            tiles = [[Tiles.STONE] * self.ver_tiles for i in range(self.hor_tiles)]
             for x in range(self.hor_tiles):
                 for y in range(self.ver_tiles):
                     if y in range(0, 2):
-                        self.map[x][y] = Tiles.PASSAGE
+                        tiles[x][y] = Tiles.PASSAGE
                     elif x in [0, self.hor_tiles - 1] or y in [0, self.ver_tiles - 1]:
-                        self.map[x][y] = Tiles.STONE
+                        tiles[x][y] = Tiles.STONE
                     elif x % 2 == 0 and y % 2 == 0:
-                        self.map[x][y] = Tiles.STONE
+                        tiles[x][y] = Tiles.STONE
                     elif (
                         x >= VITAL_SPACE and y >= VITAL_SPACE and not empty
                     ):  # give dig dug some room
-                        if random.randint(0, 100) > 70 + 25 / level:
-                            self.map[x][y] = Tiles.STONE
+                        if rng.randint(0, 100) > 70 + 25 / level:
+                            tiles[x][y] = Tiles.STONE
 
             # create caves for enemies
             for e in range(self._level + 2):
-                if random.choice([True, False]):
+                if rng.choice([True, False]):
                     # horizontal
-                    line = random.randrange(VITAL_SPACE + 1, self.ver_tiles)
-                    offset = random.randrange(0, self.hor_tiles - MIN_CORRIDOR_LEN)
+                    line = rng.randrange(VITAL_SPACE + 1, self.ver_tiles)
+                    offset = rng.randrange(0, self.hor_tiles - MIN_CORRIDOR_LEN)
                     for x in range(MIN_CORRIDOR_LEN):
-                        self.map[offset + x][line] = Tiles.PASSAGE
+                        tiles[offset + x][line] = Tiles.PASSAGE
                     self._enemies_spawn.append((offset, line))
                     logger.debug(f"Spawn enemy at ({offset}, {line})")
                 else:
                     # vertical
-                    column = random.randrange(0, self.hor_tiles)
-                    offset = random.randrange(3, self.ver_tiles - MIN_CORRIDOR_LEN)
+                    column = rng.randrange(0, self.hor_tiles)
+                    offset = rng.randrange(3, self.ver_tiles - MIN_CORRIDOR_LEN)
                     for y in range(MIN_CORRIDOR_LEN):
-                        self.map[column][offset + y] = Tiles.PASSAGE
+                        tiles[column][offset + y] = Tiles.PASSAGE
                     self._enemies_spawn.append((column, offset))
                     logger.debug(f"Spawn enemy at ({column}, {offset})")
 
@@ -72,14 +92,15 @@ class Map:
             if not self._rocks:
                 self._rocks = []
                 for r in range(self._level):
-                    x, y = random.randrange(0, self.hor_tiles), random.randrange(
+                    x, y = rng.randrange(0, self.hor_tiles), rng.randrange(
                         VITAL_SPACE + 1, self.ver_tiles - VITAL_SPACE
                     )
-                    while self.map[x][y] != Tiles.STONE:
-                        x, y = random.randrange(0, self.hor_tiles), random.randrange(
+                    while tiles[x][y] != Tiles.STONE:
+                        x, y = rng.randrange(0, self.hor_tiles), rng.randrange(
                             VITAL_SPACE + 1, self.ver_tiles - VITAL_SPACE
                         )
                     self._rocks.append((x, y))
+            self.map = tiles
         else:
             logger.info("Loading MAP")
             self.map = mapa
@@ -87,10 +108,75 @@ class Map:
         self._digdug_spawn = (1, 1)  # Always true
 
     def __getstate__(self):
-        return self.map
+        state = dict(self.__dict__)
+        for name in ("_grid", "_map", "_sharers"):
+            del state[name]
+        state["map"] = self.map.tolist()
+        return state
 
     def __setstate__(self, state):
-        self.map = state
+        if isinstance(state, list):  # only the tiles
+            self.map = state
+            return
+        state = dict(state)
+        tiles = state.pop("map")
+        self.__dict__.update(state)
+        self.map = tiles
+
+    def keyframe(self):
+        """Tiles and attributes as plain values, for a replay."""
+        return self.__getstate__()
+
+    @classmethod
+    def from_keyframe(cls, keyframe):
+        """Map saved by keyframe(), with its positions back to tuples."""
+        self = cls.__new__(cls)
+        self.__setstate__(keyframe)
+        self._size = tuple(self._size)
+        self._digdug_spawn = tuple(self._digdug_spawn)
+        for name in ("_rocks", "_enemies_spawn", "_digged"):
+            setattr(self, name, [tuple(pos) for pos in getattr(self, name)])
+        return self
+
+    @property
+    def map(self):
+        """Tiles indexed as map[x][y], a view over the grid without its border."""
+        return self._map
+
+    @map.setter
+    def map(self, mapa):
+        tiles = np.asarray(mapa, dtype=np.uint8)
+        self.hor_tiles, self.ver_tiles = tiles.shape
+        self._grid = np.full((self.hor_tiles + 2, self.ver_tiles + 2), BORDER, np.uint8)
+        self._grid[1:-1, 1:-1] = tiles
+        self._map = self._grid[1:-1, 1:-1]
+        self._sharers = [1]  # maps sharing the grid, copy it before writing if > 1
+
+    @property
+    def digest(self):
+        """Content address of the tiles, identical maps have the same digest."""
+        return tiles_digest(self._map)
+
+    def undug(self):
+        """Copy of the tiles as they were at the start of the level."""
+        tiles = self._map.copy()
+        if self._digged:
+            tiles[tuple(np.array(self._digged).T)] = Tiles.STONE
+        return tiles
+
+    def fork(self):
+        """Copy of the map sharing the tiles with this one until either is dug."""
+        clone = Map.__new__(Map)
+        clone.__dict__.update(self.__dict__)
+        clone._digged = list(self._digged)
+        self._sharers[0] += 1
+        return clone
+
+    def _unshare(self):
+        self._sharers[0] -= 1  # the others may be left alone with the grid
+        self._sharers = [1]
+        self._grid = self._grid.copy()
+        self._map = self._grid[1:-1, 1:-1]
 
     @property
     def size(self):
@@ -122,41 +208,65 @@ class Map:
 
     def get_tile(self, pos):
         x, y = pos
-        return self.map[x][y]
+        return self._grid.item(x + 1, y + 1)
 
     def dig(self, pos):
         x, y = pos
-        if self.map[x][y] == Tiles.STONE:
-            self.map[x][y] = Tiles.PASSAGE
+        if self._grid.item(x + 1, y + 1) == Tiles.STONE:
+            if self._sharers[0] > 1:
+                self._unshare()
+            self._grid[x + 1, y + 1] = Tiles.PASSAGE
             self._digged.append((x, y))
 
     def is_blocked(self, pos, traverse):
         x, y = pos
-        if x not in range(self.hor_tiles) or y not in range(self.ver_tiles):
-            return True
-        if self.map[x][y] == Tiles.PASSAGE:
+        if not (-1 <= x <= self.hor_tiles and -1 <= y <= self.ver_tiles):
+            return True  # further out than the border
+        tile = self._grid.item(x + 1, y + 1)
+        if tile == Tiles.PASSAGE:
             return False
-        if self.map[x][y] == Tiles.STONE:
-            if traverse:
-                return False
-            else:
-                return True
+        if tile == Tiles.STONE:
+            return not traverse
+        if tile == BORDER:
+            return True
         assert False, "Unknown tile type"
 
     def calc_pos(self, cur, direction: Direction, traverse=True):
-        cx, cy = cur
-        npos = cur
-        if direction == Direction.NORTH:
-            npos = cx, cy - 1
-        if direction == Direction.WEST:
-            npos = cx - 1, cy
-        if direction == Direction.SOUTH:
-            npos = cx, cy + 1
-        if direction == Direction.EAST:
-            npos = cx + 1, cy
-
-        # test blocked
-        if self.is_blocked(npos, traverse):
+        offset = OFFSETS.get(direction)
+        if offset is None:
             return cur
 
-        return npos
+        # cur is always inside the map, so its neighbours are at most on the border
+        nx, ny = cur[0] + offset[0], cur[1] + offset[1]
+        tile = self._grid.item(nx + 1, ny + 1)
+        if tile == Tiles.PASSAGE or (traverse and tile == Tiles.STONE):
+            return nx, ny
+
+        return cur
+
+    def passable_mask(self, traverse=False):
+        """Boolean array indexed [x][y], True where a character can stand."""
+        if traverse:
+            return self.map != BORDER
+        return self.map == Tiles.PASSAGE
+
+    def neighbors_mask(self, traverse=False):
+        """Boolean array indexed [direction][x][y], True where moving towards direction is possible."""
+        grid = self._grid
+        passable = (grid == Tiles.PASSAGE) | (traverse & (grid == Tiles.STONE))
+        mask = np.empty((len(OFFSETS), self.hor_tiles, self.ver_tiles), dtype=bool)
+        for direction, (dx, dy) in OFFSETS.items():
+            mask[direction] = passable[
+                1 + dx : self.hor_tiles + 1 + dx, 1 + dy : self.ver_tiles + 1 + dy
+            ]
+        return mask
+
+    def neighbors_of(self, pos, traverse=False):
+        """Positions reachable from pos in one step, in Direction order."""
+        return [
+            npos
+            for npos in (
+                self.calc_pos(pos, direction, traverse) for direction in OFFSETS
+            )
+            if npos != pos
+        ]
@@ -0,0 +1,120 @@
+"""Timing histograms, counters and gauges of the server, for capacity planning."""
+import bisect
+import time
+from collections import Counter, defaultdict
+
+# upper bounds of the histogram buckets: 1us, 2us, 4us, ... ~8s
+BUCKETS = tuple(1e-6 * 2**i for i in range(24))
+
+
+class Histogram:
+    """Distribution of durations (seconds) over power of two buckets."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate of the q quantile, interpolated inside its bucket."""
+        rank = q * self.count
+        seen, lower = 0, 0.0
+        for bound, count in zip(BUCKETS, self.counts):
+            if count and seen + count >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = bound
+        return self.max
+
+    def to_dict(self):
+        """Summary in milliseconds."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count * 1e3, 3),
+            "p50": round(self.quantile(0.5) * 1e3, 3),
+            "p99": round(self.quantile(0.99) * 1e3, 3),
+            "max": round(self.max * 1e3, 3),
+        }
+
+
+def peer(connection):
+    """Label of a connection, the address of its peer."""
+    address = getattr(connection, "remote_address", None)
+    if address:
+        return ":".join(map(str, address[:2]))
+    return f"{type(connection).__name__}@{id(connection):x}"
+
+
+class Metrics:
+    """Named histograms and counters, and gauges read when reporting.
+
+    Observations may also be kept for the connection they were made on, until the
+    connection is forgotten.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = defaultdict(Histogram)
+        self.connections = defaultdict(lambda: defaultdict(Histogram))
+        self.counters = Counter()
+        self._gauges = {}
+        self._labels = {}  # of the connections, as they were when first seen
+
+    def observe(self, name, seconds, connection=None):
+        self.histograms[name].observe(seconds)
+        if connection is not None:
+            if connection not in self._labels:
+                self._labels[connection] = peer(connection)
+            self.connections[connection][name].observe(seconds)
+
+    def forget(self, connection):
+        """Drop the histograms of a connection that closed."""
+        self.connections.pop(connection, None)
+        self._labels.pop(connection, None)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def gauge(self, name, read):
+        """Report the value returned by read() under name."""
+        self._gauges[name] = read
+
+    def snapshot(self):
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "timings_ms": {
+                name: histogram.to_dict()
+                for name, histogram in sorted(self.histograms.items())
+            },
+            "connections_ms": {
+                self._labels[connection]: {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(histograms.items())
+                }
+                for connection, histograms in self.connections.items()
+            },
+            "counters": dict(self.counters),
+            "gauges": {name: read() for name, read in self._gauges.items()},
+        }
+
+    def summary(self):
+        """One line for the logs."""
+        tick = self.histograms["tick"].to_dict()
+        gauges = " ".join(f"{name}={read()}" for name, read in self._gauges.items())
+        return (
+            f"ticks={tick['count']} tick_p50={tick.get('p50')}ms "
+            f"tick_p99={tick.get('p99')}ms overruns={self.counters['overruns']} "
+            + gauges
+        )
@@ -0,0 +1,90 @@
+"""Spatial index of what occupies each cell of the map."""
+
+
+class Occupancy:
+    """Cells occupied by rocks and enemies, and cells on fire.
+
+    The index is owned by the Game, which tells it whenever an entity may have
+    moved, so that characters can answer "what is at this cell" in O(1).
+    """
+
+    def __init__(self, rocks=(), enemies=()):
+        self._rocks = {}  # pos -> rocks at pos
+        self._enemies = {}  # pos -> enemies at pos
+        self._fire = {}  # pos -> number of Fygars burning pos
+        self._burning = {}  # enemy -> cells on fire from that enemy
+
+        for rock in rocks:
+            self._add(self._rocks, rock.pos, rock)
+        for enemy in enemies:
+            self.add_enemy(enemy)
+
+    @staticmethod
+    def _add(cells, pos, entity):
+        cells.setdefault(pos, []).append(entity)
+
+    @staticmethod
+    def _remove(cells, pos, entity):
+        entities = cells[pos]
+        entities.remove(entity)
+        if not entities:
+            del cells[pos]
+
+    @property
+    def rocks(self):
+        """Mapping of each cell holding rocks to the list of those rocks."""
+        return self._rocks
+
+    def add_enemy(self, enemy):
+        self._add(self._enemies, enemy.pos, enemy)
+        self.update_fire(enemy)
+
+    def remove_enemy(self, enemy):
+        self._remove(self._enemies, enemy.pos, enemy)
+        self._set_fire(enemy, ())
+
+    def rock_moved(self, rock, old_pos):
+        if rock.pos != old_pos:
+            self._remove(self._rocks, old_pos, rock)
+            self._add(self._rocks, rock.pos, rock)
+
+    def enemy_moved(self, enemy, old_pos):
+        if enemy.pos != old_pos:
+            self._remove(self._enemies, old_pos, enemy)
+            self._add(self._enemies, enemy.pos, enemy)
+        self.update_fire(enemy)
+
+    def update_fire(self, enemy):
+        self._set_fire(enemy, tuple(enemy.fire))
+
+    def _set_fire(self, enemy, cells):
+        if self._burning.get(enemy, ()) == cells:
+            return
+
+        for pos in self._burning.pop(enemy, ()):
+            self._fire[pos] -= 1
+            if self._fire[pos] == 0:
+                del self._fire[pos]
+        if cells:
+            self._burning[enemy] = cells
+            for pos in cells:
+                self._fire[pos] = self._fire.get(pos, 0) + 1
+
+    def has_rock(self, pos):
+        return pos in self._rocks
+
+    def rocks_at(self, pos):
+        return list(self._rocks.get(pos, ()))
+
+    def enemies_at(self, pos):
+        return list(self._enemies.get(pos, ()))
+
+    def has_enemy(self, pos, exclude=None):
+        return any(e is not exclude for e in self._enemies.get(pos, ()))
+
+    def on_fire(self, pos):
+        return pos in self._fire
+
+    def fire_at(self, pos):
+        """Number of Fygars whose fire is burning pos."""
+        return self._fire.get(pos, 0)
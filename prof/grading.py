@@ -65,30 +65,49 @@ def index():
     return '<a href="/table.html">Nothing here to see</a>'
 
 
-# endpoint to create new game
+# endpoint to create new game, or several games when given a list of them
+# records with a score or level that is not an integer are left out, a batch is
+# only refused when none of its records is valid
 @app.route("/game", methods=["POST"])
 def add_game():
-    if new_game := request.json:
-        logger.info(
-                "Player: %s, Score: %s", new_game.get("player"), new_game.get("score")
+    if new_games := request.json:
+        batch = isinstance(new_games, list)
+        if not batch:
+            new_games = [new_games]
+
+        games = []
+        for new_game in new_games:
+            if not isinstance(new_game, dict):
+                logger.warning("Rejected game: %s", new_game)
+                continue
+            logger.info(
+                    "Player: %s, Score: %s", new_game.get("player"), new_game.get("score")
+                    )
+            try:
+                int(new_game.get("score"))
+                int(new_game.get("level"))
+            except (TypeError, ValueError):
+                logger.warning("Rejected game: %s", new_game)
+                continue
+
+            games.append(
+                Game(
+                    new_game.get("player"),
+                    new_game.get("level"),
+                    new_game.get("score"),
+                    new_game.get("seed"),
                 )
-        try:
-            int(new_game.get("score"))
-            int(new_game.get("level"))
-        except:
-            return jsonify({"error": "poor soul..."})
-
-        new_game = Game(
-            new_game.get("player"),
-            new_game.get("level"),
-            new_game.get("score"),
-            new_game.get("seed"),
-        )
+            )
+
+        if not games:
+            return jsonify({"error": "poor soul..."}), 400
 
-        db.session.add(new_game)
+        db.session.add_all(games)
         db.session.commit()
 
-        return SINGLE_GAME_SCHEMA.jsonify(new_game)
+        if batch:
+            return ALL_GAME_SCHEMA.jsonify(games)
+        return SINGLE_GAME_SCHEMA.jsonify(games[0])
 
     return jsonify({"error": "No game data"}), 400
 
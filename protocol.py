@@ -0,0 +1,445 @@
+"""State frame encodings shared by the server, the viewer and the clients.
+
+In delta mode (asked with "delta": true on join) the server sends a keyframe,
+which is a regular state message with all the cells dug in the level in "dug",
+followed by delta messages ("delta": true) holding only what changed since the
+previous frame:
+  - scalar fields that changed (step, score, lives, digdug, ...)
+  - "enemies" and "rocks": the id and changed fields of entities that moved or
+    changed (fire, direction, ...), with the fields that are gone listed in
+    "unset", and the whole entity for a new one
+  - "removed": ids of enemies that are gone
+  - "rope": the rope, or null once it is gone
+  - "dug": cells dug since the previous frame
+DeltaDecoder rebuilds the full state from those messages.
+
+In binary mode (asked with "binary": true on join) state frames, and the info
+message sent at the start of each level, are binary websocket frames packed by
+BinaryEncoder: little endian fixed width integers, entities renumbered in the
+order the game showed them instead of their game ids, and the map as one bit per
+tile. Other messages (the final info with highscores) are still JSON text. load()
+turns either kind of message into the dict json.loads would give, but for the
+entity ids which are those numbers.
+
+Level infos carry the digest of their map. Clients keeping a MapCache list the
+digests they have with "maps" on join, the server then leaves the map out of the
+infos of those maps, and MapCache.resolve() puts it back. Dug cells come after
+that in the delta frames, a viewer joining mid-level also gets the map of the start
+of the level, and the cells dug since in its first keyframe.
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import os
+import random
+import struct
+import time
+
+import numpy as np
+
+ENTITIES = ("enemies", "rocks")
+
+
+def _changes(previous, entity):
+    """Id and fields of entity that differ from its previous (frozen) version."""
+    if previous is None:
+        return entity
+    before = dict(previous)
+    del before["id"]
+    changes = {
+        key: value
+        for key, value in entity.items()
+        if key == "id" or before.pop(key, None) != _frozen(value)
+    }
+    if before:
+        changes["unset"] = list(before)
+    return changes
+
+
+def _frozen(value):
+    """Immutable copy of a JSON-like value, the engine reuses lists between frames."""
+    if isinstance(value, dict):
+        return tuple((key, _frozen(v)) for key, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_frozen(v) for v in value)
+    return value
+
+
+class DeltaEncoder:
+    """Turns consecutive full states into a keyframe followed by deltas."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Make the next frame a keyframe."""
+        self._scalars = None
+        self._entities = {}
+        self._rope = None
+        self._dug = 0
+
+    def encode(self, state, digged=()):
+        """Frame to send for state, digged is the list of cells dug in this level."""
+        keyframe = self._scalars is None or state["level"] != self._scalars["level"]
+        scalars = {
+            key: _frozen(value)
+            for key, value in state.items()
+            if key not in ENTITIES and key != "rope"
+        }
+        entities = {
+            kind: {entity["id"]: _frozen(entity) for entity in state[kind]}
+            for kind in ENTITIES
+        }
+        rope = _frozen(state.get("rope"))
+
+        if keyframe:
+            frame = dict(state, dug=list(digged)) if digged else state
+        else:
+            frame = {"delta": True}
+            frame.update(
+                (key, state[key])
+                for key, value in scalars.items()
+                if self._scalars.get(key) != value
+            )
+            for kind in ENTITIES:
+                previous, current = self._entities[kind], entities[kind]
+                changed = [
+                    _changes(previous.get(entity["id"]), entity)
+                    for entity in state[kind]
+                    if previous.get(entity["id"]) != current[entity["id"]]
+                ]
+                if changed:
+                    frame[kind] = changed
+            removed = [
+                id for id in self._entities["enemies"] if id not in entities["enemies"]
+            ]
+            if removed:
+                frame["removed"] = removed
+            if rope != self._rope:
+                frame["rope"] = state.get("rope")
+            if len(digged) > self._dug:
+                frame["dug"] = digged[self._dug :]
+
+        self._scalars, self._entities, self._rope = scalars, entities, rope
+        self._dug = len(digged)
+        return frame
+
+
+class DeltaDecoder:
+    """Rebuilds full states from the messages of a delta mode connection."""
+
+    def __init__(self):
+        self._state = None
+        self._entities = {}
+
+    def decode(self, message):
+        """Full state for message, messages other than frames are returned as is."""
+        if not message.get("delta"):
+            if "step" in message:  # keyframe
+                self._state = message
+                self._entities = {
+                    kind: {entity["id"]: entity for entity in message[kind]}
+                    for kind in ENTITIES
+                }
+            return message
+
+        if self._state is None:
+            raise ValueError("Delta frame received before any keyframe")
+
+        state = dict(self._state)
+        for key, value in message.items():
+            if key in ENTITIES or key in ("delta", "removed", "rope"):
+                continue
+            state[key] = value
+
+        for id in message.get("removed", []):
+            del self._entities["enemies"][id]
+        for kind in ENTITIES:
+            entities = self._entities[kind]
+            for changes in message.get(kind, []):
+                entity = dict(entities.get(changes["id"], {}))
+                entity.update(changes)
+                for key in entity.pop("unset", ()):
+                    del entity[key]
+                entities[changes["id"]] = entity
+            state[kind] = list(self._entities[kind].values())
+
+        if "rope" in message:
+            if message["rope"] is None:
+                state.pop("rope", None)
+            else:
+                state["rope"] = message["rope"]
+        if "dug" not in message:
+            state.pop("dug", None)
+
+        self._state = state
+        return state
+
+
+class MapCache:
+    """Maps of the level infos received, by digest.
+
+    Given a directory the maps are saved there, to be known on the next runs too.
+    """
+
+    def __init__(self, directory: str | None = None):
+        self._directory = directory
+        self._maps = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for name in os.listdir(directory):
+                digest, ext = os.path.splitext(name)
+                if ext == ".npy":
+                    self._maps[digest] = np.load(os.path.join(directory, name))
+
+    @property
+    def digests(self):
+        """Digests to send on join, as "maps"."""
+        return list(self._maps)
+
+    def resolve(self, message: dict) -> dict:
+        """message with its map, taken from the cache when the server left it out."""
+        digest = message.get("digest")
+        if digest is None:
+            return message
+        if "map" in message:
+            if digest not in self._maps:
+                tiles = np.asarray(message["map"], dtype=np.uint8)
+                self._maps[digest] = tiles
+                if self._directory is not None:
+                    np.save(os.path.join(self._directory, f"{digest}.npy"), tiles)
+            return message
+        if digest not in self._maps:
+            raise ValueError(f"Map {digest} is not in the cache")
+        return dict(message, map=self._maps[digest].tolist())
+
+
+STATE, INFO = 1, 2  # first byte of a binary message
+ENEMY_NAMES = ("Pooka", "Fygar")
+INFO_KEYS = {"size", "map", "digest", "fps", "timeout", "lives", "score", "level"}
+
+# kind, level, step, timeout, score, lives, digdug x, y, ts (NaN if not set)
+_STATE = struct.Struct("<BHIIibHHd")
+# id, name, dir, traverse, fire length, x, y
+_ENEMY = struct.Struct("<HBBBBHH")
+_ROCK = struct.Struct("<HHH")  # id, x, y
+_COUNT = struct.Struct("<H")
+_ROPE = struct.Struct("<BB")  # dir, length
+# kind, width, height, fps, timeout, lives, score, level, map digest
+_INFO = struct.Struct("<BHHHIbiH16s")
+
+
+def _positions(positions):
+    return struct.pack(
+        f"<{2 * len(positions)}H", *(c for pos in positions for c in pos)
+    )
+
+
+class BinaryEncoder:
+    """Packs the state and info messages of a game, one encoder per game."""
+
+    def __init__(self):
+        self._ids = {}
+
+    def _id(self, id):
+        """Number of an entity, kept for the whole game."""
+        return self._ids.setdefault(id, len(self._ids))
+
+    def state(self, state) -> bytes:
+        player = state["player"].encode()
+        parts = [
+            _STATE.pack(
+                STATE,
+                state["level"],
+                state["step"],
+                state["timeout"],
+                state["score"],
+                state["lives"],
+                *state["digdug"],
+                state.get("ts", math.nan),
+            ),
+            _COUNT.pack(len(player)),
+            player,
+            _COUNT.pack(len(state["rocks"])),
+        ]
+        for rock in state["rocks"]:
+            parts.append(_ROCK.pack(self._id(rock["id"]), *rock["pos"]))
+
+        parts.append(_COUNT.pack(len(state["enemies"])))
+        for enemy in state["enemies"]:
+            fire = enemy.get("fire", ())
+            parts.append(
+                _ENEMY.pack(
+                    self._id(enemy["id"]),
+                    ENEMY_NAMES.index(enemy["name"]),
+                    enemy["dir"],
+                    bool(enemy.get("traverse")),
+                    len(fire),
+                    *enemy["pos"],
+                )
+            )
+            parts.append(_positions(fire))
+
+        rope = state.get("rope")
+        if rope:
+            parts.append(_ROPE.pack(rope["dir"], len(rope["pos"])))
+            parts.append(_positions(rope["pos"]))
+        return b"".join(parts)
+
+    def info(self, info) -> bytes | None:
+        """Packed level info, None for infos with other fields (highscores)."""
+        if info.keys() != INFO_KEYS:
+            return None
+        tiles = np.asarray(info["map"], dtype=np.uint8)
+        if tiles.size and tiles.max() > 1:
+            return None  # not one bit per tile
+        return (
+            _INFO.pack(
+                INFO,
+                *info["size"],
+                info["fps"],
+                info["timeout"],
+                info["lives"],
+                info["score"],
+                info["level"],
+                bytes.fromhex(info["digest"]),
+            )
+            + np.packbits(tiles, axis=None).tobytes()
+        )
+
+
+def _unpack_positions(data, offset, count):
+    coords = struct.unpack_from(f"<{2 * count}H", data, offset)
+    return [list(coords[i : i + 2]) for i in range(0, 2 * count, 2)], offset + 4 * count
+
+
+def decode_binary(data: bytes) -> dict:
+    """Message packed by BinaryEncoder, as the JSON message would be decoded."""
+    if data[0] == INFO:
+        _, width, height, fps, timeout, lives, score, level, digest = _INFO.unpack_from(
+            data
+        )
+        bits = np.frombuffer(data, dtype=np.uint8, offset=_INFO.size)
+        tiles = np.unpackbits(bits, count=width * height).reshape(width, height)
+        return {
+            "size": [width, height],
+            "map": tiles.tolist(),
+            "digest": digest.hex(),
+            "fps": fps,
+            "timeout": timeout,
+            "lives": lives,
+            "score": score,
+            "level": level,
+        }
+    if data[0] != STATE:
+        raise ValueError(f"Unknown binary message kind {data[0]}")
+
+    _, level, step, timeout, score, lives, x, y, ts = _STATE.unpack_from(data)
+    offset = _STATE.size
+    (length,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    player = data[offset : offset + length].decode()
+    offset += length
+
+    (count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    rocks = []
+    for _ in range(count):
+        id, rx, ry = _ROCK.unpack_from(data, offset)
+        offset += _ROCK.size
+        rocks.append({"id": id, "pos": [rx, ry]})
+
+    (count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    enemies = []
+    for _ in range(count):
+        id, name, dir, traverse, fire, ex, ey = _ENEMY.unpack_from(data, offset)
+        offset += _ENEMY.size
+        enemy = {"name": ENEMY_NAMES[name], "id": id, "pos": [ex, ey], "dir": dir}
+        if fire:
+            enemy["fire"], offset = _unpack_positions(data, offset, fire)
+        if traverse:
+            enemy["traverse"] = True
+        enemies.append(enemy)
+
+    state = {
+        "level": level,
+        "step": step,
+        "timeout": timeout,
+        "player": player,
+        "score": score,
+        "lives": lives,
+        "digdug": [x, y],
+        "enemies": enemies,
+        "rocks": rocks,
+    }
+    if offset < len(data):
+        dir, length = _ROPE.unpack_from(data, offset)
+        pos, offset = _unpack_positions(data, offset + _ROPE.size, length)
+        state["rope"] = {"dir": dir, "pos": pos}
+    if not math.isnan(ts):
+        state["ts"] = ts
+    return state
+
+
+def load(message: str | bytes) -> dict:
+    """Decode a message received from the server, text or binary."""
+    if isinstance(message, bytes):
+        return decode_binary(message)
+    return json.loads(message)
+
+
+def _time(function, messages):
+    start = time.perf_counter()
+    results = [function(message) for message in messages]
+    return results, (time.perf_counter() - start) / len(messages)
+
+
+def benchmark(frames=3000, level=1, seed=1):
+    """Compare the JSON and binary encodings over the frames of a random game."""
+    from game import Game  # the clients only need the decoders
+    from headless import quiet
+
+    quiet()
+
+    keys = random.Random(seed)
+    game = Game(level=level, seed=seed)
+    game.start("benchmark")
+    states, infos = [], []
+    while game.running and len(states) < frames:
+        if game._step == 0:
+            infos.append(game.info())
+        state = game.step()
+        if state:
+            state["ts"] = time.time()
+            states.append(json.loads(json.dumps(state)))
+        game.keypress(keys.choice("wasdA"))
+
+    encoder = BinaryEncoder()
+    for kind, messages, encode in (
+        ("state", states, encoder.state),
+        ("info", infos, encoder.info),
+    ):
+        texts, json_encode = _time(json.dumps, messages)
+        _, json_decode = _time(json.loads, texts)
+        packed, binary_encode = _time(encode, messages)
+        _, binary_decode = _time(decode_binary, packed)
+        print(
+            f"{kind} ({len(messages)}): "
+            f"json {sum(map(len, texts)) / len(texts):.0f} B/frame, "
+            f"encode {json_encode * 1e6:.1f}us, decode {json_decode * 1e6:.1f}us | "
+            f"binary {sum(map(len, packed)) / len(packed):.0f} B/frame, "
+            f"encode {binary_encode * 1e6:.1f}us, decode {binary_decode * 1e6:.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the JSON and binary encodings of the game messages"
+    )
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    benchmark(args.frames, args.level, args.seed)
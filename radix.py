@@ -0,0 +1,226 @@
+"""A* over a radix heap, for the integer costs of the agent's searches.
+
+The costs astar uses while chasing are small integer sums (1 or POINTS_WALL
+plus multiples of 10000) and the Manhattan heuristic is consistent, so the keys
+popped never decrease and a radix heap can replace heapq. Cells are flat
+indices (x * height + y) into arrays allocated once per map size.
+
+    $ python3 radix.py --frames 3000 --level 6 --seed 3
+"""
+import argparse
+import time
+
+
+class RadixHeap:
+    """Monotone priority queue of integer keys, none smaller than the last popped."""
+
+    def __init__(self):
+        self.buckets = [[] for _ in range(65)]
+        self.last = 0
+        self.size = 0
+
+    def clear(self):
+        for bucket in self.buckets:
+            bucket.clear()
+        self.last = 0
+        self.size = 0
+
+    def push(self, key, value):
+        self.buckets[(key ^ self.last).bit_length()].append((key, value))
+        self.size += 1
+
+    def pop(self):
+        """The (key, value) of the smallest key, the last one pushed among equals."""
+        buckets = self.buckets
+        if not buckets[0]:
+            index = 1
+            while not buckets[index]:
+                index += 1
+            items = buckets[index]
+            self.last = last = min(items)[0]
+            for item in items:
+                buckets[(item[0] ^ last).bit_length()].append(item)
+            items.clear()
+        self.size -= 1
+        return buckets[0].pop()
+
+
+class RadixPlanner:
+    """
+    Finds the cheapest paths with A* over a radix heap, for integer costs.
+
+    It takes the same arguments and returns the same paths as DStarLite.plan, so astar can use either,
+    but keeps nothing between calls: the arrays of the costs so far and of the parents are only
+    allocated again when the size of the map changes, and a stamp tells the cells of this call apart.
+    """
+
+    def __init__(self):
+        self.width = self.height = None
+        self.heap = RadixHeap()
+
+    def reset(self):
+        """
+        Does nothing, the planner keeps no search between calls.
+        """
+
+    def plan(self, start, goal, cost, blocked):
+        """
+        Finds the cheapest path from the start to the goal.
+
+        Args:
+            start (tuple): A tuple representing the starting coordinates (x, y).
+            goal (tuple): A tuple representing the coordinates (x, y) to reach, as given by set_goal.
+            cost (list): A 2D list indexed as [x][y] with the integer cost of moving to each position.
+            blocked (list): A 2D list indexed as [x][y] of the positions that can only be entered from the border.
+
+        Returns:
+            list or None: The positions from the start to the goal, both included, or None if the goal can not
+            be reached.
+        """
+        width, height = len(cost), len(cost[0])
+        if not (0 <= goal[0] < width and 0 <= goal[1] < height):
+            return None  # set_goal can aim outside the map
+        if (width, height) != (self.width, self.height):
+            self._resize(width, height)
+        cost = [value for column in cost for value in column]
+        blocked = [value for column in blocked for value in column]
+        start = start[0] * height + start[1]
+        goal = goal[0] * height + goal[1]
+
+        self.stamp += 1
+        stamp, seen, closed = self.stamp, self.seen, self.closed
+        g, parent, neighbors, border = self.g, self.parent, self.neighbors, self.border
+        xs, ys = self.xs, self.ys
+        goal_x, goal_y = xs[goal], ys[goal]
+
+        heap = self.heap
+        heap.clear()
+        g[start], parent[start], seen[start] = 0, start, stamp
+        heap.push(abs(xs[start] - goal_x) + abs(ys[start] - goal_y), start)
+
+        while heap.size:
+            _, node = heap.pop()
+            if closed[node] == stamp:
+                continue
+            closed[node] = stamp
+
+            if node == goal:
+                path = [goal]
+                while node != start:
+                    node = parent[node]
+                    path.append(node)
+                return [divmod(node, height) for node in reversed(path)]
+
+            inside = not border[node]
+            for neighbor in neighbors[node]:
+                # Nao passar ao lado de um Pooka, a nao ser na borda do mapa
+                if inside and blocked[neighbor]:
+                    continue
+                total = g[node] + cost[neighbor]
+                if seen[neighbor] != stamp or total < g[neighbor]:
+                    g[neighbor], parent[neighbor] = total, node
+                    seen[neighbor] = stamp
+                    heap.push(
+                        total + abs(xs[neighbor] - goal_x) + abs(ys[neighbor] - goal_y),
+                        neighbor,
+                    )
+        return None
+
+    def _resize(self, width, height):
+        self.width, self.height = width, height
+        size = width * height
+        self.g = [0] * size
+        self.parent = [0] * size
+        self.seen = [0] * size
+        self.closed = [0] * size
+        self.stamp = 0
+        self.xs = [x for x in range(width) for y in range(height)]
+        self.ys = [y for x in range(width) for y in range(height)]
+        self.border = [
+            x in (0, width - 1) or y in (0, height - 1)
+            for x in range(width)
+            for y in range(height)
+        ]
+        # Mesma ordem que o astar: cima, baixo, esquerda, direita
+        self.neighbors = [
+            [
+                (x + dx) * height + y + dy
+                for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0)]
+                if 0 <= x + dx < width and 0 <= y + dy < height
+            ]
+            for x in range(width)
+            for y in range(height)
+        ]
+
+
+class _Recorder:
+    """Stands for the planner of an agent, recording what it is asked."""
+
+    def __init__(self, planner):
+        self.planner = planner
+        self.calls = []
+
+    def reset(self):
+        self.planner.reset()
+
+    def plan(self, *args):
+        self.calls.append(args)
+        return self.planner.plan(*args)
+
+
+def _replay(planner, calls):
+    begin = time.perf_counter()
+    paths = [planner(*call) for call in calls]
+    return paths, (time.perf_counter() - begin) / len(calls)
+
+
+def benchmark(frames=3000, level=1, seed=1):
+    """Compare the planners on the searches the student agent makes in a game."""
+    from dstar import DStarLite
+    from headless import play, quiet
+    from search import shortest_path
+    from student import Agent
+
+    quiet()
+
+    agent = Agent()
+    agent.planner = recorder = _Recorder(agent.planner)
+    play(agent, level=level, seed=seed, timeout=frames)
+    calls = recorder.calls
+
+    expected, reference = _replay(
+        lambda start, goal, cost, blocked: shortest_path(
+            cost, start, goal, cost, blocked
+        ),
+        calls,
+    )
+    for name, planner in (
+        ("heapq A*", None),
+        ("D* Lite", DStarLite().plan),
+        ("radix A*", RadixPlanner().plan),
+    ):
+        if planner is None:
+            paths, seconds = expected, reference
+        else:
+            paths, seconds = _replay(planner, calls)
+        for path, other, (_, _, cost, _) in zip(paths, expected, calls):
+            assert (path is None) == (other is None)
+            if path is not None:
+                assert sum(cost[x][y] for x, y in path) == sum(
+                    cost[x][y] for x, y in other
+                )
+        print(
+            f"{name}: {seconds * 1e3:.3f} ms per search "
+            f"({reference / seconds:.2f}x) over {len(calls)} searches"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the planners on the searches of the student agent"
+    )
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    benchmark(args.frames, args.level, args.seed)
@@ -0,0 +1,229 @@
+"""Spectator relay, serves the viewers of the games of a server from another process.
+
+The game server publishes each game once to the relay over a Unix socket: when
+it starts and ends, its level infos, and every frame with the cells dug since
+the previous one. The relay owns the viewer websockets and does the encoding for
+them (delta, binary, lower rates, cached maps), so a crowd of viewers costs the
+game server one write per tick. Viewers connect to the relay as they would to the
+server:
+
+    $ python3 relay.py --port 8001 &
+    $ python3 server.py --relay relay.sock
+    $ python3 viewer.py --port 8001
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import struct
+
+import websockets
+from websockets.legacy.protocol import WebSocketCommonProtocol
+
+from mapa import Map
+from server import METRICS_BIND, Player, ViewerHub, Watched
+
+logger = logging.getLogger("Relay")
+logger.setLevel(logging.INFO)
+
+RELAY_SOCKET = "relay.sock"
+MAX_BUFFERED = 1 << 20  # bytes waiting for the relay before frames are dropped
+
+START, INFO, FRAME, END = range(4)
+# kind, game, length of the payload, length of the dug cells (frames only)
+_RECORD = struct.Struct("<BIII")
+
+
+class Publisher:
+    """The game server side of the relay, writes the records of its games."""
+
+    def __init__(self, path: str = RELAY_SOCKET):
+        self.path = path
+        self._writer = None
+        self._ids = itertools.count()
+        self._dug = {}  # cells of each game already published
+        self._dropping = False
+
+    async def connect(self):
+        """Connect to the relay unless connected, games started before are lost."""
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        try:
+            _, self._writer = await asyncio.open_unix_connection(self.path)
+            logger.info("Publishing games to the relay at %s", self.path)
+        except OSError as err:
+            self._writer = None
+            logger.warning("Relay at %s unreachable: %s", self.path, err)
+
+    def _write(self, kind: int, game: int, payload: bytes = b"", dug: bytes = b""):
+        """Queue a record, returns whether it was."""
+        if self._writer is None or self._writer.is_closing():
+            return False
+        if kind == FRAME:  # the relay is stuck, drop frames but not the rest
+            full = self._writer.transport.get_write_buffer_size() > MAX_BUFFERED
+            if full != self._dropping:
+                self._dropping = full
+                logger.warning("Relay %s", "lagging" if full else "caught up")
+            if full:
+                return False
+        self._writer.write(_RECORD.pack(kind, game, len(payload), len(dug)) + payload)
+        self._writer.write(dug)
+        return True
+
+    def start(self, player: str) -> int:
+        """Publish a new game, returns its number."""
+        game = next(self._ids)
+        self._dug[game] = 0
+        self._write(START, game, player.encode())
+        return game
+
+    def info(self, game: int, info: str, digged):
+        """Publish the info (JSON) sent at the start of a level or of a game."""
+        self._dug[game] = len(digged)
+        self._write(INFO, game, info.encode())
+
+    def frame(self, game: int, full: str, digged):
+        """Publish a frame (JSON) and the cells dug since the previous one."""
+        dug = json.dumps(digged[self._dug[game] :]).encode()
+        if self._write(FRAME, game, full.encode(), dug):
+            self._dug[game] = len(digged)  # else they go with the next frame
+
+    def end(self, game: int):
+        del self._dug[game]
+        self._write(END, game)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class Mirror:
+    """The parts of a Game the viewers need, rebuilt from the published records."""
+
+    def __init__(self):
+        self._info = None
+        self.map = None
+
+    def load(self, info: dict):
+        self._info = {key: value for key, value in info.items() if key != "map"}
+        self.map = Map(size=info["size"], mapa=info["map"])
+
+    def dig(self, cells):
+        for cell in cells:
+            self.map.dig(cell)
+
+    def info(self):
+        info = dict(self._info, map=self.map.map.tolist())
+        info["digest"] = self.map.digest
+        return info
+
+
+class Relayed(Watched):
+    """A game played on the server, as watched through the relay."""
+
+    def __init__(self, relay: Relay, player: Player):
+        super().__init__(relay, player)
+        self.game = Mirror()
+
+    def send_state(self, full: str, dug: str):
+        self.game.dig(json.loads(dug))
+        if not len(self.viewers):
+            return  # a new viewer gets a keyframe anyway
+        state = json.loads(full)
+        delta, keyframe = self.delta(state)
+        binary = self.packer.state(state) if self.server.binary else None
+        self.send_frame(state, full, delta, binary, keyframe)
+
+
+class Relay(ViewerHub):
+    """Viewers of the games published by game servers."""
+
+    async def publisher_handler(self, reader, writer):
+        """Mirror the games of a game server until it disconnects."""
+        logger.info("Game server connected")
+        games = {}
+        try:
+            while True:
+                header = await reader.readexactly(_RECORD.size)
+                kind, number, length, dug = _RECORD.unpack(header)
+                payload = (await reader.readexactly(length)).decode()
+                dug = (await reader.readexactly(dug)).decode()
+                key = (writer, number)
+
+                if kind == START:
+                    games[number] = Relayed(self, Player(payload, None))
+                elif kind == END:
+                    if self.sessions.pop(key, None) is not None:
+                        self.stop_watching(games[number])
+                    del games[number]
+                elif kind == INFO:
+                    game, info = games[number], json.loads(payload)
+                    game.game.load(info)
+                    if key not in self.sessions:  # it can be watched from now on
+                        self.start_watching(game)
+                        self.sessions[key] = game
+                    game.viewers.send(game.message(info))
+                elif kind == FRAME:
+                    games[number].send_state(payload, dug)
+        except asyncio.IncompleteReadError:
+            logger.info("Game server disconnected")
+        finally:
+            for number, game in games.items():
+                if self.sessions.pop((writer, number), None) is not None:
+                    self.stop_watching(game)
+            writer.close()
+
+    async def incomming_handler(self, websocket: WebSocketCommonProtocol, path: str):
+        """Process new viewers, players must connect to the game server."""
+        try:
+            async for message in websocket:
+                data = json.loads(message)
+                if data.get("cmd") != "join":
+                    continue
+                if path != "/viewer":
+                    await websocket.close(reason="Players join the game server")
+                    return
+                self.join(websocket, data)
+                self.join_viewer(websocket, data)
+        except websockets.exceptions.ConnectionClosed as closed_reason:
+            logger.info("Viewer disconnected: %s", closed_reason)
+        finally:
+            self.leave(websocket)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bind", help="IP address to bind to", default="")
+    parser.add_argument(
+        "--port", help="TCP port for the viewers", type=int, default=8001
+    )
+    parser.add_argument(
+        "--socket",
+        help="Unix socket the game server publishes to",
+        default=RELAY_SOCKET,
+    )
+    parser.add_argument(
+        "--metrics-port", help="TCP port to serve /metrics on, off if 0", type=int
+    )
+    parser.add_argument(
+        "--metrics-bind", help="IP address to serve /metrics on", default=METRICS_BIND
+    )
+    args = parser.parse_args()
+
+    async def main():
+        relay = Relay()
+        publishers = await asyncio.start_unix_server(
+            relay.publisher_handler, args.socket
+        )
+        logger.info("Relaying %s @ %s:%s", args.socket, args.bind, args.port)
+        websocket_server = websockets.serve(
+            relay.incomming_handler, args.bind, args.port
+        )
+        servers = [websocket_server, publishers.serve_forever(), relay.report()]
+        if args.metrics_port:
+            servers.append(relay.serve_metrics(args.metrics_bind, args.metrics_port))
+        await asyncio.gather(*servers)
+
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Game recordings: the keys pressed on every tick plus periodic engine keyframes.
+
+Keyframes are the plain state of the game and of its random generator, the
+whole recording is gzipped JSON.
+
+A replay re-simulates the game headlessly from the nearest keyframe, so seeking
+to any step costs at most KEYFRAME_EVERY ticks of simulation.
+"""
+import argparse
+import bisect
+import gzip
+import json
+import logging
+
+from game import Game
+from headless import quiet
+
+logger = logging.getLogger("Replay")
+logger.setLevel(logging.INFO)
+
+VERSION = 2
+KEYFRAME_EVERY = 200  # ticks between keyframes
+
+
+class Recorder:
+    """Records a game, the Game calls record() before simulating each tick."""
+
+    def __init__(self, game, player, seed=0, keyframe_every=KEYFRAME_EVERY):
+        self._player = player
+        self._seed = seed
+        self._keyframe_every = keyframe_every
+        self._keys = []
+        self._keyframes = {}  # tick -> keyframe of the game before that tick
+        game.recorder = self
+
+    def record(self, game, key):
+        if len(self._keys) % self._keyframe_every == 0:
+            self._keyframes[len(self._keys)] = game.keyframe()
+        self._keys.append(key)
+
+    def save(self, path):
+        replay = {
+            "version": VERSION,
+            "seed": self._seed,
+            "player": self._player,
+            "keys": self._keys,
+            "keyframes": self._keyframes,
+        }
+        with gzip.open(path, "wt") as outfile:
+            json.dump(replay, outfile)
+        logger.info("Saved %s ticks to %s", len(self._keys), path)
+
+
+class Replay:
+    """Replays a recorded game, the game after any number of ticks is one seek() away."""
+
+    def __init__(self, replay):
+        if replay["version"] != VERSION:
+            raise ValueError(f"Unsupported replay version {replay['version']}")
+        self.seed = replay["seed"]
+        self.player = replay["player"]
+        self.keys = replay["keys"]
+        keyframes = replay["keyframes"].items()  # JSON object keys are strings
+        self._keyframes = {int(tick): keyframe for tick, keyframe in keyframes}
+        self._ticks = sorted(self._keyframes)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt") as infile:
+            return cls(json.load(infile))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def seek(self, tick):
+        """New Game as it was after the first tick ticks of the recording."""
+        if not 0 <= tick <= len(self.keys):
+            raise IndexError(f"tick {tick} out of range [0, {len(self.keys)}]")
+
+        start = self._ticks[bisect.bisect_right(self._ticks, tick) - 1]
+        game = Game.from_keyframe(self._keyframes[start])
+        for key in self.keys[start:tick]:
+            game.step(key)
+        return game
+
+    def states(self, start=0, stop=None):
+        """Yield the state sent to the player for each tick in [start, stop)."""
+        stop = len(self.keys) if stop is None else stop
+        game = self.seek(start)
+        for key in self.keys[start:stop]:
+            yield game.step(key)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("replay", help="replay file written by the server")
+    parser.add_argument("--tick", help="Print the state after this tick", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    quiet()
+
+    replay = Replay.load(args.replay)
+    if args.tick is None:
+        print(f"{replay.player}, seed {replay.seed}: {len(replay)} ticks")
+    else:
+        print(json.dumps(replay.seek(args.tick)._state))
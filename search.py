@@ -1,5 +1,9 @@
 import heapq
+
+import numpy as np
+
 from auxiliarFuncs import *
+from radix import RadixHeap
 
 POINTS_ROCKS = 10000
 POINTS_FYGAR = 10000
@@ -9,19 +13,20 @@ POINTS_GHOST = 10000
 POINTS_AVOID = 10000
 
 
-def calculate_cost_normal(maze, position, state, nearest_enemy):
+def calculate_cost_normal(maze, position, state, nearest_enemy, danger=None):
     """
     Calculates the normal cost of moving to a specific position without avoiding enemies.
 
     This function calculates the normal cost of moving to a specific position on the game map without
     considering the presence of enemies. The cost is influenced by various factors, such as the type of tile
-    at the position, the presence of rocks, and the proximity to ghosts.
+    at the position, the presence of rocks, the fire of Fygars and the proximity to ghosts.
 
     Args:
         maze (list): A 2D list representing the game map where 1 indicates a wall and 0 indicates an open space.
         position (tuple): A tuple representing the target coordinates (x, y) for which the cost is calculated.
         state (dict): The game state containing information about the current game situation.
         nearest_enemy (int): The index of the nearest enemy in the "enemies" list of the game state.
+        danger (list, optional): The danger_map of state and maze. Defaults to None.
 
     Returns:
         float: The calculated normal cost for moving to the specified position without avoiding enemies.
@@ -40,8 +45,11 @@ def calculate_cost_normal(maze, position, state, nearest_enemy):
         ):
             total += POINTS_ROCKS
 
+    if danger is None:
+        danger = danger_map(state, maze)
+    total += POINTS_FYGAR * danger[position[0]][position[1]]
+
     for enemy in state["enemies"]:
-        enemy_name = enemy["name"]
         enemy_x, enemy_y = enemy["pos"]
 
         if (
@@ -51,49 +59,6 @@ def calculate_cost_normal(maze, position, state, nearest_enemy):
         ):
             total += POINTS_GHOST
 
-        if enemy_name == "Fygar":
-            enemy_dir = enemy["dir"]
-            if enemy_y == position[1]:
-                # Vai bater com a cabeça na parede
-                if enemy_x + 1 <= 47 and maze[enemy_x + 1][enemy_y] == 1:
-                    if (
-                        enemy_x == position[0]
-                        or enemy_x - 1 == position[0]
-                        or enemy_x - 2 == position[0]
-                        or enemy_x - 3 == position[0]
-                        or enemy_x - 4 == position[0]
-                    ):
-                        total += POINTS_FYGAR
-                elif enemy_x - 1 >= 0 and maze[enemy_x - 1][enemy_y] == 1:
-                    if (
-                        enemy_x == position[0]
-                        or enemy_x + 1 == position[0]
-                        or enemy_x + 2 == position[0]
-                        or enemy_x + 3 == position[0]
-                        or enemy_x + 4 == position[0]
-                    ):
-                        total += POINTS_FYGAR
-                else:
-                    # Normal
-                    if enemy_dir == 1:
-                        if (
-                            enemy_x == position[0]
-                            or enemy_x + 1 == position[0]
-                            or enemy_x + 2 == position[0]
-                            or enemy_x + 3 == position[0]
-                            or enemy_x + 4 == position[0]
-                        ):
-                            total += POINTS_FYGAR
-                    elif enemy_dir == 3:
-                        if (
-                            enemy_x == position[0]
-                            or enemy_x - 1 == position[0]
-                            or enemy_x - 2 == position[0]
-                            or enemy_x - 3 == position[0]
-                            or enemy_x - 4 == position[0]
-                        ):
-                            total += POINTS_FYGAR
-
         cant_be_there = [
             (enemy_x, enemy_y),
             (enemy_x, enemy_y + 1),
@@ -108,12 +73,12 @@ def calculate_cost_normal(maze, position, state, nearest_enemy):
     return total
 
 
-def calculate_cost_avoid_enemies(maze, position, state, nearest_enemy):
+def calculate_cost_avoid_enemies(maze, position, state, nearest_enemy, danger=None):
     """
     Calculates the cost of moving to a specific position while avoiding enemies.
 
     This function calculates the cost of moving to a specific position on the game map while considering
-    the presence of rocks, ghosts, and other enemies. The cost is influenced by various factors, such as the
+    the presence of rocks, ghosts, the fire of Fygars and other enemies. The cost is influenced by various factors, such as the
     proximity to rocks and ghosts, as well as penalties for avoiding enemies.
 
     Args:
@@ -121,6 +86,7 @@ def calculate_cost_avoid_enemies(maze, position, state, nearest_enemy):
         position (tuple): A tuple representing the target coordinates (x, y) for which the cost is calculated.
         state (dict): The game state containing information about the current game situation.
         nearest_enemy (int): The index of the nearest enemy in the "enemies" list of the game state.
+        danger (list, optional): The danger_map of state and maze. Defaults to None.
 
     Returns:
         float: The calculated cost for moving to the specified position while avoiding enemies.
@@ -134,8 +100,11 @@ def calculate_cost_avoid_enemies(maze, position, state, nearest_enemy):
         ):
             total += POINTS_ROCKS
 
+    if danger is None:
+        danger = danger_map(state, maze)
+    total += POINTS_FYGAR * danger[position[0]][position[1]]
+
     for enemy in state["enemies"]:
-        enemy_name = enemy["name"]
         enemy_x, enemy_y = enemy["pos"]
 
         if (
@@ -145,48 +114,6 @@ def calculate_cost_avoid_enemies(maze, position, state, nearest_enemy):
         ):
             total += POINTS_GHOST
 
-        if enemy_name == "Fygar":
-            enemy_dir = enemy["dir"]
-            if enemy_y == position[1]:
-                # Vai bater com a cabeça na parede
-                if enemy_x + 1 <= 47 and maze[enemy_x + 1][enemy_y] == 1:
-                    if (
-                        enemy_x == position[0]
-                        or enemy_x - 1 == position[0]
-                        or enemy_x - 2 == position[0]
-                        or enemy_x - 3 == position[0]
-                        or enemy_x - 4 == position[0]
-                    ):
-                        total += POINTS_FYGAR
-                elif enemy_x - 1 >= 0 and maze[enemy_x - 1][enemy_y] == 1:
-                    if (
-                        enemy_x == position[0]
-                        or enemy_x + 1 == position[0]
-                        or enemy_x + 2 == position[0]
-                        or enemy_x + 3 == position[0]
-                        or enemy_x + 4 == position[0]
-                    ):
-                        total += POINTS_FYGAR
-                else:
-                    # Normal
-                    if enemy_dir == 1:
-                        if (
-                            enemy_x == position[0]
-                            or enemy_x + 1 == position[0]
-                            or enemy_x + 2 == position[0]
-                            or enemy_x + 3 == position[0]
-                            or enemy_x + 4 == position[0]
-                        ):
-                            total += POINTS_FYGAR
-                    elif enemy_dir == 3:
-                        if (
-                            enemy_x == position[0]
-                            or enemy_x - 1 == position[0]
-                            or enemy_x - 2 == position[0]
-                            or enemy_x - 3 == position[0]
-                            or enemy_x - 4 == position[0]
-                        ):
-                            total += POINTS_FYGAR
         distance_to_enemy = abs(position[0] - enemy_x) + abs(position[1] - enemy_y)
 
         penalty = POINTS_AVOID / (distance_to_enemy + 1)
@@ -206,6 +133,74 @@ def calculate_cost_avoid_enemies(maze, position, state, nearest_enemy):
     return total
 
 
+def cost_field(maze, state, danger=None):
+    """
+    Calculates the cost of moving to every position of the map, in both cost modes.
+
+    This function gives, for every position of the map, the same costs as calculate_cost_normal and
+    calculate_cost_avoid_enemies, computed once per state with NumPy instead of once per expanded node.
+    The avoid enemies costs are floats added in the same order as calculate_cost_avoid_enemies, so they
+    are equal to the last bit. It also marks the positions next to a Pooka, where A* does not go.
+
+    Args:
+        maze (list): A 2D list representing the game map where 1 indicates a wall and 0 indicates an open space.
+        state (dict): The game state containing information about the current game situation.
+        danger (list, optional): The danger_map of state and maze, built if not given. Defaults to None.
+
+    Returns:
+        tuple: The normal costs, the costs avoiding enemies and whether the position is next to an enemy that
+        is not a Fygar, as 2D lists indexed as [x][y], and the danger map.
+    """
+    tiles = np.asarray(maze)
+    width, height = tiles.shape
+    xs, ys = np.indices((width, height))
+
+    # rocks and Fygar fire, added first as in the cost functions
+    common = np.zeros((width, height), dtype=np.int64)
+    for rock in state["rocks"]:
+        rock_x, rock_y = rock["pos"]
+        common[rock_x, rock_y] += POINTS_ROCKS
+        if rock_y + 1 < height:
+            common[rock_x, rock_y + 1] += POINTS_ROCKS
+
+    if danger is None:
+        danger = danger_map(state, maze)
+    common += POINTS_FYGAR * np.array(danger, dtype=np.int64)
+
+    normal = np.where(tiles == 1, POINTS_WALL, 1) + common
+    avoid = common.astype(np.float64)
+    blocked = np.zeros((width, height), dtype=bool)
+
+    for enemy in state["enemies"]:
+        enemy_x, enemy_y = enemy["pos"]
+        distance = np.abs(xs - enemy_x) + np.abs(ys - enemy_y)
+
+        if "traverse" in enemy and enemy["traverse"] == True:
+            ghost = distance <= 5
+            normal[ghost] += POINTS_GHOST
+            avoid[ghost] += POINTS_GHOST
+
+        if enemy["name"] != "Fygar":
+            blocked[
+                max(enemy_x - 1, 0) : enemy_x + 2, max(enemy_y - 1, 0) : enemy_y + 2
+            ] = True
+
+        avoid += POINTS_AVOID / (distance + 1)
+
+        for x, y in (
+            (enemy_x, enemy_y),
+            (enemy_x, enemy_y + 1),
+            (enemy_x + 1, enemy_y),
+            (enemy_x - 1, enemy_y),
+            (enemy_x, enemy_y - 1),
+        ):
+            if 0 <= x < width and 0 <= y < height:
+                normal[x, y] += POINTS_POOKA
+                avoid[x, y] += POINTS_POOKA
+
+    return normal.tolist(), avoid.tolist(), blocked.tolist(), danger
+
+
 def heuristic(a, b):
     """
     Calculates the Manhattan distance between two points in a 2D plane.
@@ -224,7 +219,17 @@ def heuristic(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
 
-def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=False):
+def astar(
+    maze,
+    start,
+    state,
+    nearest_enemy,
+    last_move,
+    moves_fygar,
+    controlo=False,
+    costs=None,
+    planner=None,
+):
     """
     Applies the A* algorithm to find the optimal path from the start to a goal position.
 
@@ -239,6 +244,9 @@ def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=Fa
         last_move (str): The last move made by the player.
         moves_fygar (list): A list of previous moves made by the Fygar enemy.
         controlo (bool, optional): A flag indicating a specific control scenario. Defaults to False.
+        costs (tuple, optional): The cost_field of maze and state, computed if not given. Defaults to None.
+        planner (DStarLite, optional): A planner that keeps its search between calls, used unless avoiding
+            enemies. Defaults to None.
 
     Returns:
         str or None: A string representing the next move ('A' for shooting) or None if no valid move is found.
@@ -253,6 +261,10 @@ def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=Fa
     real_enemy_x, real_enemy_y = state["enemies"][nearest_enemy]["pos"]
     avoid = False
 
+    if costs is None:
+        costs = cost_field(maze, state)
+    normal_cost, avoid_cost, blocked, danger = costs
+
     if last_move is not None and can_shoot(
         state, maze, last_move, nearest_enemy, digdug_x, digdug_y
     ):
@@ -264,8 +276,8 @@ def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=Fa
             and can_shoot(state, maze, last_move, nearest_enemy, digdug_x, digdug_y)
             == False
         )
-        or in_the_fire(state, maze, start)
-        or in_the_fire(state, maze, goal)
+        or in_the_fire(state, maze, start, danger)
+        or in_the_fire(state, maze, goal, danger)
         or controlo == True
     ):
         avoid = True
@@ -292,6 +304,69 @@ def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=Fa
             if start == goal:
                 return "A"
 
+    cost = avoid_cost if avoid else normal_cost
+
+    if planner is not None and not avoid:
+        path = planner.plan(start, goal, cost, blocked)
+    else:
+        # A fugir os custos mudam no mapa todo, procura de raiz
+        path = shortest_path(maze, start, goal, cost, blocked)
+
+    if path is None or avoid:
+        return path
+
+    # Ver o ultimo move
+    if len(path) > 1:
+        last_node = path[-2]
+        dx, dy = goal[0] - last_node[0], goal[1] - last_node[1]
+
+        if (
+            (
+                dx == 1 and real_enemy_x > digdug_x
+            )  # move para a direita e o inimigo esta a direita
+            or (
+                dx == -1 and real_enemy_x < digdug_x
+            )  # move para a esquerda e o inimigo esta a esquerda
+            or (
+                dy == 1 and real_enemy_y > digdug_y
+            )  # move para baixo e o inimigo esta abaixo
+            or (
+                dy == -1 and real_enemy_y < digdug_y
+            )  # move para cima e o inimigo esta acima
+        ):
+            return path
+
+        new_goal = None
+        if real_enemy_x > digdug_x:
+            new_goal = (goal[0] + 1, goal[1])
+        elif real_enemy_x < digdug_x:
+            new_goal = (goal[0] - 1, goal[1])
+        elif real_enemy_y > digdug_y:
+            new_goal = (goal[0], goal[1] + 1)
+        elif real_enemy_y < digdug_y:
+            new_goal = (goal[0], goal[1] - 1)
+
+        if new_goal is not None:
+            # print("new goal")
+            path[-1] = new_goal
+
+    return path
+
+
+def shortest_path(maze, start, goal, cost, blocked):
+    """
+    Finds the cheapest path from the start to the goal with the A* algorithm.
+
+    Args:
+        maze (list): A 2D list representing the game map where 1 indicates a wall and 0 indicates an open space.
+        start (tuple): A tuple representing the starting coordinates (x, y) for the pathfinding.
+        goal (tuple): A tuple representing the coordinates (x, y) to reach.
+        cost (list): A 2D list indexed as [x][y] with the cost of moving to each position.
+        blocked (list): A 2D list indexed as [x][y] of the positions next to a Pooka.
+
+    Returns:
+        list or None: The positions from the start to the goal, or None if the goal can not be reached.
+    """
     priority_queue = [(0, start)]
     visited = set()
     came_from = {}
@@ -306,71 +381,21 @@ def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=Fa
         visited.add(current_node)
 
         if current_node == goal:
-            path = reconstruct_path(start, goal, came_from)
-            if avoid:
-                return path
-
-            # Ver o ultimo move
-            if len(path) > 1:
-                last_node = path[-2]
-                dx, dy = current_node[0] - last_node[0], current_node[1] - last_node[1]
-
-                if (
-                    (
-                        dx == 1 and real_enemy_x > digdug_x
-                    )  # move para a direita e o inimigo esta a direita
-                    or (
-                        dx == -1 and real_enemy_x < digdug_x
-                    )  # move para a esquerda e o inimigo esta a esquerda
-                    or (
-                        dy == 1 and real_enemy_y > digdug_y
-                    )  # move para baixo e o inimigo esta abaixo
-                    or (
-                        dy == -1 and real_enemy_y < digdug_y
-                    )  # move para cima e o inimigo esta acima
-                ):
-                    return path
-
-                new_goal = None
-                if real_enemy_x > digdug_x:
-                    new_goal = (current_node[0] + 1, current_node[1])
-                elif real_enemy_x < digdug_x:
-                    new_goal = (current_node[0] - 1, current_node[1])
-                elif real_enemy_y > digdug_y:
-                    new_goal = (current_node[0], current_node[1] + 1)
-                elif real_enemy_y < digdug_y:
-                    new_goal = (current_node[0], current_node[1] - 1)
-
-                if new_goal is not None:
-                    # print("new goal")
-                    path[-1] = new_goal
-
-                return path
+            return reconstruct_path(start, goal, came_from)
 
         for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
             nx_, ny_ = current_node[0] + dx, current_node[1] + dy
             if 0 <= nx_ < len(maze) and 0 <= ny_ < len(maze[0]):
                 neighbor = (nx_, ny_)
 
-                control = False
-                for enemy in state["enemies"]:
-                    if (
-                        current_node[0] != 0
-                        and current_node[0] != 47
-                        and current_node[1] != 0
-                        and current_node[1] != 23
-                    ):
-                        """if enemy["name"] == "Fygar":
-                        if goal != neighbor and in_the_fire(state, maze, neighbor):
-                            control = True
-                            break"""
-                        if enemy["name"] != "Fygar":
-                            if (
-                                abs(nx_ - enemy["pos"][0]) <= 1
-                                and abs(ny_ - enemy["pos"][1]) <= 1
-                            ):
-                                control = True
-                                break
+                # Nao passar ao lado de um Pooka, a nao ser na borda do mapa
+                control = (
+                    current_node[0] != 0
+                    and current_node[0] != 47
+                    and current_node[1] != 0
+                    and current_node[1] != 23
+                    and blocked[nx_][ny_]
+                )
 
                 """ for rock in state["rocks"]:
                     rock_x, rock_y = rock["pos"]
@@ -384,11 +409,7 @@ def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=Fa
                 if control:
                     continue
 
-                new_cost = cost_so_far[current_node] + (
-                    calculate_cost_avoid_enemies(maze, neighbor, state, nearest_enemy)
-                    if avoid
-                    else calculate_cost_normal(maze, neighbor, state, nearest_enemy)
-                )
+                new_cost = cost_so_far[current_node] + cost[nx_][ny_]
 
                 if neighbor not in cost_so_far or new_cost < cost_so_far[neighbor]:
                     cost_so_far[neighbor] = new_cost
@@ -399,6 +420,67 @@ def astar(maze, start, state, nearest_enemy, last_move, moves_fygar, controlo=Fa
     return None
 
 
+def target_costs(maze, start, state, moves_fygar, costs=None):
+    """
+    Calculates the cost of the cheapest path from the start to the goal of every enemy.
+
+    This function runs a single Dijkstra search from the start over the normal costs, with the moves of
+    astar, until the goal set_goal gives for each enemy is reached, or every position is.
+
+    Args:
+        maze (list): A 2D list representing the game map where 1 indicates a wall and 0 indicates an open space.
+        start (tuple): A tuple representing the starting coordinates (x, y) for the search.
+        state (dict): The game state containing information about the current game situation.
+        moves_fygar (dict): The previous positions of each Fygar enemy, by id.
+        costs (tuple, optional): The cost_field of maze and state, computed if not given. Defaults to None.
+
+    Returns:
+        list: The cost of the path to the goal of each enemy of the "enemies" list of the game state, or
+        infinity when it can not be reached.
+    """
+    if costs is None:
+        costs = cost_field(maze, state)
+    cost, _, blocked, _ = costs
+    width, height = len(cost), len(cost[0])
+
+    goals = [
+        set_goal(state, enemy, maze, moves_fygar)
+        for enemy in range(len(state["enemies"]))
+    ]
+    # Objetivos fora do mapa nunca sao alcancados
+    remaining = {x * height + y for x, y in goals if 0 <= x < width and 0 <= y < height}
+
+    distance = [float("inf")] * (width * height)
+    node = start[0] * height + start[1]
+    distance[node] = 0
+    heap = RadixHeap()
+    heap.push(0, node)
+
+    while heap.size and remaining:
+        total, node = heap.pop()
+        if total > distance[node]:
+            continue
+        remaining.discard(node)
+
+        x, y = divmod(node, height)
+        inside = x != 0 and x != width - 1 and y != 0 and y != height - 1
+        for nx_, ny_ in [(x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)]:
+            if 0 <= nx_ < width and 0 <= ny_ < height:
+                # Nao passar ao lado de um Pooka, a nao ser na borda do mapa
+                if inside and blocked[nx_][ny_]:
+                    continue
+                new_cost = total + cost[nx_][ny_]
+                neighbor = nx_ * height + ny_
+                if new_cost < distance[neighbor]:
+                    distance[neighbor] = new_cost
+                    heap.push(new_cost, neighbor)
+
+    return [
+        distance[x * height + y] if 0 <= x < width and 0 <= y < height else float("inf")
+        for x, y in goals
+    ]
+
+
 def reconstruct_path(start, goal, came_from):
     """
     Reconstructs the path from the start to the goal using the came_from dictionary.
@@ -3,19 +3,25 @@ from __future__ import annotations
 import argparse
 import asyncio
 from datetime import datetime
+from http import HTTPStatus
 import json
 import logging
 import os.path
-import random
+import time
 from collections import namedtuple
 from typing import Any, Dict, Set
 
-import requests
 import websockets
-from requests import RequestException
 from websockets.legacy.protocol import WebSocketCommonProtocol
 
-from game import Game
+from broadcast import Broadcast, Message
+from game import GAME_SPEED, Game
+from mapa import tiles_digest
+from highscores import HighscoreStore
+from metrics import Metrics
+from protocol import BinaryEncoder, DeltaEncoder
+from replay import Recorder
+from submission import BATCH_SIZE, GradingQueue
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -26,14 +32,380 @@ wslogger.setLevel(logging.WARN)
 logger = logging.getLogger("Server")
 logger.setLevel(logging.INFO)
 
-Player = namedtuple("Player", ["name", "ws"])
+Player = namedtuple("Player", ["name", "ws", "lockstep"], defaults=[None])
+# Lockstep mode: the next frame is computed as soon as the player sends a key for
+# the current one, but not before min_tick nor after max_tick seconds.
+Lockstep = namedtuple("Lockstep", ["min_tick", "max_tick"])
+
+MAX_GAMES = 10  # games played at the same time
+MAX_TICK = 1.0  # longest a lockstep game waits for the player's key (seconds)
+OVERRUN = 1.2  # a real time tick longer than this many ticks is an overrun
+METRICS_PERIOD = 60  # seconds between metrics log lines
+METRICS_BIND = "127.0.0.1"  # /metrics is only served locally unless asked otherwise
+
+
+class Watched:
+    """A game as its viewers see it, each frame encoded once for all of them.
+
+    GameSession plays the game, the relay mirrors the games of a server. Subclasses
+    set game, anything with the info() and map of a Game.
+    """
+
+    game: Game
+
+    def __init__(self, server: ViewerHub, player: Player):
+        self.server = server
+        self.player = player
+        self.viewers = Broadcast(metrics=server.metrics)
+        self.encoder = DeltaEncoder()
+        self.encoders: Dict[int, DeltaEncoder] = {}  # of viewers at lower rates
+        self.packer = BinaryEncoder()
+
+    def message(self, game_info: Dict[str, Any]) -> Message:
+        """Game info encoded for every client, binary only if a client wants it and
+        without the map only if a client caches maps."""
+        binary = self.packer.info(game_info) if self.server.binary else None
+        short = None
+        if self.server.maps and "digest" in game_info:
+            short = json.dumps({k: v for k, v in game_info.items() if k != "map"})
+        return Message(json.dumps(game_info), binary, game_info.get("digest"), short)
+
+    def join_info(self) -> Dict[str, Any]:
+        """Info for a viewer joining mid-level, with the map of the start of the level.
+
+        Map caches then only ever store level maps, the cells dug since come in the
+        keyframe that follows.
+        """
+        info = self.game.info()
+        tiles = self.game.map.undug()
+        info.update(map=tiles.tolist(), digest=tiles_digest(tiles))
+        return info
+
+    def delta(self, state: Dict[str, Any], every: int = 1):
+        """Delta frame of state for the clients in delta mode at that rate, and if it
+        is a keyframe.
+
+        The frame is None when no client is in delta mode. It is a keyframe, with all
+        the dug cells, when a viewer at that rate is new or dropped frames.
+        """
+        encoder = self.encoder
+        if every > 1:
+            encoder = self.encoders.setdefault(every, DeltaEncoder())
+        if not self.server.delta:
+            encoder.reset()  # nobody to diff against
+            return None, False
+        if self.viewers.wants_keyframe(every):
+            encoder.reset()
+        frame = encoder.encode(state, self.game.map.digged)
+        return json.dumps(frame), "delta" not in frame
+
+    def send_frame(
+        self,
+        state: Dict[str, Any],
+        full: str,
+        delta: str = None,
+        binary: bytes = None,
+        keyframe: bool = False,
+    ):
+        """Send a frame to the viewers, delta is the one of the player's frame."""
+        self.viewers.send_frame(full, delta, binary, 1, keyframe)
+        self.send_coalesced(state, full, binary)
+
+    def send_coalesced(self, state: Dict[str, Any], full: str, binary: bytes):
+        """Send the frame to the viewers watching at lower rates, on their ticks.
+
+        Their deltas span the ticks since their previous frame, cells dug during
+        those ticks included. Nothing is encoded for rates nobody watches at.
+        """
+        rates = self.viewers.rates
+        for every in rates - {1}:  # viewers at the game rate get the player's frames
+            if state["step"] % every == 0:
+                delta, keyframe = self.delta(state, every)
+                self.viewers.send_frame(full, delta, binary, every, keyframe)
+        for every in set(self.encoders) - rates:
+            del self.encoders[every]
+
+
+class GameSession(Watched):
+    """A game of one player, and the viewers watching it."""
+
+    def __init__(self, server: GameServer, player: Player):
+        super().__init__(server, player)
+        self.game = Game(seed=server.seed if server.seed > 0 else None)
+        self.game.metrics = server.metrics
+        self._last_frame = None  # when the previous frame was sent
+        self._relayed = None  # number of the game on the relay
+        self._key = asyncio.Event()  # set when the player sends a key in lockstep
+        self._waiting = False  # a frame was sent and the player did not answer yet
+
+    def keypress(self, key: str):
+        self.game.keypress(key)
+        self._key.set()
+
+    async def next_frame(self):
+        """Wait for the wall clock, or in lockstep mode for the player, and step."""
+        lockstep = self.player.lockstep
+        if lockstep is None:
+            return await self.game.next_frame()
+
+        start = asyncio.get_running_loop().time()
+        if self._waiting:
+            try:
+                await asyncio.wait_for(self._key.wait(), lockstep.max_tick)
+            except asyncio.TimeoutError:
+                pass
+        elapsed = asyncio.get_running_loop().time() - start
+        await asyncio.sleep(max(0, lockstep.min_tick - elapsed))  # let others run
+
+        self._key.clear()
+        state = self.game.step()
+        self._waiting = bool(state)
+        return state
+
+    async def send_info(self, game_info: Dict[str, Any], highscores: bool = False):
+        """Send game info to viewer and player."""
+
+        if highscores:
+            game_info["highscores"] = self.server.highscores
+            game_info["player"] = self.player.name
+
+        message = self.message(game_info)
+        self.viewers.send(message)
+        if self._relayed is not None:
+            self.server.relay.info(self._relayed, message.text, self.game.map.digged)
+        ws = self.player.ws
+        await ws.send(
+            message.encoding(ws in self.server.binary, self.server.maps.get(ws))
+        )
+
+    def tick(self, now: float):
+        """Account the time since the previous frame."""
+        if self._last_frame is not None:
+            interval = now - self._last_frame
+            self.server.metrics.observe("tick", interval)
+            if self.player.lockstep is None and interval > OVERRUN / GAME_SPEED:
+                self.server.metrics.count("overruns")
+        self._last_frame = now
+
+    async def run(self):
+        """Play the game until it is over or the player disconnects."""
+        logger.info(
+            "Starting game for <%s>%s",
+            self.player.name,
+            f" in {self.player.lockstep}" if self.player.lockstep else "",
+        )
+        if self.server.relay is not None:
+            self._relayed = self.server.relay.start(self.player.name)
+
+        recorder = None
+        if self.server.replays:
+            recorder = Recorder(self.game, self.player.name, self.server.seed)
+            replay_file = os.path.join(
+                self.server.replays,
+                f"{datetime.now():%Y%m%d-%H%M%S}-"
+                + "".join(c for c in self.player.name if c.isalnum())
+                + ".replay",
+            )
+
+        try:
+            while self.game.running:
+                if self.game._step == 0:  # Starting a level ? Let's send the info
+                    game_info = self.game.info()
+                    await self.send_info(game_info)
+
+                state = await self.next_frame()
+                if not state:
+                    self._last_frame = None  # the next tick includes a new level
+                else:
+                    metrics = self.server.metrics
+                    start = time.perf_counter()
+                    state["player"] = self.player.name
+                    state["ts"] = datetime.utcnow().astimezone().timestamp()
+                    delta, keyframe = self.delta(state)
+                    binary = None
+                    if self.server.binary:
+                        binary = self.packer.state(state)
+                    full = json.dumps(state)
+                    encoded = time.perf_counter()
+                    metrics.observe("encode", encoded - start)
+
+                    await self.player.ws.send(
+                        self.server.frame(self.player.ws, full, delta, binary)
+                    )
+                    sent = time.perf_counter()
+                    metrics.observe("send", sent - encoded, self.player.ws)
+                    self.tick(sent)
+
+                    self.send_frame(state, full, delta, binary, keyframe)
+                    if self._relayed is not None:
+                        self.server.relay.frame(
+                            self._relayed, full, self.game.map.digged
+                        )
+
+                    if self.server.dbg and self.game.respawn:
+                        self.server.debug_map(
+                            self.game.map, self.game._digdug, self.game._enemies
+                        )
+
+            if self.player.lockstep is None:  # lockstep agents get more time to think
+                self.server.save_highscores(self.player.name, self.game.score)
+
+            game_info = self.game.info()
+            game_info["player"] = self.player.name
+
+            await self.send_info(game_info, highscores=True)
+
+        except websockets.exceptions.ConnectionClosed:
+            logger.info("<%s> disconnected during the game", self.player.name)
+        finally:
+            if self.server.grading is not None and self.player.lockstep is None:
+                self.server.grading.submit(
+                    {
+                        "player": self.player.name,
+                        "score": self.game.score,
+                        "level": self.game.level,
+                        "seed": self.server.seed,
+                    }
+                )
+
+            if recorder:
+                recorder.save(replay_file)
+
+            if self._relayed is not None:
+                self.server.relay.end(self._relayed)
+
+            logger.info("Disconnecting <%s>", self.player.name)
+            await self.player.ws.close()
+
+
+class ViewerHub:
+    """Clients, how they want their messages, and the viewers of the games.
+
+    GameServer serves the players and viewers of its games, the relay only viewers.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[Any, Watched] = {}  # games being played
+        self.viewers: Dict[WebSocketCommonProtocol, str | None] = {}  # player to watch
+        self.idle: Set[WebSocketCommonProtocol] = set()  # viewers waiting for a game
+        self.delta: Set[WebSocketCommonProtocol] = set()  # clients in delta mode
+        self.keyframe: Set[WebSocketCommonProtocol] = set()  # waiting a keyframe
+        self.binary: Set[WebSocketCommonProtocol] = set()  # clients in binary mode
+        # digests of the maps each client caching maps has
+        self.maps: Dict[WebSocketCommonProtocol, Set[str]] = {}
+        self.rates: Dict[WebSocketCommonProtocol, int] = {}  # ticks between frames
+
+        self.metrics = Metrics()
+        self.metrics.gauge("games", lambda: len(self.sessions))
+        self.metrics.gauge("viewers", lambda: len(self.viewers))
+        self.metrics.gauge(
+            "viewer_queue_max",
+            lambda: max((s.viewers.queued for s in self.sessions.values()), default=0),
+        )
+        self.metrics.gauge(
+            "viewer_frames_dropped",
+            lambda: sum(s.viewers.dropped for s in self.sessions.values()),
+        )
+
+    def join(self, websocket: WebSocketCommonProtocol, data: Dict[str, Any]):
+        """Note the encodings asked by a client joining with data."""
+        if data.get("delta"):
+            self.delta.add(websocket)
+            self.keyframe.add(websocket)
+        if data.get("binary"):
+            self.binary.add(websocket)
+        if "maps" in data:
+            self.maps[websocket] = set(data["maps"])
+
+    def join_viewer(self, websocket: WebSocketCommonProtocol, data: Dict[str, Any]):
+        """Start sending a game to a viewer joining with data, or wait for one."""
+        logger.info("Viewer connected")
+        self.viewers[websocket] = data.get("player")
+        self.rates[websocket] = self.rate(data.get("fps"))
+        for session in self.sessions.values():
+            if self.watches(websocket, session):
+                outbox = self.attach(websocket, session)
+                outbox.put(session.message(session.join_info()))
+                break
+        else:
+            self.idle.add(websocket)
+
+    def leave(self, websocket: WebSocketCommonProtocol):
+        """Forget a client that disconnected."""
+        if websocket in self.viewers:
+            del self.viewers[websocket]
+            del self.rates[websocket]
+            self.idle.discard(websocket)
+            for session in self.sessions.values():
+                session.viewers.discard(websocket)
+        self.delta.discard(websocket)
+        self.keyframe.discard(websocket)
+        self.binary.discard(websocket)
+        self.maps.pop(websocket, None)
+        self.metrics.forget(websocket)
+
+    def watches(self, viewer: WebSocketCommonProtocol, session: Watched):
+        """Whether viewer wants to watch session, any game if it named no player."""
+        wanted = self.viewers[viewer]
+        return wanted is None or wanted == session.player.name
+
+    def attach(self, viewer: WebSocketCommonProtocol, session: Watched):
+        """Start sending the game of session to viewer, returns its Outbox."""
+        return session.viewers.add(
+            viewer,
+            viewer in self.delta,
+            viewer in self.binary,
+            self.maps.get(viewer),
+            self.rates[viewer],
+        )
+
+    def rate(self, fps) -> int:
+        """Ticks between the frames of a viewer that asked for fps frames a second.
+
+        The rate is relative to the real time speed, lockstep games go faster.
+        """
+        if not fps:
+            return 1
+        return max(1, round(GAME_SPEED / float(fps)))
+
+    def start_watching(self, session: Watched):
+        """Attach the idle viewers that want to watch a new session."""
+        for viewer in [v for v in self.idle if self.watches(v, session)]:
+            self.idle.remove(viewer)
+            self.attach(viewer, session)
+
+    def stop_watching(self, session: Watched):
+        """Detach the viewers of a session that ended, they wait for another game."""
+        self.idle.update(v for v in session.viewers if v in self.viewers)
+        session.viewers.close()
+
+    async def process_request(self, path: str, request_headers):
+        """Answer GET /metrics over plain HTTP, on the metrics port only."""
+        if path == "/metrics":
+            body = json.dumps(self.metrics.snapshot(), indent=2).encode()
+            return HTTPStatus.OK, [("Content-Type", "application/json")], body
+        return HTTPStatus.NOT_FOUND, [], b""
+
+    def serve_metrics(self, host: str, port: int):
+        """Server of /metrics, apart from the public port of the games and viewers."""
+        logger.info("Metrics @ http://%s:%s/metrics", host, port)
+        return websockets.serve(
+            self.refuse, host, port, process_request=self.process_request
+        )
 
-HIGHSCORE_FILE = "highscores.json"
-MAX_HIGHSCORES = 10
+    async def refuse(self, websocket: WebSocketCommonProtocol, path: str):
+        """Websockets have nothing to do on the metrics port."""
+        await websocket.close()
 
+    async def report(self, period: float = METRICS_PERIOD):
+        """Log a line of metrics every period seconds."""
+        while True:
+            await asyncio.sleep(period)
+            logger.info("Metrics: %s", self.metrics.summary())
 
-class GameServer:
-    """Network Game Server."""
+
+class GameServer(ViewerHub):
+    """Network Game Server, players waiting in line get a game as soon as one ends."""
 
     def __init__(
         self,
@@ -42,58 +414,60 @@ class GameServer:
         seed: int = 0,
         grading: str = None,
         dbg: bool = False,
+        replays: str = None,
+        max_games: int = MAX_GAMES,
+        lockstep: bool = False,
+        relay: str = None,
+        grading_batch: int = BATCH_SIZE,
     ):
         """Initialize Gameserver."""
         self.dbg = dbg
+        self.replays = replays  # directory to save a replay of each game
         self.seed = seed
-        self.game = Game()
+        super().__init__()
         self.players: asyncio.Queue[Player] = asyncio.Queue()
-        self.viewers: Set[WebSocketCommonProtocol] = set()
-        self.current_player: Player | None = None
-        self.grading = grading
+        self.slots = asyncio.Semaphore(max_games)
+        self.grading = None
+        if grading:
+            self.grading = GradingQueue(grading, batch_size=grading_batch)
+        # whether players can ask for lockstep games, which are not graded
+        self.lockstep = lockstep
+        self.relay = None  # publishes the games to a relay serving their viewers
+        if relay:
+            from relay import Publisher  # relay.py imports this module
+
+            self.relay = Publisher(relay)
         self._level = level  # game level
         self._timeout = timeout  # timeout for game
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.metrics.gauge("players_waiting", self.players.qsize)
+        self.metrics.gauge(
+            "grading_pending", lambda: len(self.grading) if self.grading else 0
+        )
 
-        self._highscores = []
-        if os.path.isfile(HIGHSCORE_FILE):
-            with open(HIGHSCORE_FILE, "r") as infile:
-                self._highscores = json.load(infile)
+        self._highscores = HighscoreStore()
 
-    def save_highscores(self, score: int):
-        """Update highscores, storing to file."""
-        if not self.current_player:
-            raise Exception("Can't save highscores without current player")
+    @property
+    def highscores(self):
+        return self._highscores.scores
 
+    def save_highscores(self, player: str, score: int):
+        """Update highscores, the file is written later on a thread."""
         logger.debug("Save highscores")
         logger.info(
             "Saving: %s <%s>",
-            self.current_player.name,
+            player,
             score,
         )
 
-        self._highscores.append((self.current_player.name, score))
-        self._highscores = sorted(self._highscores, key=lambda s: s[1], reverse=True)[
-            :MAX_HIGHSCORES
-        ]
+        self._highscores.add(player, score)
 
-        with open(HIGHSCORE_FILE, "w") as outfile:
-            json.dump(self._highscores, outfile)
-
-    async def send_info(self, game_info: Dict[str, Any], highscores: bool = False):
-        """Send game info to viewer and player."""
-
-        if highscores:
-            game_info["highscores"] = self._highscores
-            game_info["player"] = self.current_player.name
-
-        for viewer in self.viewers:
-            try:
-                await viewer.send(json.dumps(game_info))
-            except Exception:
-                self.viewers.remove(viewer)
-                break
-        if self.current_player:
-            await self.current_player.ws.send(json.dumps(game_info))
+    def close(self):
+        """Write what is still pending to disk, and disconnect from the relay."""
+        self._highscores.close()
+        if self.relay is not None:
+            self.relay.close()
 
     async def incomming_handler(self, websocket: WebSocketCommonProtocol, path: str):
         """Process new clients arriving at the server."""
@@ -103,32 +477,59 @@ class GameServer:
                 if "cmd" not in data:
                     continue
                 if data["cmd"] == "join":
+                    self.join(websocket, data)
+
                     if path == "/player":
                         logger.info("<%s> has joined", data["name"])
-                        await self.players.put(Player(data["name"], websocket))
+                        await self.players.put(
+                            Player(
+                                data["name"],
+                                websocket,
+                                self.negotiate(data.get("lockstep")),
+                            )
+                        )
 
                     if path == "/viewer":
-                        logger.info("Viewer connected")
-                        self.viewers.add(websocket)
-                        if self.game.running:
-                            game_info = self.game.info()
-                            await websocket.send(json.dumps(game_info))
-
-                if (
-                    data["cmd"] == "key"
-                    and self.current_player
-                    and self.current_player.ws == websocket
-                ):
-                    logger.debug((self.current_player.name, data))
+                        self.join_viewer(websocket, data)
+
+                session = self.sessions.get(websocket)
+                if data["cmd"] == "key" and session:
+                    logger.debug((session.player.name, data))
                     if len(data["key"]) > 0:
-                        self.game.keypress(data["key"][0])
+                        session.keypress(data["key"][0])
                     else:
-                        self.game.keypress("")
+                        session.keypress("")
 
         except websockets.exceptions.ConnectionClosed as closed_reason:
             logger.info("Client disconnected: %s", closed_reason)
-            if websocket in self.viewers:
-                self.viewers.remove(websocket)
+        finally:
+            self.leave(websocket)
+
+    def negotiate(self, request) -> Lockstep | None:
+        """Lockstep settings for a player that joined asking for request.
+
+        request is true or {"min_tick": seconds, "max_tick": seconds}, max_tick
+        defaults to the real time tick and is capped to MAX_TICK.
+        """
+        if not request or not self.lockstep:
+            return None
+        if not isinstance(request, dict):
+            request = {}
+        max_tick = min(float(request.get("max_tick", 1.0 / GAME_SPEED)), MAX_TICK)
+        min_tick = min(float(request.get("min_tick", 0)), max_tick)
+        return Lockstep(max(min_tick, 0), max_tick)
+
+    def frame(self, websocket, state: str, delta: str, binary: bytes = None):
+        """Message to send to a client, the delta unless it is waiting a keyframe.
+
+        Clients in binary mode always get binary, which holds the full state.
+        """
+        if websocket in self.binary and binary is not None:
+            return binary
+        if websocket not in self.delta or websocket in self.keyframe:
+            self.keyframe.discard(websocket)
+            return state
+        return delta
 
     def debug_map(self, mapa, digdug, enemies):
         from PIL import Image
@@ -151,75 +552,45 @@ class GameServer:
         img.show()
 
     async def mainloop(self):
-        """Run the game."""
+        """Start a game for each player, in arrival order, up to max_games at once."""
+        if self.grading is not None:
+            self._spawn(self.grading.run())
+        self._spawn(self.report())
+
         while True:
+            await self.slots.acquire()
             logger.info("Waiting for player")
-            self.current_player = await self.players.get()
+            player = await self.players.get()
 
-            if self.current_player.ws.closed:
-                logger.error("<%s> disconnect while waiting", self.current_player.name)
+            if player.ws.closed:
+                logger.error("<%s> disconnect while waiting", player.name)
+                self.slots.release()
                 continue
 
-            try:
-                logger.info("Starting game for <%s>", self.current_player.name)
-                if self.seed > 0:
-                    random.seed(self.seed)
-
-                self.game = Game()
-                self.game.start(self.current_player.name)
-
-                if self.grading:
-                    game_record = {}
-                    game_record["player"] = self.current_player.name
-
-                while self.game.running:
-                    if self.game._step == 0:  # Starting a level ? Let's send the info
-                        game_info = self.game.info()
-                        await self.send_info(game_info)
-
-                    if state := await self.game.next_frame():
-                        state["player"] = self.current_player.name
-                        state["ts"] = datetime.utcnow().astimezone().timestamp()
-                        state = json.dumps(state)
-
-                        await self.current_player.ws.send(state)
-
-                        for viewer in self.viewers:
-                            try:
-                                await viewer.send(state)
-                            except Exception:
-                                self.viewers.remove(viewer)
-                                break
-
-                        if self.dbg and self.game.respawn:
-                            self.debug_map(
-                                self.game.map, self.game._digdug, self.game._enemies
-                            )
-
-                self.save_highscores(self.game.score)
-
-                game_info = self.game.info()
-                game_info["player"] = self.current_player.name
+            if self.relay is not None:
+                await self.relay.connect()
+            session = GameSession(self, player)
+            session.game.start(player.name)  # viewers joining now ask for its info
+            self.start_watching(session)
+            self.sessions[player.ws] = session
 
-                await self.send_info(game_info, highscores=True)
-                await self.current_player.ws.close()
-                self.current_player = None
+            self._spawn(self.play(session))
 
-            except websockets.exceptions.ConnectionClosed:
-                self.current_player = None
-            finally:
-                try:
-                    if self.grading:
-                        game_record["score"] = self.game.score
-                        game_record["level"] = self.game.level
-                        requests.post(self.grading, json=game_record, timeout=2)
-                except RequestException as err:
-                    logger.error(err)
-                    logger.warning("Could not save score to server")
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)  # the loop only keeps weak references to tasks
+        task.add_done_callback(self._tasks.discard)
 
-                if self.current_player:
-                    logger.info("Disconnecting <%s>", self.current_player.name)
-                    await self.current_player.ws.close()
+    async def play(self, session: GameSession):
+        """Run a game session, then free its slot and its viewers."""
+        try:
+            await session.run()
+        except Exception:
+            logger.exception("Game of <%s> failed", session.player.name)
+        finally:
+            del self.sessions[session.player.ws]
+            self.stop_watching(session)
+            self.slots.release()
 
 
 if __name__ == "__main__":
@@ -230,22 +601,69 @@ if __name__ == "__main__":
     parser.add_argument(
         "--debug", help="Open Bitmap with map on gameover", action="store_true"
     )
+    parser.add_argument(
+        "--replays", help="Directory where to save game replays", default="replays"
+    )
+    parser.add_argument(
+        "--max-games",
+        help="Number of games played at the same time",
+        type=int,
+        default=MAX_GAMES,
+    )
+    parser.add_argument(
+        "--lockstep",
+        help="Accept lockstep games, they are kept out of grading and highscores",
+        action="store_true",
+    )
     parser.add_argument(
         "--grading-server",
         help="url of grading server",
         default="http://tetriscores.av.it.pt/game",
     )
+    parser.add_argument(
+        "--grading-batch",
+        help="Records per POST to a grading server that takes lists of them",
+        type=int,
+        default=BATCH_SIZE,
+    )
+    parser.add_argument(
+        "--relay", help="Unix socket of a relay to publish the games to (relay.py)"
+    )
+    parser.add_argument(
+        "--metrics-port", help="TCP port to serve /metrics on, off if 0", type=int
+    )
+    parser.add_argument(
+        "--metrics-bind", help="IP address to serve /metrics on", default=METRICS_BIND
+    )
     args = parser.parse_args()
 
     async def main():
         """Start server tasks."""
-        g = GameServer(0, -1, args.seed, args.grading_server, args.debug)
+        os.makedirs(args.replays, exist_ok=True)
+        g = GameServer(
+            0,
+            -1,
+            args.seed,
+            args.grading_server,
+            args.debug,
+            args.replays,
+            args.max_games,
+            args.lockstep,
+            args.relay,
+            args.grading_batch,
+        )
 
         game_loop_task = asyncio.ensure_future(g.mainloop())
 
         logger.info("Listenning @ %s:%s", args.bind, args.port)
         websocket_server = websockets.serve(g.incomming_handler, args.bind, args.port)
+        servers = [websocket_server, game_loop_task]
+        if args.metrics_port:
+            servers.append(g.serve_metrics(args.metrics_bind, args.metrics_port))
 
-        await asyncio.gather(websocket_server, game_loop_task)
+        try:
+            await asyncio.gather(*servers)
+        finally:
+            g.close()
 
     asyncio.run(main())
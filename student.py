@@ -4,6 +4,8 @@ import json
 import os
 import websockets
 import math
+from dstar import DStarLite
+from protocol import DeltaDecoder, MapCache, load
 from search import *
 
 mapa = None
@@ -11,87 +13,157 @@ linhas = 24
 colunas = 48
 
 
-async def agent_loop(server_address="localhost:8000", agent_name="student"):
+class Agent:
+    """
+    Decision logic of the student agent, independent of the transport.
+
+    The agent is fed every message received from the server (game info and state
+    updates) and answers with the key to press, or None when it has nothing to do.
+    This lets the same agent play over a websocket or in-process against the
+    headless engine.
+
+    By default the agent chases the enemy nearest in a straight line, with
+    by_path it chases the one it can reach at the lowest cost instead. Chasing by
+    path cost stays opt-in as it scores lower: the costs jump whenever fire or a
+    Pooka crosses a route, so the target keeps changing, and the shooting and
+    fleeing logic keyed on the chased enemy leaves the nearest one free to attack.
+    """
+
+    def __init__(self, by_path=False):
+        self.by_path = by_path
+        self.mapa = None
+        self.last_move = None
+        self.place_rocks = True
+        self.moves_fygar = {}
+        self.planner = DStarLite()
+
+    def update(self, state):
+        """
+        Processes a message from the server and chooses the next key.
+
+        Args:
+            state (dict): The message received from the server, either game info or a state update.
+
+        Returns:
+            str or None: The key to send to the server, or None if no key should be sent.
+        """
+        if "map" in state:
+            self.mapa = state["map"]
+            self.planner.reset()
+
+        if "digdug" not in state or len(state["digdug"]) == 0:
+            return None
+
+        if "enemies" not in state or len(state["enemies"]) == 0:
+            return None
+
+        mapa = self.mapa
+        moves_fygar = self.moves_fygar
+
+        # Set rocks as 1 on the map (to be used in the A* algorithm)
+        if self.place_rocks:
+            for rock in state["rocks"]:
+                rock_x, rock_y = rock["pos"]
+                mapa[rock_x][rock_y] = 1
+            self.place_rocks = False
+
+        # Update player's position on the map
+        digdug_x, digdug_y = state["digdug"]
+
+        mapa[digdug_x][digdug_y] = 0  # Remove wall from the map
+
+        # Update Fygar enemies' move history
+        for enemy in state["enemies"]:
+            if enemy["name"] == "Fygar":
+                if enemy["id"] not in moves_fygar:
+                    moves_fygar[enemy["id"]] = [enemy["pos"]]
+                else:
+                    if moves_fygar[enemy["id"]][-1] != enemy["pos"]:
+                        moves_fygar[enemy["id"]].append(enemy["pos"])
+
+        # Costs of the positions of the map, shared by all the searches
+        costs = cost_field(mapa, state)
+
+        # Get the index of the enemy to chase
+        if self.by_path:
+            nearest_enemy = cheapest_enemy(state, mapa, moves_fygar, costs)
+        else:
+            nearest_enemy = nearest_distance(state)
+        if nearest_enemy is None:
+            return None
+
+        # Preform A* algorithm to find the best path to the nearest enemy, if possible
+        acao = astar(
+            mapa,
+            (digdug_x, digdug_y),
+            state,
+            nearest_enemy,
+            self.last_move,
+            moves_fygar,
+            costs=costs,
+            planner=self.planner,
+        )
+        # If the A* algorithm fails, try again with the control flag set to True, runs away avoiding enemies
+        if acao == None:
+            acao = astar(
+                mapa,
+                (digdug_x, digdug_y),
+                state,
+                nearest_enemy,
+                self.last_move,
+                moves_fygar,
+                controlo=True,
+                costs=costs,
+            )
+
+        if acao != None and len(acao) == 2 and acao[1] == acao[0]:
+            self.last_move = "A"
+            return "A"
+        elif acao != None and len(acao) > 1:
+            nextStepList = acao[1]
+            nextStep = [int(nextStepList[0]), int(nextStepList[1])]
+
+            move = get_action((digdug_x, digdug_y), nextStep)
+            self.last_move = move
+            return move
+        elif acao != None and len(acao) == 1 and acao == "A":
+            self.last_move = "A"
+            return "A"
+        return None
+
+
+async def agent_loop(
+    server_address="localhost:8000",
+    agent_name="student",
+    lockstep=False,
+    binary=False,
+    maps=None,
+    by_path=False,
+):
+    cache = MapCache(maps)  # maps already received, the server does not resend them
     async with websockets.connect(f"ws://{server_address}/player") as websocket:
-        await websocket.send(json.dumps({"cmd": "join", "name": agent_name}))
-        last_move = None
-        i = True
-        moves_fygar = {}
+        await websocket.send(
+            json.dumps(
+                {
+                    "cmd": "join",
+                    "name": agent_name,
+                    "delta": True,
+                    "lockstep": lockstep,
+                    "binary": binary,
+                    "maps": cache.digests,
+                }
+            )
+        )
+        agent = Agent(by_path)
+        decoder = DeltaDecoder()
         while True:
             try:
-                state = json.loads(await websocket.recv())
-                if "map" in state:
-                    mapa = state["map"]
-
-                if "digdug" not in state or len(state["digdug"]) == 0:
-                    continue
-
-                if "enemies" not in state or len(state["enemies"]) == 0:
-                    continue
-
-                # Set rocks as 1 on the map (to be used in the A* algorithm)
-                if i:
-                    for rock in state["rocks"]:
-                        rock_x, rock_y = rock["pos"]
-                        mapa[rock_x][rock_y] = 1
-                    i = False
-
-                # Update player's position on the map
-                digdug_x, digdug_y = state["digdug"]
-
-                mapa[digdug_x][digdug_y] = 0  # Remove wall from the map
-
-                # Update Fygar enemies' move history
-                for enemy in state["enemies"]:
-                    if enemy["name"] == "Fygar":
-                        if enemy["id"] not in moves_fygar:
-                            moves_fygar[enemy["id"]] = [enemy["pos"]]
-                        else:
-                            if moves_fygar[enemy["id"]][-1] != enemy["pos"]:
-                                moves_fygar[enemy["id"]].append(enemy["pos"])
-
-                # Get the index of the nearest enemy to the player
-                nearest_enemy = nearest_distance(state)
-                if nearest_enemy is None:
-                    continue
-
-                # Preform A* algorithm to find the best path to the nearest enemy, if possible
-                acao = astar(
-                    mapa,
-                    (digdug_x, digdug_y),
-                    state,
-                    nearest_enemy,
-                    last_move,
-                    moves_fygar,
-                )
-                # If the A* algorithm fails, try again with the control flag set to True, runs away avoiding enemies
-                if acao == None:
-                    acao = astar(
-                        mapa,
-                        (digdug_x, digdug_y),
-                        state,
-                        nearest_enemy,
-                        last_move,
-                        moves_fygar,
-                        controlo=True,
-                    )
-
-                if acao != None and len(acao) == 2 and acao[1] == acao[0]:
-                    last_move = "A"
-                    await websocket.send(json.dumps({"cmd": "key", "key": "A"}))
-                    continue
-                elif acao != None and len(acao) > 1:
-                    nextStepList = acao[1]
-                    nextStep = [int(nextStepList[0]), int(nextStepList[1])]
-
-                    move = get_action((digdug_x, digdug_y), nextStep)
-                    last_move = move
-                    await websocket.send(json.dumps({"cmd": "key", "key": move}))
-                    continue
-                elif acao != None and len(acao) == 1 and acao == "A":
-                    last_move = "A"
-                    await websocket.send(json.dumps({"cmd": "key", "key": "A"}))
-                    continue
+                state = decoder.decode(cache.resolve(load(await websocket.recv())))
+                key = agent.update(state)
+                if key is None and lockstep and "step" in state:
+                    key = ""  # in lockstep the server waits for an answer to each frame
+                if key is not None:
+                    await websocket.send(json.dumps({"cmd": "key", "key": key}))
             except websockets.exceptions.ConnectionClosedOK:
                 print("Server has cleanly disconnected us")
                 return
@@ -125,6 +197,40 @@ def get_action(current, next):
         return "w"
 
 
+def cheapest_enemy(state, mapa, moves_fygar, costs):
+    """
+    Finds the index of the enemy the player can reach at the lowest cost in the game state.
+
+    This function compares the costs of the cheapest paths from the player (digdug) to the goal of each
+    enemy, which go around the walls, rocks and other enemies, all found by a single search. When no goal
+    can be reached it falls back to the nearest enemy in a straight line.
+
+    Args:
+        state (dict): The game state containing information about the current game situation.
+        mapa (list): A 2D list representing the game map where 1 indicates a wall and 0 indicates an open space.
+        moves_fygar (dict): The previous positions of each Fygar enemy, by id.
+        costs (tuple): The cost_field of mapa and state.
+
+    Returns:
+        int: The index of the enemy to chase in the "enemies" list of the game state.
+    """
+    paths = target_costs(mapa, tuple(state["digdug"]), state, moves_fygar, costs)
+    cheapest = min(range(len(paths)), key=paths.__getitem__, default=None)
+    if cheapest is None or paths[cheapest] == float("inf"):
+        return nearest_distance(state)
+    return cheapest
+
+
+def path_agent():
+    """
+    Creates an agent that chases the enemy it can reach at the lowest cost, e.g. for headless.py.
+
+    Returns:
+        Agent: The agent.
+    """
+    return Agent(by_path=True)
+
+
 def nearest_distance(state):
     """
     Finds the index of the nearest enemy to the player in the game state.
@@ -150,8 +256,15 @@ def nearest_distance(state):
     return nearest_enemy
 
 
-loop = asyncio.get_event_loop()
-SERVER = os.environ.get("SERVER", "localhost")
-PORT = os.environ.get("PORT", "8000")
-NAME = os.environ.get("NAME", getpass.getuser())
-loop.run_until_complete(agent_loop(f"{SERVER}:{PORT}", NAME))
+if __name__ == "__main__":
+    loop = asyncio.get_event_loop()
+    SERVER = os.environ.get("SERVER", "localhost")
+    PORT = os.environ.get("PORT", "8000")
+    NAME = os.environ.get("NAME", getpass.getuser())
+    LOCKSTEP = bool(os.environ.get("LOCKSTEP"))
+    BINARY = bool(os.environ.get("BINARY"))
+    MAPS = os.environ.get("MAPS", ".maps")
+    BY_PATH = bool(os.environ.get("BY_PATH"))
+    loop.run_until_complete(
+        agent_loop(f"{SERVER}:{PORT}", NAME, LOCKSTEP, BINARY, MAPS, BY_PATH)
+    )
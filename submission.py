@@ -0,0 +1,142 @@
+"""Submission of game records to the grading server, off the event loop.
+
+Records are spooled to a local file (one JSON record per line) until the grading
+server accepts them, so they survive a slow or unreachable server and restarts.
+
+Records are posted one at a time unless batching is asked for. A batch is a JSON
+list, which older grading servers refuse, the queue then goes back to one record
+per POST.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+from collections import deque
+
+import requests
+from requests import RequestException
+
+logger = logging.getLogger("Submission")
+logger.setLevel(logging.INFO)
+
+SPOOL_FILE = "grading_spool.jsonl"
+BATCH_SIZE = 1  # records per POST, only recent grading servers take lists
+MIN_BACKOFF = 1  # seconds before retrying a failed POST, doubled on each failure
+MAX_BACKOFF = 300
+UNAVAILABLE = {429, 502, 503, 504}  # statuses of a busy or unreachable server
+
+
+class GradingQueue:
+    """Background task posting game records to the grading server."""
+
+    def __init__(
+        self,
+        url: str,
+        spool: str = SPOOL_FILE,
+        batch_size: int = BATCH_SIZE,
+        timeout: float = 2,
+        min_backoff: float = MIN_BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+    ):
+        self.url = url
+        self._spool = spool
+        self._batch_size = batch_size
+        self._timeout = timeout
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._pending = deque(self._load())
+        self._ready = asyncio.Event()
+        if self._pending:
+            logger.info("%s records waiting in %s", len(self._pending), spool)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _load(self):
+        if not os.path.isfile(self._spool):
+            return []
+        with open(self._spool) as infile:
+            return [json.loads(line) for line in infile if line.strip()]
+
+    def _save(self, records):
+        tmp = self._spool + ".tmp"
+        with open(tmp, "w") as outfile:
+            outfile.writelines(json.dumps(record) + "\n" for record in records)
+        os.replace(tmp, self._spool)
+
+    def submit(self, record: dict):
+        """Queue a record, it is written to the spool before returning."""
+        self._pending.append(record)
+        with open(self._spool, "a") as outfile:
+            outfile.write(json.dumps(record) + "\n")
+        self._ready.set()
+
+    def _post(self, batch) -> bool:
+        """Blocking POST of a batch, run on a thread, returns whether it is done.
+
+        A batch the grading server refuses is not done, the queue posts its
+        records one at a time from then on.
+        """
+        # a single record is posted alone, as older grading servers expect
+        response = requests.post(
+            self.url, json=batch[0] if len(batch) == 1 else batch, timeout=self._timeout
+        )
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        error = isinstance(body, dict) and "error" in body  # even with a 200
+
+        if len(batch) > 1 and response.status_code not in UNAVAILABLE:
+            if response.status_code >= 400 or error or not isinstance(body, list):
+                logger.warning(
+                    "Grading server refused a batch (%s), posting records one by one",
+                    response.status_code,
+                )
+                self._batch_size = 1
+                return False
+            if len(body) < len(batch):
+                logger.error(
+                    "Grading server refused %s records of %s",
+                    len(batch) - len(body),
+                    batch,
+                )
+            return True
+
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()  # worth retrying
+        if response.status_code >= 400 or error:
+            logger.error(
+                "Grading server refused %s: %s %s", batch, response.status_code, body
+            )
+        return True
+
+    async def run(self):
+        """Post the pending records forever, in batches, backing off on failures."""
+        backoff = self._min_backoff
+        while True:
+            while not self._pending:
+                self._ready.clear()
+                await self._ready.wait()
+
+            batch = list(itertools.islice(self._pending, self._batch_size))
+            try:
+                if not await asyncio.to_thread(self._post, batch):
+                    continue
+            except RequestException as err:
+                logger.warning(
+                    "Could not submit %s records, retrying in %ss: %s",
+                    len(batch),
+                    backoff,
+                    err,
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+                continue
+
+            backoff = self._min_backoff
+            for _ in batch:
+                self._pending.popleft()
+            self._save(self._pending)  # a few lines, racing submit() is worse
+            logger.debug("Submitted %s records", len(batch))
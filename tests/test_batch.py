@@ -0,0 +1,64 @@
+import json
+import random
+
+import pytest
+
+from batch import BatchGame
+from game import Game
+
+
+def comparable(state):
+    """JSON view of a state."""
+    return json.loads(json.dumps(state))
+
+
+def chase(state, moves):
+    """Walk towards the nearest enemy and pump it when close, with some noise."""
+    if moves.random() < 0.2 or not state or not state["enemies"]:
+        return moves.choice("wasdA ")
+    x, y = state["digdug"]
+    ex, ey = min(
+        (e["pos"] for e in state["enemies"]),
+        key=lambda pos: abs(pos[0] - x) + abs(pos[1] - y),
+    )
+    if abs(ex - x) + abs(ey - y) <= 3 and (ex == x or ey == y):
+        return "A"
+    if ex != x:
+        return "d" if ex > x else "a"
+    return "s" if ey > y else "w"
+
+
+def reference(seed, level, steps):
+    """Keys and states of a reference Game started with seed, until its level is completed."""
+    game = Game(level=level, seed=seed)
+    game.start("batch")
+    moves = random.Random(-seed)
+    keys, states, state = [], [], None
+    for _ in range(steps):
+        keys.append(chase(state, moves))
+        state = game.step(keys[-1])
+        if state is None:
+            break
+        states.append(comparable(state))
+    return keys, states
+
+
+@pytest.mark.parametrize("level", [1, 4, 9, 15])
+def test_conformance(level):
+    seeds = list(range(1, 9))
+    steps = 400
+    expected = [reference(seed, level, steps) for seed in seeds]
+
+    batch = BatchGame.new(seeds, level=level, player="batch")
+    for step in range(steps):
+        keys = [k[step] if step < len(k) else "" for k, _ in expected]
+        running = ~batch.done
+        batch.step(keys)
+        for i, (_, states) in enumerate(expected):
+            if not running[i]:
+                continue
+            if step == len(states):  # the reference moved on to the next level
+                assert batch.cleared[i]
+                continue
+            assert not batch.cleared[i]
+            assert comparable(batch.state(i)) == states[step], (seeds[i], step)
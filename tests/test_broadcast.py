@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+from broadcast import Broadcast, Message
+from game import Game
+from protocol import DeltaDecoder, DeltaEncoder
+
+
+class Socket:
+    def __init__(self):
+        self.received = []
+        self.blocked = asyncio.Event()
+        self.blocked.set()
+
+    async def send(self, message):
+        await self.blocked.wait()
+        self.received.append(message)
+
+
+def shown(messages):
+    """Map a viewer in delta mode ends up with, the level map less the dug cells."""
+    decoder = DeltaDecoder()
+    mapa = None
+    for message in messages:
+        message = decoder.decode(json.loads(message))
+        if "map" in message:
+            mapa = message["map"]
+        for x, y in message.get("dug", []):
+            mapa[x][y] = 0
+    return mapa
+
+
+def test_slow_viewer():
+    async def main():
+        fast, slow = Socket(), Socket()
+        slow.blocked.clear()
+        viewers = Broadcast(size=4)
+        viewers.add(fast, delta=True)
+        viewers.add(slow, delta=True)
+
+        game = Game(level=2, seed=4)
+        game.start("slow")
+        viewers.send(json.dumps(game.info()))
+        encoder = DeltaEncoder()
+        for n, key in enumerate("ddddssssaawwdd" * 2):
+            game.keypress(key)
+            state = game.step()
+            if viewers.wants_keyframe():
+                encoder.reset()
+            frame = encoder.encode(state, game.map.digged)
+            keyframe = "delta" not in frame
+            viewers.send_frame(json.dumps(state), json.dumps(frame), keyframe=keyframe)
+            await asyncio.sleep(0)
+            if n == 10:
+                assert viewers.dropped == 7
+                slow.blocked.set()
+
+        viewers.close()
+        await asyncio.sleep(0.01)
+        return game, fast.received, slow.received
+
+    game, fast, slow = asyncio.run(main())
+    assert len(fast) == 29
+    # the frames after the gap are skipped until a keyframe with all the dug cells
+    assert len(slow) < 29 - 7
+    assert game.map.digged
+    assert shown(fast) == shown(slow) == game.map.map.tolist()
+
+
+def test_map_cache():
+    async def main():
+        caching, plain = Socket(), Socket()
+        viewers = Broadcast()
+        viewers.add(caching, binary=True, maps={"old"})
+        viewers.add(plain)
+
+        viewers.send(Message("info1", b"info1", "new", "short1"))
+        viewers.send(Message("info2", b"info2", "new", "short2"))
+        viewers.send(Message("info3", b"info3", "old", "short3"))
+        viewers.close()
+        await asyncio.sleep(0.01)
+        assert caching.received == [b"info1", "short2", "short3"]
+        assert plain.received == ["info1", "info2", "info3"]
+
+    asyncio.run(main())
+
+
+def test_rates():
+    async def main():
+        fast, slow = Socket(), Socket()
+        viewers = Broadcast()
+        viewers.add(fast, delta=True)
+        viewers.add(slow, delta=True, every=2)
+        assert viewers.rates == {1, 2}
+
+        for n in range(1, 5):
+            keyframe = viewers.wants_keyframe()
+            viewers.send_frame(f"full{n}", f"delta{n}", keyframe=keyframe)
+            if n % 2 == 0:
+                keyframe = viewers.wants_keyframe(2)
+                viewers.send_frame(f"full{n}", f"slow{n}", every=2, keyframe=keyframe)
+        await asyncio.sleep(0.01)
+        assert fast.received == ["delta1", "delta2", "delta3", "delta4"]
+        assert slow.received == ["slow2", "slow4"]
+
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+import random
+
+from dstar import DStarLite
+from search import shortest_path
+
+
+def path_cost(path, cost):
+    return sum(cost[x][y] for x, y in path[1:])
+
+
+def test_replanning():
+    rng = random.Random(3)
+    cost = [[rng.choice([1, 5]) for _ in range(24)] for _ in range(48)]
+    blocked = [[False] * 24 for _ in range(48)]
+    planner = DStarLite()
+    start, goal = (2, 3), (40, 20)
+    for tick in range(200):
+        for _ in range(5):  # enemies and rocks moved, cells were dug
+            x, y = rng.randrange(48), rng.randrange(24)
+            cost[x][y] = rng.choice([1, 5, 10001])
+            blocked[x][y] = rng.random() < 0.3
+        if tick % 50 == 49:
+            goal = (rng.randrange(48), rng.randrange(24))
+
+        expected = shortest_path(cost, start, goal, cost, blocked)
+        path = planner.plan(start, goal, cost, blocked)
+        assert (path is None) == (expected is None)
+        if path is not None:
+            assert path[0] == start and path[-1] == goal
+            assert path_cost(path, cost) == path_cost(expected, cost)
+            start = path[min(1, len(path) - 1)]
@@ -0,0 +1,76 @@
+import json
+import random
+
+from consts import Tiles
+from game import Game
+from replay import Recorder
+
+
+def play(game, keys, steps):
+    return [json.dumps(game.step(keys.choice("wasdA"))) for _ in range(steps)]
+
+
+def test_fork():
+    game = Game(level=5, seed=11)
+    game.start("fork")
+    play(game, random.Random(1), 150)
+
+    tiles = game.map.map.copy()
+    fork = game.fork()
+    forked = play(fork, random.Random(2), 300)
+    assert (game.map.map == tiles).all()  # the fork digs its own copy
+    assert play(game, random.Random(2), 300) == forked
+
+
+def test_snapshot():
+    game = Game(level=3, seed=4)
+    game.start("snapshot")
+    play(game, random.Random(1), 100)
+
+    snapshot = game.snapshot()
+    first = play(game, random.Random(3), 200)
+    game.restore(snapshot)
+    assert play(game, random.Random(3), 200) == first
+    game.restore(snapshot)
+    assert play(game, random.Random(3), 200) == first
+
+
+def test_keyframe():
+    game = Game(level=4, seed=9)
+    game.start("keyframe")
+    play(game, random.Random(1), 150)
+
+    keyframe = json.loads(json.dumps(game.keyframe()))  # as read from a replay
+    first = play(game, random.Random(3), 300)
+    assert play(Game.from_keyframe(keyframe), random.Random(3), 300) == first
+
+
+def test_restore_keeps_recorder():
+    game = Game(level=2, seed=6)
+    game.start("restore")
+    recorder = Recorder(game, "restore", seed=6)
+    play(game, random.Random(1), 20)
+
+    snapshot = game.snapshot()
+    play(game, random.Random(2), 10)
+    game.restore(snapshot)
+    play(game, random.Random(3), 5)
+    assert game.recorder is recorder
+    assert len(recorder._keys) == 35
+
+
+def test_unshare():
+    game = Game(level=1, seed=3)
+    game.start("unshare")
+    stones = [
+        (x, y)
+        for x in range(game.map.hor_tiles)
+        for y in range(game.map.ver_tiles)
+        if game.map.map[x][y] == Tiles.STONE
+    ]
+    fork = game.fork()
+    fork.map.dig(stones[0])  # the fork copies the tiles
+    grid = game.map._grid
+    game.map.dig(stones[1])
+    assert game.map._grid is grid  # left alone with them, no copy
+    assert fork.map.map[stones[1]] == Tiles.STONE
@@ -0,0 +1,21 @@
+import json
+import random
+
+from highscores import HighscoreStore
+
+
+def test_top_scores(tmp_path):
+    path = str(tmp_path / "highscores.json")
+    store = HighscoreStore(path, size=5, flush_delay=0)
+    games = [(f"p{n}", random.Random(n).randrange(0, 3000, 100)) for n in range(50)]
+    for player, score in games:
+        store.add(player, score)
+
+    # same order as sorting every score, ties keep the oldest first
+    best = sorted(games, key=lambda s: s[1], reverse=True)[:5]
+    assert store.scores == best
+
+    store.close()
+    with open(path) as infile:
+        assert [tuple(s) for s in json.load(infile)] == best
+    assert HighscoreStore(path, size=5).scores == best
@@ -239,3 +239,61 @@ def test_map():
     # test blocked / diggable
     assert game.map.calc_pos((1, 1), Direction.SOUTH, traverse=False) == (1, 1)
     assert game.map.calc_pos((1, 1), Direction.SOUTH, traverse=True) == (1, 2)
+
+
+def test_step():
+    game = Game(timeout=10)
+    game.start("John Doe")
+
+    state = game.step("d")
+    assert state["step"] == 1
+    assert state["digdug"] == (2, 1)
+
+    while game.running:
+        game.step()
+    assert game.total_steps == 10
+
+
+def test_grid():
+    mapa = Map(size=(13, 13), mapa=mapa13x13)
+
+    assert mapa.map[1][2] == Tiles.STONE
+    assert mapa.map.tolist() == mapa13x13
+
+    # the border is blocked even when traversing
+    assert mapa.is_blocked((-1, 4), traverse=True)
+    assert mapa.calc_pos((0, 4), Direction.WEST) == (0, 4)
+    assert mapa.calc_pos((12, 4), Direction.EAST) == (12, 4)
+
+    mask = mapa.passable_mask()
+    assert mask.shape == (13, 13)
+    assert mask[1][1] and not mask[1][2]
+    assert mapa.passable_mask(traverse=True).all()
+
+    assert mapa.neighbors_of((1, 1)) == [(2, 1)]
+    assert mapa.neighbors_of((1, 1), traverse=True) == [(1, 0), (2, 1), (1, 2), (0, 1)]
+    assert mapa.neighbors_of((2, 2)) == [(2, 1), (3, 2), (2, 3)]
+
+    neighbors = mapa.neighbors_mask()
+    for x in range(13):
+        for y in range(13):
+            assert [
+                mapa.calc_pos((x, y), d, traverse=False) != (x, y) for d in Direction
+            ] == list(neighbors[:, x, y])
+
+    mapa.dig((1, 2))
+    assert mapa.digged == [(1, 2)]
+    assert not mapa.is_blocked((1, 2), traverse=False)
+
+
+def test_seed():
+    games = [Game(seed=7), Game(seed=7), Game(seed=8)]
+    for game in games:
+        game.start("John Doe")
+
+    same, different = True, False
+    for key in "ddssAAaawwAAddss" * 10:
+        states = [game.step(key) for game in games]  # interleaved in one process
+        same &= states[0] == states[1]
+        different |= states[0] != states[2]
+    assert same and different
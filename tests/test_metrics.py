@@ -0,0 +1,44 @@
+from metrics import Histogram, Metrics, peer
+
+
+def test_histogram():
+    histogram = Histogram()
+    for n in range(1, 101):
+        histogram.observe(n / 1000)  # 1ms .. 100ms
+
+    summary = histogram.to_dict()
+    assert summary["count"] == 100
+    assert summary["mean"] == 50.5
+    assert summary["max"] == 100
+    assert 40 <= summary["p50"] <= 65
+    assert 90 <= summary["p99"] <= 100
+
+
+def test_snapshot():
+    metrics = Metrics()
+    waiting = [1, 2]
+    metrics.gauge("waiting", lambda: len(waiting))
+    metrics.observe("tick", 0.1)
+    metrics.count("overruns")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["gauges"] == {"waiting": 2}
+    assert snapshot["counters"] == {"overruns": 1}
+    assert snapshot["timings_ms"]["tick"]["count"] == 1
+    assert "overruns=1" in metrics.summary()
+
+
+def test_connections():
+    metrics = Metrics()
+    player, viewer = object(), object()
+    metrics.observe("send", 0.002, player)
+    metrics.observe("send", 0.004, player)
+    metrics.observe("viewer_send", 0.001, viewer)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["timings_ms"]["send"]["count"] == 2
+    assert len(snapshot["connections_ms"]) == 2
+    assert snapshot["connections_ms"][peer(player)]["send"]["count"] == 2
+
+    metrics.forget(player)
+    assert list(metrics.snapshot()["connections_ms"]) == [peer(viewer)]
@@ -0,0 +1,33 @@
+from characters import Fygar, Pooka, Rock
+from occupancy import Occupancy
+
+
+def test_occupancy():
+    rock = Rock((3, 3))
+    pooka = Pooka((5, 5))
+    fygar = Fygar((5, 5))
+    occupancy = Occupancy([rock], [pooka, fygar])
+
+    assert occupancy.has_rock((3, 3))
+    assert occupancy.enemies_at((5, 5)) == [pooka, fygar]
+    assert occupancy.has_enemy((5, 5), exclude=pooka)
+
+    old_pos = rock.pos
+    rock.pos = (3, 4)
+    occupancy.rock_moved(rock, old_pos)
+    assert not occupancy.has_rock((3, 3))
+    assert occupancy.rocks_at((3, 4)) == [rock]
+
+    old_pos = pooka.pos
+    pooka.pos = (6, 5)
+    occupancy.enemy_moved(pooka, old_pos)
+    assert not occupancy.has_enemy((5, 5), exclude=fygar)
+
+    fygar.fire = [(6, 5), (7, 5)]
+    occupancy.update_fire(fygar)
+    assert occupancy.on_fire((7, 5))
+    assert occupancy.fire_at((6, 5)) == 1
+
+    occupancy.remove_enemy(fygar)
+    assert not occupancy.on_fire((7, 5))
+    assert occupancy.enemies_at((5, 5)) == []
@@ -0,0 +1,103 @@
+import json
+import random
+
+from consts import Tiles
+from game import Game
+from protocol import BinaryEncoder, DeltaDecoder, DeltaEncoder, MapCache, load
+
+
+def wire(message):
+    return json.loads(json.dumps(message))
+
+
+def test_delta_roundtrip():
+    keys = random.Random(3)
+    game = Game(level=4, seed=3)
+    game.start("delta")
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+
+    mapa = None
+    full_size = delta_size = 0
+    while game.running and game._step < 1500:
+        if game._step == 0:
+            mapa = decoder.decode(wire(game.info()))["map"]
+
+        state = game.step()
+        if not state:
+            continue
+        full = wire(state)
+        frame = json.dumps(encoder.encode(state, game.map.digged))
+        decoded = decoder.decode(json.loads(frame))
+
+        for x, y in decoded.pop("dug", []):
+            mapa[x][y] = Tiles.PASSAGE
+        assert decoded == full
+        full_size += len(json.dumps(full))
+        delta_size += len(frame)
+        game.keypress(keys.choice("wasdA"))
+
+    assert mapa == game.map.map.tolist()
+    assert delta_size < full_size / 2
+
+
+def test_binary_roundtrip():
+    keys = random.Random(5)
+    game = Game(level=4, seed=5)
+    game.start("binary")
+    encoder = BinaryEncoder()
+    ids = {}
+
+    full_size = binary_size = 0
+    while game.running and game._step < 1500:
+        if game._step == 0:
+            info = game.info()
+            assert load(encoder.info(info)) == wire(info)
+
+        state = game.step()
+        if not state:
+            continue
+        state["ts"] = 1.5
+        full = wire(state)
+        frame = encoder.state(state)
+        decoded = load(frame)
+
+        # entities are numbered, always the same number for the same entity
+        for kind in ("enemies", "rocks"):
+            for entity, number in zip(full[kind], decoded[kind]):
+                assert ids.setdefault(entity["id"], number["id"]) == number["id"]
+                entity["id"] = number["id"]
+        assert decoded == full
+        full_size += len(json.dumps(full))
+        binary_size += len(frame)
+        game.keypress(keys.choice("wasdA"))
+
+    assert len(set(ids.values())) == len(ids)
+    assert binary_size < full_size / 3
+    assert encoder.info({**game.info(), "highscores": []}) is None
+
+
+def test_binary_game_over():
+    game = Game(level=1, seed=2)
+    game.start("over")
+    game.step()
+    state = game.step()
+    state["ts"] = 1.5
+    state["lives"] = -1  # the last frame, once Dig Dug has no lives left
+
+    decoded = load(BinaryEncoder().state(state))
+    assert decoded["lives"] == -1
+    assert decoded["score"] == state["score"]
+
+
+def test_map_cache(tmp_path):
+    games = [Game(level=2, seed=7), Game(level=2, seed=7)]
+    for game in games:
+        game.start("cache")
+    info = wire(games[0].info())
+    assert info["digest"] == games[1].map.digest
+
+    MapCache(tmp_path).resolve(info)
+    cache = MapCache(tmp_path)  # a later run
+    assert cache.digests == [info["digest"]]
+    short = {key: value for key, value in info.items() if key != "map"}
+    assert cache.resolve(short) == info
@@ -0,0 +1,38 @@
+import random
+
+from radix import RadixHeap, RadixPlanner
+from search import shortest_path
+
+
+def test_radix_heap():
+    rng = random.Random(2)
+    heap = RadixHeap()
+    popped = []
+    for _ in range(100):
+        low = popped[-1] if popped else 0
+        for _ in range(rng.randrange(3)):
+            heap.push(low + rng.choice([0, 1, 5, 10000, 20001]), None)
+        if heap.size:
+            popped.append(heap.pop()[0])
+    while heap.size:
+        popped.append(heap.pop()[0])
+    assert popped == sorted(popped)
+
+
+def test_radix_planner():
+    rng = random.Random(4)
+    planner = RadixPlanner()
+    for _ in range(50):
+        cost = [[rng.choice([1, 5, 10001]) for _ in range(24)] for _ in range(48)]
+        blocked = [[rng.random() < 0.2 for _ in range(24)] for _ in range(48)]
+        start = (rng.randrange(48), rng.randrange(24))
+        goal = (rng.randrange(48), rng.randrange(24))
+
+        expected = shortest_path(cost, start, goal, cost, blocked)
+        path = planner.plan(start, goal, cost, blocked)
+        assert (path is None) == (expected is None)
+        if path is not None:
+            assert path[0] == start and path[-1] == goal
+            assert sum(cost[x][y] for x, y in path) == sum(
+                cost[x][y] for x, y in expected
+            )
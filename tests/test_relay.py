@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+from game import Game
+from protocol import DeltaDecoder, load
+from relay import Publisher, Relay
+
+
+class Socket:
+    def __init__(self):
+        self.received = []
+
+    async def send(self, message):
+        self.received.append(message)
+
+
+def relayed(path, join, late=0):
+    """Relay a game to a viewer joining with join after late frames, returns what it
+    received, the game and its states by step."""
+
+    async def main():
+        relay = Relay()
+        server = await asyncio.start_unix_server(relay.publisher_handler, path)
+        publisher = Publisher(path)
+        await publisher.connect()
+
+        viewer = Socket()
+        relay.join(viewer, join)
+        if not late:
+            relay.join_viewer(viewer, join)
+
+        game = Game(level=2, seed=4)
+        game.start("relayed")
+        number = publisher.start("relayed")
+        publisher.info(number, json.dumps(game.info()), game.map.digged)
+        states = {}
+        for n, key in enumerate("ddddssssaawwdd" * 3):
+            if late and n == late:
+                relay.join_viewer(viewer, join)
+            game.keypress(key)
+            state = game.step()
+            full = json.dumps(state)
+            states[state["step"]] = json.loads(full)
+            publisher.frame(number, full, game.map.digged)
+            await asyncio.sleep(0.001)
+        publisher.end(number)
+        publisher.close()
+        await asyncio.sleep(0.1)
+
+        assert relay.idle == {viewer}  # waiting for the next game
+        server.close()
+        return viewer.received, game, states
+
+    return asyncio.run(main())
+
+
+def test_relay(tmp_path):
+    received, game, states = relayed(
+        str(tmp_path / "relay.sock"), {"delta": True, "fps": 5}  # every 2 ticks
+    )
+
+    decoder = DeltaDecoder()
+    mapa = None
+    received = [decoder.decode(json.loads(m)) for m in received]
+    for message in received:
+        if "map" in message:
+            mapa = message["map"]
+            continue
+        message = dict(message)
+        for x, y in message.pop("dug", []):
+            mapa[x][y] = 0
+        assert message == states[message["step"]]
+    assert [m["step"] for m in received[1:]] == list(range(2, 43, 2))
+    assert mapa == game.map.map.tolist()
+
+
+def test_relay_binary(tmp_path):
+    received, game, _ = relayed(
+        str(tmp_path / "relay.sock"), {"delta": True, "binary": True, "fps": 5}
+    )
+
+    # the binary frames have no dug cells, the frames at a lower rate come as deltas
+    assert isinstance(received[0], bytes)
+    decoder = DeltaDecoder()
+    mapa = None
+    steps = []
+    for message in received:
+        message = decoder.decode(load(message))
+        if "map" in message:
+            mapa = message["map"]
+            continue
+        steps.append(message["step"])
+        for x, y in message.get("dug", []):
+            mapa[x][y] = 0
+    assert steps == list(range(2, 43, 2))
+    assert mapa == game.map.map.tolist()
+
+
+def test_relay_join_late(tmp_path):
+    game = Game(level=2, seed=4)
+    game.start("relayed")
+    start = game.info()
+    received, game, _ = relayed(str(tmp_path / "relay.sock"), {"delta": True}, 10)
+
+    # the map of the start of the level, as cached, and the cells dug since
+    decoder = DeltaDecoder()
+    messages = [decoder.decode(json.loads(m)) for m in received]
+    assert messages[0]["digest"] == start["digest"]
+    assert messages[0]["map"] == start["map"]
+    assert messages[1]["step"] == 11 and messages[1]["dug"]
+    mapa = messages[0]["map"]
+    for message in messages[1:]:
+        for x, y in message.get("dug", []):
+            mapa[x][y] = 0
+    assert mapa == game.map.map.tolist()
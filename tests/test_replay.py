@@ -0,0 +1,23 @@
+import json
+import random
+
+from game import Game
+from replay import Recorder, Replay
+
+
+def test_seek(tmp_path):
+    game = Game(level=2, seed=8)
+    game.start("replay")
+    Recorder(game, "replay", seed=8, keyframe_every=50)
+
+    keys = random.Random(5)
+    states = []
+    while game.running and len(states) < 400:
+        states.append(json.dumps(game.step(keys.choice(["w", "a", "s", "d", "A", ""]))))
+    game.recorder.save(tmp_path / "game.replay")
+
+    replay = Replay.load(tmp_path / "game.replay")
+    assert replay.player == "replay" and len(replay) == len(states)
+    for tick in (1, 50, 173, len(states)):
+        assert json.dumps(replay.seek(tick)._state) == states[tick - 1]
+    assert [json.dumps(s) for s in replay.states(120, 180)] == states[120:180]
@@ -0,0 +1,68 @@
+import random
+
+from auxiliarFuncs import danger_map, in_the_fire, set_goal
+from game import Game
+from search import (
+    calculate_cost_avoid_enemies,
+    calculate_cost_normal,
+    cost_field,
+    shortest_path,
+    target_costs,
+)
+
+
+def test_cost_field():
+    game = Game(level=6, seed=2)
+    game.start("costs")
+    keys = random.Random(5)
+    for step in range(300):
+        state = game.step(keys.choice("wasd"))
+        if step % 30 or not state["enemies"]:
+            continue
+
+        maze = game.map.map.tolist()
+        normal, avoid, _, danger = cost_field(maze, state)
+        for x in range(len(maze)):
+            for y in range(len(maze[0])):
+                assert normal[x][y] == calculate_cost_normal(
+                    maze, (x, y), state, 0, danger
+                )
+                assert avoid[x][y] == calculate_cost_avoid_enemies(
+                    maze, (x, y), state, 0, danger
+                )
+
+
+def test_danger_map():
+    maze = [[0] * 10 for _ in range(12)]
+    maze[6][3] = 1  # head against the wall on its right
+    fygar = {"name": "Fygar", "id": "1", "pos": [5, 3], "dir": 1}
+    state = {"enemies": [fygar], "rocks": []}
+    assert [x for x in range(12) if in_the_fire(state, maze, (x, 3))] == [1, 2, 3, 4, 5]
+
+    fygar["fire"] = [[6, 3], [7, 3]]
+    danger = danger_map(state, maze)
+    assert [x for x in range(12) if danger[x][3]] == [1, 2, 3, 4, 5, 6, 7]
+    assert sum(map(sum, danger)) == 7
+    assert not in_the_fire(state, maze, (3, -1))
+
+
+def test_target_costs():
+    game = Game(level=3, seed=7)
+    game.start("targets")
+    keys = random.Random(1)
+    for step in range(200):
+        state = game.step(keys.choice("wasd"))
+        if step % 40 or not state["enemies"]:
+            continue
+
+        maze = game.map.map.tolist()
+        costs = cost_field(maze, state)
+        start = tuple(state["digdug"])
+        paths = target_costs(maze, start, state, {}, costs)
+        for enemy, total in enumerate(paths):
+            goal = set_goal(state, enemy, maze, {})
+            path = shortest_path(maze, start, goal, costs[0], costs[2])
+            if path is None:
+                assert total == float("inf")
+            else:
+                assert total == sum(costs[0][x][y] for x, y in path[1:])
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from submission import GradingQueue
+
+
+class Grading(BaseHTTPRequestHandler):
+    """Stand-in for prof/grading.py, failing its first requests."""
+
+    failures = 2
+    lists = True  # older grading servers fail on lists of records
+    received = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if Grading.failures:
+            Grading.failures -= 1
+            self.reply(503, None)
+        elif isinstance(body, list) and not Grading.lists:
+            self.reply(500, None)
+        elif isinstance(body, list):
+            Grading.received.append(body)
+            self.reply(200, [game for game in body if game["score"] != "bad"])
+        elif body["score"] == "bad":
+            self.reply(400, {"error": "poor soul..."})
+        else:
+            Grading.received.append(body)
+            self.reply(200, body)
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def submit_all(spool, records, batch_size):
+    """Submit records, returns how many are still spooled."""
+    server = HTTPServer(("localhost", 0), Grading)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://localhost:{server.server_port}/game"
+
+    async def main():
+        grading = GradingQueue(url, spool, batch_size=batch_size, min_backoff=0.01)
+        for record in records:
+            grading.submit(record)
+
+        # records are spooled until the grading server accepts them
+        assert len(GradingQueue(url, spool)) == len(records)
+
+        task = asyncio.create_task(grading.run())
+        while len(grading):
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(main())
+    server.shutdown()
+    return len(GradingQueue(url, spool))
+
+
+def test_retry_and_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(Grading, "received", [])
+    monkeypatch.setattr(Grading, "failures", 2)
+    records = [{"player": f"p{n}", "score": n, "level": 1} for n in range(3)]
+
+    assert submit_all(str(tmp_path / "spool.jsonl"), records, batch_size=2) == 0
+    assert Grading.received == [records[:2], records[2]]
+
+
+def test_old_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(Grading, "received", [])
+    monkeypatch.setattr(Grading, "failures", 0)
+    monkeypatch.setattr(Grading, "lists", False)
+    records = [{"player": f"p{n}", "score": n, "level": 1} for n in range(3)]
+    records[1]["score"] = "bad"
+
+    # a refused batch is posted again one record at a time, bad records are dropped
+    assert submit_all(str(tmp_path / "spool.jsonl"), records, batch_size=2) == 0
+    assert Grading.received == [records[0], records[2]]
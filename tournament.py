@@ -0,0 +1,100 @@
+"""Tournament runner, plays headless games over seed ranges on a process pool."""
+import argparse
+import itertools
+import json
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from headless import load_agent, play, quiet
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("Tournament")
+logger.setLevel(logging.INFO)
+
+
+def run_job(agent, seed, level):
+    """Play one headless game, in a worker process."""
+    start = time.perf_counter()
+    result = play(load_agent(agent)(), agent, level, seed)
+    result["agent"] = agent
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def tournament(agents, seeds, levels, workers=None):
+    """Play every (agent, seed, level) job and return the results sorted by job."""
+    jobs = list(itertools.product(agents, seeds, levels))
+    logger.info("%s jobs on %s workers", len(jobs), workers or os.cpu_count())
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=quiet) as pool:
+        futures = {pool.submit(run_job, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as err:
+                logger.error("Job %s failed: %s", futures[future], err)
+                continue
+            logger.debug("Done %s", results[-1])
+            if len(results) % 50 == 0:
+                logger.info("%s/%s jobs done", len(results), len(jobs))
+
+    return sorted(results, key=lambda r: (r["agent"], r["seed"], r["start_level"]))
+
+
+def summary(results):
+    """Mean score, level, steps and lives per agent."""
+    by_agent = itertools.groupby(results, key=lambda r: r["agent"])
+    return {
+        agent: {
+            "games": len(games),
+            **{
+                key: round(statistics.mean(r[key] for r in games), 2)
+                for key in ("score", "level", "steps", "lives")
+            },
+        }
+        for agent, games in ((a, list(g)) for a, g in by_agent)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--agent",
+        help="agent factory as module:attribute, may be repeated",
+        action="append",
+    )
+    parser.add_argument("--first-seed", help="First seed number", type=int, default=1)
+    parser.add_argument("--seeds", help="Number of seeds", type=int, default=10)
+    parser.add_argument(
+        "--level", help="Starting level, may be repeated", type=int, action="append"
+    )
+    parser.add_argument("--workers", help="Worker processes", type=int, default=None)
+    parser.add_argument(
+        "--output", help="Results file", default="tournament_results.json"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = tournament(
+        args.agent or ["student:Agent"],
+        range(args.first_seed, args.first_seed + args.seeds),
+        args.level or [1],
+        args.workers,
+    )
+    with open(args.output, "w") as outfile:
+        json.dump(results, outfile, indent=1)
+
+    logger.info(
+        "%s games in %.1fs, results in %s",
+        len(results),
+        time.perf_counter() - start,
+        args.output,
+    )
+    for agent, stats in summary(results).items():
+        logger.info("%s: %s", agent, stats)
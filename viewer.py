@@ -9,6 +9,7 @@ import pygame
 import websockets
 
 from mapa import Map, Tiles
+from protocol import DeltaDecoder, MapCache, load
 
 logging.basicConfig(level=logging.DEBUG)
 logger_websockets = logging.getLogger("websockets")
@@ -105,13 +106,25 @@ RANKS = {
 SPRITES = None
 
 
-async def messages_handler(ws_path, queue):
+async def messages_handler(ws_path, queue, binary=False, maps=None, fps=None):
+    cache = MapCache(maps)
     async with websockets.connect(ws_path) as websocket:
-        await websocket.send(json.dumps({"cmd": "join"}))
+        await websocket.send(
+            json.dumps(
+                {
+                    "cmd": "join",
+                    "delta": True,
+                    "binary": binary,
+                    "maps": cache.digests,
+                    "fps": fps,
+                }
+            )
+        )
+        decoder = DeltaDecoder()
 
         while True:
             r = await websocket.recv()
-            queue.put_nowait(r)
+            queue.put_nowait(decoder.decode(cache.resolve(load(r))))
 
 
 class Artifact(pygame.sprite.Sprite):
@@ -360,7 +373,7 @@ async def main_game():
     logging.info("Waiting for map information from server")
     state = await q.get()  # first state message includes map information
     logging.debug("Initial game status: %s", state)
-    newgame_json = json.loads(state)
+    newgame_json = state
 
     GAME_SPEED = newgame_json["fps"]
     mapa = Map(size=newgame_json["size"], mapa=newgame_json["map"])
@@ -393,6 +406,8 @@ async def main_game():
             pygame.draw.rect(
                 BACKGROUND, (0, 0, 0), scale(state["digdug"]) + scale((1, 1))
             )
+        for cell in state.get("dug", []):  # dug in frames we did not get
+            pygame.draw.rect(BACKGROUND, (0, 0, 0), scale(cell) + scale((1, 1)))
 
         if "highscores" not in state:
             SCREEN.blit(BACKGROUND, (0, 0))
@@ -547,7 +562,7 @@ async def main_game():
         pygame.display.flip()
 
         try:
-            state = json.loads(q.get_nowait())
+            state = q.get_nowait()
         except asyncio.queues.QueueEmpty:
             await asyncio.sleep(1.0 / GAME_SPEED)
             continue
@@ -563,6 +578,15 @@ if __name__ == "__main__":
         "--scale", help="reduce size of window by x times", type=int, default=1
     )
     parser.add_argument("--port", help="TCP port", type=int, default=PORT)
+    parser.add_argument(
+        "--binary", help="receive binary instead of JSON frames", action="store_true"
+    )
+    parser.add_argument(
+        "--maps", help="directory to cache the maps received", default=".maps"
+    )
+    parser.add_argument(
+        "--fps", help="frames per second to receive, default all", type=float
+    )
     args = parser.parse_args()
     SCALE = args.scale
 
@@ -574,7 +598,10 @@ if __name__ == "__main__":
 
     try:
         LOOP.run_until_complete(
-            asyncio.gather(messages_handler(ws_path, q), main_loop(q))
+            asyncio.gather(
+                messages_handler(ws_path, q, args.binary, args.maps, args.fps),
+                main_loop(q),
+            )
         )
     finally:
         LOOP.stop()